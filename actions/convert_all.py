@@ -1,40 +1,84 @@
+import logging
 import os
 import time
 import traceback
-from collections import defaultdict
-from multiprocessing import Pool, cpu_count
+from multiprocessing import cpu_count
 
 from tqdm import tqdm
 
 import config
 from library import require_file
-from library.utils import format_exception, path_join
-from library.utils.logging_setup import setup_logging, is_stdout_redirected
+from library.conversion_manifest import ConversionManifest, manifest_entry
+from library.conversion_planner import plan_conversion, chunk_batches, file_sizes, probe_files, prioritize_tasks
+from library.conversion_pool import ConversionWorkerPool, ConversionCancelled
+from library.loader import track_required_files
+from library.shared_resource_cache import format_shared_store_stats
+from library.utils import path_join
+from library.utils.skipped_resources import SkippedResourcesWriter
 from serializers import get_serializer
+from serializers.common.three_d.blender_batch import run_blender_batch
+from serializers.common.three_d.blender_scripts import defer_blender_scripts, discard_blender_scripts
 
 general_config = config.general_config()
 conversion_config = config.conversion_config()
 
 
-def export_file(base_input_path, path, out_path):
+# returns exception if file was not converted, otherwise manifest entry in incremental mode (None if not incremental)
+# and Blender scripts of file, which are run after all files are converted
+def export_file(base_input_path, path, out_path, incremental=False):
+    blender_scripts = []
     try:
-        (name, block, data) = require_file(path)
-        serializer = get_serializer(block, data)
-        rel_path = path[len(base_input_path):]
-        if not rel_path:
-            is_dir = serializer.is_dir
-            # DelegateBlock
-            if callable(is_dir):
-                is_dir = is_dir(block, data)
-            if is_dir:
-                rel_path = path.split('/')[-1]
-        serializer.serialize(data, f'{out_path}/{rel_path}', id=name, block=block)
+        with track_required_files() as required_files, defer_blender_scripts() as blender_scripts:
+            (name, block, data) = require_file(path)
+            serializer = get_serializer(block, data)
+            rel_path = path[len(base_input_path):]
+            if not rel_path:
+                is_dir = serializer.is_dir
+                # DelegateBlock
+                if callable(is_dir):
+                    is_dir = is_dir(block, data)
+                if is_dir:
+                    rel_path = path.split('/')[-1]
+            output_files = serializer.serialize(data, f'{out_path}/{rel_path}', id=name, block=block)
+        return manifest_entry(path, output_files, required_files) if incremental else None, blender_scripts
     except Exception as ex:
         traceback.print_exc()
+        discard_blender_scripts(blender_scripts)
         return ex
 
 
-def convert_all(path, out_path):
+def run_blender_scripts(blender_scripts, files_to_open, processes, skipped_writer, manifest):
+    """
+    Runs Blender scripts of all converted files in a few Blender processes. File, which script failed, is written to
+    skipped.txt and removed from manifest
+    """
+    if not blender_scripts:
+        return
+    start_time = time.time()
+    failed_count = 0
+    timings = []
+    try:
+        with tqdm(total=len(blender_scripts), unit='scene', desc='Blender') as pbar:
+            # the same limit as for conversion of file: hung scene should not stop the whole conversion
+            script_timeout = conversion_config.multiprocess_file_timeout_seconds or None
+            for (j, error, seconds) in run_blender_batch([script for (_, script) in blender_scripts], processes,
+                                                         script_timeout=script_timeout):
+                i = blender_scripts[j][0]
+                timings.append((seconds, files_to_open[i]))
+                if error is not None:
+                    failed_count += 1
+                    skipped_writer.add(files_to_open[i], error)
+                    if manifest is not None:
+                        manifest.update(files_to_open[i], None)
+                pbar.update(1)
+    except OSError as ex:
+        logging.error(f'Cannot run Blender "{general_config.blender_executable}": {ex}')
+        return
+    print(f'Blender: {len(blender_scripts)} scenes in {time.time() - start_time:.1f} seconds, {failed_count} failed. '
+          f'The longest: ' + ', '.join(f'{path} ({seconds:.1f} s)' for (seconds, path) in sorted(timings)[::-1][:5]))
+
+
+def convert_all(path, out_path, incremental=False):
     start_time = time.time()
     base_input_path = str(path)
     files_to_open = []
@@ -43,34 +87,69 @@ def convert_all(path, out_path):
             files_to_open += [path_join(subdir, f) for f in files]
     else:
         files_to_open = [str(path).replace('\\', '/')]
+    manifest = None
+    if incremental:
+        # skip files, which outputs are up to date since the previous conversion to the same output directory
+        manifest = ConversionManifest(str(out_path), conversion_config)
+        manifest.load()
+        files_count = len(files_to_open)
+        files_to_open = [f for f in files_to_open if not manifest.is_up_to_date(f)]
+        print(f'{files_count - len(files_to_open)} files are up to date')
 
     processes = cpu_count() if conversion_config.multiprocess_processes_count == 0 else conversion_config.multiprocess_processes_count
-    import logging
     logging.info(f"Starting conversion of {len(files_to_open)} files using {processes} processes")
-    with Pool(processes=processes, initializer=setup_logging, initargs=(is_stdout_redirected(),)) as pool:
-        pbar = tqdm(total=len(files_to_open))
-        results = [pool.apply_async(export_file, (base_input_path, f, out_path), callback=lambda *a: pbar.update()) for
-                   f in files_to_open]
-        results = list(result.get() for result in results)
-    pbar.close()
-
-    skipped_resources = [(files_to_open[i], exc) for i, exc in enumerate(results) if isinstance(exc, Exception)]
-    if skipped_resources:
-        skipped_map = defaultdict(lambda: list())
-        for name, ex in skipped_resources:
-            name = name.replace('\\', '/')
-            path, name = '/'.join(name.split('/')[:-1]), name.split('/')[-1]
-            skipped_map[path].append((name, format_exception(ex)))
-        for path, skipped in skipped_map.items():
-            path_suffix = path[len(base_input_path):]
-            if path_suffix.startswith('/'):
-                path_suffix = path_suffix[1:]
-            skipped_txt_output_path = path_join(out_path, path_suffix, 'skipped.txt')
-            os.makedirs(os.path.dirname(skipped_txt_output_path), exist_ok=True)
-            skipped.sort(key=lambda x: x[0])
-            with open(skipped_txt_output_path, 'w') as f:
-                for item in skipped:
-                    f.write("%s\t\t%s\n" % item)
+    sizes = file_sizes(files_to_open)
+    block_classes = probe_files(files_to_open)
+    tasks = chunk_batches(plan_conversion(files_to_open, processes, sizes, block_classes), sizes, processes)
+    tasks = prioritize_tasks(tasks, sizes, block_classes)
+    # worker process is restarted after this amount of tasks, releasing parsed files it keeps in cache
+    max_tasks_per_child = conversion_config.multiprocess_max_tasks_per_child or None
+    skipped_writer = SkippedResourcesWriter(base_input_path, str(out_path))
+    # files, required by many others (textures, palettes), are parsed once for all worker processes
+    shared_cache_size = conversion_config.multiprocess_shared_cache_size_mb * 1024 * 1024 if processes > 1 else 0
+    cancelled = False
+    # (index of file, script), 3D scenes are exported by Blender after conversion of all files
+    blender_scripts = []
+    with ConversionWorkerPool() as pool:
+        # progress by size of files: rate and time left do not depend on how small or big the next files are
+        with tqdm(total=sum(sizes), unit='B', unit_scale=True, unit_divisor=1024) as pbar:
+            converted_count = 0
+            file_tasks = [[(i, (base_input_path, files_to_open[i], out_path, incremental)) for i in task]
+                          for task in tasks]
+            try:
+                for (i, result) in pool.run(export_file, file_tasks, processes, shared_cache_size,
+                                            max_tasks_per_child=max_tasks_per_child,
+                                            file_timeout=conversion_config.multiprocess_file_timeout_seconds or None,
+                                            cancel_on_interrupt=True):
+                    if isinstance(result, ConversionCancelled):
+                        cancelled = True
+                    elif isinstance(result, Exception):
+                        skipped_writer.add(files_to_open[i], result)
+                        if manifest is not None:
+                            manifest.update(files_to_open[i], None)
+                    else:
+                        (entry, scripts) = result
+                        if manifest is not None:
+                            manifest.update(files_to_open[i], entry)
+                        blender_scripts += [(i, script) for script in scripts]
+                    converted_count += 1
+                    pbar.set_postfix_str(f'{converted_count}/{len(files_to_open)} files', refresh=False)
+                    pbar.update(sizes[i])
+                pbar.close()
+                if not cancelled:
+                    run_blender_scripts(blender_scripts, files_to_open, processes, skipped_writer, manifest)
+                    blender_scripts = []
+            finally:
+                discard_blender_scripts([script for (_, script) in blender_scripts])
+                # interrupted conversion continues from converted files next time
+                if manifest is not None:
+                    manifest.save()
+                skipped_writer.close()
+        stats = pool.shared_store_stats()
+        if stats is not None:
+            print(format_shared_store_stats(stats))
+    if cancelled:
+        print('Conversion cancelled')
 
     print(f'Finished. Execution time: {time.time() - start_time} seconds')
     print(f'Support me :) >>>  https://www.buymeacoffee.com/andygura <<<')
@@ -63,6 +63,7 @@ class API:
 
         # Conversion API
         bridge.expose(self.conversion_api.convert_files)
+        bridge.expose(self.conversion_api.cancel_conversion)
         bridge.expose(self.conversion_api.get_general_config)
         bridge.expose(self.conversion_api.get_conversion_config)
         bridge.expose(self.conversion_api.patch_general_config)
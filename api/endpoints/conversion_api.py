@@ -1,18 +1,24 @@
+import logging
 import os
 import subprocess
+import threading
 import traceback
-from collections import defaultdict
-from multiprocessing import Pool, cpu_count
+from multiprocessing import cpu_count
 from typing import Dict, Any
 
 from api.bridge import bridge
 
 import config
 from library import require_file
-from library.loader import clear_file_cache
-from library.utils import format_exception, path_join
-from library.utils.logging_setup import setup_logging, is_stdout_redirected
+from library.conversion_planner import plan_conversion, chunk_batches, file_sizes, probe_files, prioritize_tasks
+from library.conversion_pool import ConversionWorkerPool, ConversionCancelled
+from library.shared_resource_cache import format_shared_store_stats
+from library.utils import path_join
+from library.utils.skipped_resources import SkippedResourcesWriter
 from serializers import get_serializer
+from serializers.base import ResourceSerializer
+from serializers.common.three_d.blender_batch import run_blender_batch
+from serializers.common.three_d.blender_scripts import defer_blender_scripts, discard_blender_scripts
 
 
 class ConversionAPI:
@@ -22,6 +28,10 @@ class ConversionAPI:
         self.api = api
         self.current_progress = 0
         self.total_files = 0
+        # started on the first conversion, worker processes are reused by the next ones
+        self.worker_pool = ConversionWorkerPool()
+        # set by cancel_conversion, stops Blender scenes of converted files, which run after worker pool
+        self.blender_cancelled = threading.Event()
 
     def get_general_config(self) -> Dict[str, Any]:
         return config.general_config().to_dict()
@@ -71,33 +81,75 @@ class ConversionAPI:
         except Exception as e:
             return {"success": False, "message": f"Error testing executable: {str(e)}"}
 
-    def export_file(self, args):
-        base_input_path, path, out_path, custom_settings = args
+    @staticmethod
+    def export_file(base_input_path, path, out_path, custom_settings):
+        # static method: task does not carry the whole API (with opened file) to worker process. Returns Blender scripts
+        # of exported file, they are run in one batch after all files are converted
+        blender_scripts = []
         try:
-            (name, block, data) = require_file(path)
-            serializer = get_serializer(block, data)
-            serializer.patch_settings(custom_settings)
-            rel_path = path[len(base_input_path):]
-            if not rel_path:
-                is_dir = serializer.is_dir
-                # DelegateBlock
-                if callable(is_dir):
-                    is_dir = is_dir(block, data)
-                if is_dir:
-                    rel_path = path.split('/')[-1]
-            serializer.serialize(data, f'{out_path}/{rel_path}', id=name, block=block)
-            return None
+            # worker process outlives conversion: settings of the previous one should not stay
+            ResourceSerializer.settings.update(config.conversion_config(custom_settings))
+            with defer_blender_scripts() as blender_scripts:
+                (name, block, data) = require_file(path)
+                serializer = get_serializer(block, data)
+                serializer.patch_settings(custom_settings)
+                rel_path = path[len(base_input_path):]
+                if not rel_path:
+                    is_dir = serializer.is_dir
+                    # DelegateBlock
+                    if callable(is_dir):
+                        is_dir = is_dir(block, data)
+                    if is_dir:
+                        rel_path = path.split('/')[-1]
+                serializer.serialize(data, f'{out_path}/{rel_path}', id=name, block=block)
+            return blender_scripts
         except Exception as ex:
             traceback.print_exc()
+            discard_blender_scripts(blender_scripts)
             return ex
+
+    def run_blender_scripts(self, blender_scripts, files_to_open, processes, skipped_writer, script_timeout):
+        """
+        Runs Blender scripts of converted files in a few Blender processes. File is counted in progress, when all its
+        scenes are finished, file, which script failed, is written to skipped.txt. Returns False, if conversion is
+        cancelled
+        """
+        if self.blender_cancelled.is_set():
+            discard_blender_scripts([script for (_, script) in blender_scripts])
+            return False
+        scenes_left = {}
+        for (i, _) in blender_scripts:
+            scenes_left[i] = scenes_left.get(i, 0) + 1
+        batch = run_blender_batch([script for (_, script) in blender_scripts], processes, script_timeout=script_timeout)
+        try:
+            for (j, error, _) in batch:
+                i = blender_scripts[j][0]
+                if error is not None:
+                    skipped_writer.add(files_to_open[i], error)
+                scenes_left[i] -= 1
+                if scenes_left[i] == 0:
+                    self.current_progress += 1
+                    bridge.update_conversion_progress(self.current_progress, self.total_files)
+                if self.blender_cancelled.is_set():
+                    return False
+        except OSError as ex:
+            # there is no console in GUI: files without Blender output are listed in skipped.txt
+            logging.error(f'Cannot run Blender "{config.general_config().blender_executable}": {ex}')
+            for (i, count) in scenes_left.items():
+                if count:
+                    skipped_writer.add(files_to_open[i], ex)
         finally:
-            clear_file_cache(path)
+            # kills Blender processes of cancelled batch and removes scripts, which were not run
+            batch.close()
+        return True
+
+    def cancel_conversion(self) -> Dict[str, Any]:
+        self.worker_pool.cancel()
+        self.blender_cancelled.set()
+        return {"success": True}
 
     def convert_files(self, input_path: str, output_path: str, custom_settings: Dict[str, Any] = None) -> Dict[
         str, Any]:
-        opened_file = self.api.file_api.current_file_name
-        if opened_file:
-            self.api.file_api.close_file()
         try:
             if not os.path.exists(input_path):
                 return {"success": False, "error": f"Input path does not exist: {input_path}"}
@@ -105,6 +157,7 @@ class ConversionAPI:
             if not os.path.exists(output_path):
                 os.makedirs(output_path, exist_ok=True)
             self.current_progress = 0
+            self.blender_cancelled.clear()
             base_input_path = str(input_path)
             files_to_open = []
             if os.path.isdir(input_path):
@@ -117,50 +170,57 @@ class ConversionAPI:
 
             bridge.update_conversion_progress(0, self.total_files)
 
-            def update_progress(result):
-                self.current_progress += 1
-                bridge.update_conversion_progress(self.current_progress, self.total_files)
-
             conversion_config = config.conversion_config(custom_settings)
             processes = conversion_config.multiprocess_processes_count
             if processes == 0:
                 processes = cpu_count()
 
-            import logging
             logging.info(f"Starting conversion of {self.total_files} files using {processes} processes")
 
-            with Pool(processes=processes, initializer=setup_logging, initargs=(is_stdout_redirected(),)) as pool:
-                args_list = [(base_input_path, f, output_path, custom_settings) for f in files_to_open]
-                results = []
-                for args in args_list:
-                    result = pool.apply_async(self.export_file, (args,), callback=update_progress)
-                    results.append(result)
-                for result in results:
-                    result.wait()
-                results = [result.get() for result in results]
-
-            skipped_resources = [(files_to_open[i], exc) for i, exc in enumerate(results) if isinstance(exc, Exception)]
-            if skipped_resources:
-                skipped_map = defaultdict(lambda: list())
-                for name, ex in skipped_resources:
-                    name = name.replace('\\', '/')
-                    path, name = '/'.join(name.split('/')[:-1]), name.split('/')[-1]
-                    skipped_map[path].append((name, format_exception(ex)))
-                for path, skipped in skipped_map.items():
-                    path_suffix = path[len(base_input_path):]
-                    if path_suffix.startswith('/'):
-                        path_suffix = path_suffix[1:]
-                    skipped_txt_output_path = path_join(output_path, path_suffix, 'skipped.txt')
-                    os.makedirs(os.path.dirname(skipped_txt_output_path), exist_ok=True)
-                    skipped.sort(key=lambda x: x[0])
-                    with open(skipped_txt_output_path, 'w') as f:
-                        for item in skipped:
-                            f.write("%s\t\t%s\n" % item)
+            sizes = file_sizes(files_to_open)
+            block_classes = probe_files(files_to_open)
+            tasks = chunk_batches(plan_conversion(files_to_open, processes, sizes, block_classes), sizes, processes)
+            tasks = prioritize_tasks(tasks, sizes, block_classes)
+            # worker process is restarted after this amount of tasks, releasing parsed files it keeps in cache
+            max_tasks_per_child = conversion_config.multiprocess_max_tasks_per_child or None
+            skipped_writer = SkippedResourcesWriter(base_input_path, output_path)
+            shared_cache_size = (conversion_config.multiprocess_shared_cache_size_mb * 1024 * 1024
+                                 if processes > 1 else 0)
+            cancelled = False
+            file_tasks = [[(i, (base_input_path, files_to_open[i], output_path, custom_settings)) for i in task]
+                          for task in tasks]
+            # the same limit for Blender scene as for conversion of file
+            file_timeout = conversion_config.multiprocess_file_timeout_seconds or None
+            blender_scripts = []
+            try:
+                for (i, result) in self.worker_pool.run(ConversionAPI.export_file, file_tasks, processes,
+                                                        shared_cache_size, max_tasks_per_child=max_tasks_per_child,
+                                                        file_timeout=file_timeout):
+                    if isinstance(result, ConversionCancelled):
+                        cancelled = True
+                    elif isinstance(result, Exception):
+                        skipped_writer.add(files_to_open[i], result)
+                    elif result:
+                        # progress is updated when Blender scenes of file are finished
+                        blender_scripts += [(i, script) for script in result]
+                        continue
+                    self.current_progress += 1
+                    bridge.update_conversion_progress(self.current_progress, self.total_files)
+                if not cancelled:
+                    cancelled = not self.run_blender_scripts(blender_scripts, files_to_open, processes,
+                                                             skipped_writer, file_timeout)
+                    blender_scripts = []
+            finally:
+                discard_blender_scripts([script for (_, script) in blender_scripts])
+                # files, skipped before failure, are reported as well
+                skipped_writer.close()
+            shared_store_stats = self.worker_pool.shared_store_stats()
+            if shared_store_stats is not None:
+                logging.info(format_shared_store_stats(shared_store_stats))
+            if cancelled:
+                return {"success": False, "error": "Conversion cancelled"}
             bridge.update_conversion_progress(self.total_files, self.total_files)
             return {"success": True, "output_path": output_path}
         except Exception as e:
             traceback.print_exc()
             return {"success": False, "error": str(e)}
-        finally:
-            if opened_file:
-                self.api.file_api.open_file(opened_file, update_recent_files=False)
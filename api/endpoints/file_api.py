@@ -11,7 +11,7 @@ from api.bridge import bridge
 from config import general_config, set_config, SECTION_GENERAL
 from library import require_file
 from library.changes_service import ChangesService
-from library.loader import clear_file_cache
+from library.loader import clear_file_cache, write_file
 from library.utils import path_join
 from library.utils.file_utils import start_file
 from serializers.misc.json_utils import convert_bytes, serialize_exceptions
@@ -157,9 +157,7 @@ class FileAPI:
         Returns:
             Updated file data
         """
-        bts = self.current_file_block.pack(self.current_file_data)
-        with open(path, 'wb') as file:
-            file.write(bts)
+        write_file(path, self.current_file_block, self.current_file_data)
         ChangesService.on_file_saved()
         clear_file_cache(path)
         (name, block, data) = require_file(path)
@@ -194,6 +192,4 @@ class FileAPI:
         else:
             raise Exception(f'Unsupported format: {format_name}')
 
-        bts = block.pack(data)
-        with open(path, 'wb') as file:
-            file.write(bts)
+        write_file(path, block, data)
@@ -7,6 +7,8 @@ import copy
 import time
 from typing import Dict, Any, List
 
+import numpy as np
+
 from library import require_resource
 from library.changes_service import ChangesService
 from library.read_blocks.optional import OptionalBlock
@@ -95,8 +97,23 @@ class ResourceAPI:
         changes: List[Dict[str, Any]] = []
 
         def walk(cur_id: str, o: Any, n: Any):
-            if o == n:
+            if isinstance(o, np.ndarray) or isinstance(n, np.ndarray):
+                # bitmaps are numpy arrays: == is element-wise for them. Changed array is set as a whole
+                if not np.array_equal(o, n):
+                    changes.append({
+                        'id': cur_id,
+                        'timestamp': timestamp,
+                        'op': 'set',
+                        'oldValue': o,
+                        'newValue': n,
+                    })
                 return
+            try:
+                if o == n:
+                    return
+            except ValueError:
+                # dicts and lists with numpy arrays cannot be compared with ==, they are walked item by item
+                pass
             if isinstance(o, dict) and isinstance(n, dict):
                 for key in n:
                     walk(join_id(cur_id, str(key)), o.get(key), n[key])
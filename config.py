@@ -16,6 +16,10 @@ CONFIG_FILE_PATH = os.path.join(os.path.expanduser("~"), CONFIG_FILE_NAME)
 LOG_FILE_NAME = "nfs-resources-converter-logs.log"
 LOG_FILE_PATH = os.path.join(os.path.expanduser("~"), LOG_FILE_NAME)
 
+# Define default parse cache directory path
+PARSE_CACHE_DIR_NAME = "nfs-resources-converter-cache"
+PARSE_CACHE_PATH = os.path.join(os.path.expanduser("~"), PARSE_CACHE_DIR_NAME)
+
 
 # Function to get the config file location
 def get_config_file_location():
@@ -54,9 +58,17 @@ class ConfigManager:
                 "print_blender_log": False,
                 "recent_files": [],
                 "show_hidden_fields": False,
+                "qfs_compression": "refpack",
+                "qfs_compression_level": 4,
+                "parse_cache_enabled": False,
+                "parse_cache_path": "",
+                "parse_cache_max_size_mb": 2048,
             },
             SECTION_CONVERSION: {
                 "multiprocess_processes_count": 0,
+                "multiprocess_shared_cache_size_mb": 1024,
+                "multiprocess_max_tasks_per_child": 100,
+                "multiprocess_file_timeout_seconds": 600,
                 "input_path": "",
                 "output_path": "",
                 "images__save_images_only": False,
@@ -199,6 +211,19 @@ class ConfigManager:
         with open(CONFIG_FILE_PATH, 'w') as config_file:
             self._config.write(config_file)
 
+    def update(self, section: str, values: Dict[str, Any]) -> None:
+        """
+        Set configuration values in memory only, config file is not updated.
+
+        Args:
+            section: Configuration section
+            values: Values by configuration keys
+        """
+        if not self._config.has_section(section):
+            self._config.add_section(section)
+        for key, value in values.items():
+            self._config.set(section, key, ','.join(value) if isinstance(value, list) else str(value))
+
 
 # Create a singleton instance
 _config_manager = ConfigManager()
@@ -248,6 +273,11 @@ def general_config(patch: Dict = None) -> ClassDict:
         "print_blender_log": get_config(SECTION_GENERAL, "print_blender_log"),
         "recent_files": get_config(SECTION_GENERAL, "recent_files"),
         "show_hidden_fields": get_config(SECTION_GENERAL, "show_hidden_fields"),
+        "qfs_compression": get_config(SECTION_GENERAL, "qfs_compression"),
+        "qfs_compression_level": get_config(SECTION_GENERAL, "qfs_compression_level"),
+        "parse_cache_enabled": get_config(SECTION_GENERAL, "parse_cache_enabled"),
+        "parse_cache_path": get_config(SECTION_GENERAL, "parse_cache_path"),
+        "parse_cache_max_size_mb": get_config(SECTION_GENERAL, "parse_cache_max_size_mb"),
     }
     if patch:
         config = {**config, **patch}
@@ -257,6 +287,9 @@ def general_config(patch: Dict = None) -> ClassDict:
 def conversion_config(patch: Dict = None) -> ClassDict:
     config = {
         "multiprocess_processes_count": get_config(SECTION_CONVERSION, "multiprocess_processes_count"),
+        "multiprocess_shared_cache_size_mb": get_config(SECTION_CONVERSION, "multiprocess_shared_cache_size_mb"),
+        "multiprocess_max_tasks_per_child": get_config(SECTION_CONVERSION, "multiprocess_max_tasks_per_child"),
+        "multiprocess_file_timeout_seconds": get_config(SECTION_CONVERSION, "multiprocess_file_timeout_seconds"),
         "input_path": get_config(SECTION_CONVERSION, "input_path"),
         "output_path": get_config(SECTION_CONVERSION, "output_path"),
         "images__save_images_only": get_config(SECTION_CONVERSION, "images__save_images_only"),
@@ -274,6 +307,28 @@ def conversion_config(patch: Dict = None) -> ClassDict:
     return ClassDict.wrap(config)
 
 
+def current_config() -> Dict[str, Dict[str, Any]]:
+    """
+    Get values of all settings, e.g. to pass them to another process with apply_config.
+
+    Returns:
+        Dict with configuration values by sections
+    """
+    return {SECTION_GENERAL: dict(general_config()), SECTION_CONVERSION: dict(conversion_config())}
+
+
+def apply_config(values: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Apply settings of another process in memory. Used by conversion worker processes, which outlive changes of
+    settings in the parent process. Config file is not updated.
+
+    Args:
+        values: Dict with configuration values by sections, see current_config
+    """
+    for section, options in values.items():
+        _config_manager.update(section, options)
+
+
 # Create default config file if it doesn't exist
 if not os.path.exists(CONFIG_FILE_PATH):
     _config_manager.create_default_config_file()
@@ -190,6 +190,11 @@ export class ConverterComponent implements OnInit {
   }
 
   cancel() {
+    if (this.isConverting) {
+      // stops running conversion, dialog stays open to show the result
+      this.api.cancelConversion().then();
+      return;
+    }
     this.dialogRef.close();
   }
 }
@@ -153,6 +153,10 @@ export class ApiDelegateImplService {
     return this.wrapCall('convert_files', inputPath, outputPath, settings);
   }
 
+  public async cancelConversion(): Promise<{ success: boolean }> {
+    return this.wrapCall('cancel_conversion');
+  }
+
   public async getGeneralConfig(): Promise<GeneralConfig> {
     return this.wrapCall('get_general_config');
   }
@@ -4,10 +4,18 @@ export type GeneralConfig = {
   print_blender_log: boolean;
   recent_files: string[];
   show_hidden_fields: boolean;
+  qfs_compression: string;
+  qfs_compression_level: number;
+  parse_cache_enabled: boolean;
+  parse_cache_path: string;
+  parse_cache_max_size_mb: number;
 };
 
 export type ConversionConfig = {
   multiprocess_processes_count: number;
+  multiprocess_shared_cache_size_mb: number;
+  multiprocess_max_tasks_per_child: number;
+  multiprocess_file_timeout_seconds: number;
   input_path: string;
   output_path: string;
   images__save_images_only: boolean;
@@ -133,6 +133,10 @@ export abstract class BaseApiDelegateService {
     return (await this.getImpl()).convertFiles(inputPath, outputPath, settings);
   }
 
+  public async cancelConversion(): Promise<{ success: boolean }> {
+    return (await this.getImpl()).cancelConversion();
+  }
+
   public async getGeneralConfig(): Promise<GeneralConfig> {
     return (await this.getImpl()).getGeneralConfig();
   }
@@ -1,10 +1,18 @@
 from io import BytesIO, BufferedReader
 
+from library.utils.memory_view_buffer import MemoryViewBuffer
+
 
 class BaseContext:
+    # contexts are created for every compound block and array item, which is read or written
+    __slots__ = ('name', '_data', 'block', 'parent', 'children', '_ctx_path')
+
     @property
     def ctx_path(self):
-        return (self.parent.ctx_path + '/' if self.parent else '') + self.name
+        # name and parent of context do not change, path is built once, e.g. for exception messages
+        if self._ctx_path is None:
+            self._ctx_path = (self.parent.ctx_path + '/' if self.parent else '') + self.name
+        return self._ctx_path
 
     def __init__(self, name: str = '', data=None, block=None, parent=None):
         self.name = name
@@ -12,6 +20,7 @@ class BaseContext:
         self.block = block
         self.parent = parent
         self.children = {}
+        self._ctx_path = None
         if self.parent:
             self.parent.children[name] = self
 
@@ -64,6 +73,14 @@ class BaseContext:
 
 
 class ReadContext(BaseContext):
+    """
+    Context of block being read. Child context is registered in parent while its block is read: blocks can reach data
+    of siblings, which are not finished yet, and block can get its context again with get_or_create_child. When
+    unpack of block is finished, its context is discarded (see DataBlock.unpack), so parsed file does not keep a
+    context for every compound block and array item. Block, which needs context of child after that, keeps reference
+    to it
+    """
+    __slots__ = ('buffer', 'read_start_offset', 'read_bytes_amount')
 
     @property
     def local_buffer_pos(self):
@@ -88,19 +105,27 @@ class ReadContext(BaseContext):
                            parent=self,
                            read_bytes_amount=read_bytes_amount)
 
-    def __init__(self, buffer: [BufferedReader, BytesIO] = None, name: str = '', data=None, block=None, parent=None,
-                 read_bytes_amount=None):
+    def __init__(self, buffer: [BufferedReader, BytesIO, MemoryViewBuffer] = None, name: str = '', data=None,
+                 block=None, parent=None, read_bytes_amount=None):
         super().__init__(name=name, data=data, block=block, parent=parent)
         self.buffer = buffer
         self.read_start_offset = buffer.tell() if buffer is not None else None
         self.read_bytes_amount = read_bytes_amount
 
+    # reads raw bytes, which are going to be decoded right away. For memory-mapped buffers returns a zero-copy
+    # memoryview slice instead of bytes, so it should never be stored to the parsed data as is
+    def read_view(self, size: int):
+        if isinstance(self.buffer, MemoryViewBuffer):
+            return self.buffer.read_view(size)
+        return self.buffer.read(size)
+
     @classmethod
     def from_bytes(cls, b, **kwargs):
-        return cls(buffer=BytesIO(b), read_bytes_amount=len(b), **kwargs)
+        return cls(buffer=MemoryViewBuffer(b), read_bytes_amount=len(b), **kwargs)
 
 
 class WriteContext(BaseContext):
+    __slots__ = ('sink', 'write_start_offset', 'child_spans', 'written_size')
 
     def get_or_create_child(self, name: str, block=None):
         existing_child = self.children.get('name')
@@ -108,16 +133,45 @@ class WriteContext(BaseContext):
             if block is not None:
                 existing_child.block = block
             return existing_child
-        return WriteContext(result=self.result,
+        return WriteContext(sink=self.sink,
                             name=name,
                             data=self.data(name),
                             block=block or self.relative_block(name),
                             parent=self)
 
-    def __init__(self, result: bytes = b'', name: str = '', data=None, block=None, parent=None):
+    def __init__(self, sink=None, name: str = '', data=None, block=None, parent=None):
         super().__init__(name=name, data=data, block=block, parent=parent)
-        self.result = result
-        self.write_start_offset = len(result)
+        # WriteSink, which block is written into, if it is written with DataBlock.write_into
+        self.sink = sink
+        self.write_start_offset = sink.tell() if sink is not None else 0
+        # (start, end) of written fields of compound block, relative to block start
+        self.child_spans = {}
+        # size of compound block, when all its fields are written
+        self.written_size = None
+
+    def packed_size(self, child_name: str = None) -> int:
+        if child_name is None:
+            if self.written_size is not None:
+                return self.written_size
+            return self.block.estimate_packed_size(self.get_full_data())
+        span = self.child_spans.get(child_name)
+        if span is not None:
+            return span[1] - span[0]
+        return self.block.get_child_block(child_name).estimate_packed_size(self.data(child_name))
+
+    def written_bytes(self, start: int = 0, end: int = None) -> bytes:
+        """
+        Bytes of this block, which are already written, e.g. for checksum field
+        """
+        written = self.sink.tell() - self.write_start_offset
+        return self.sink.read(self.write_start_offset + start,
+                              self.write_start_offset + (written if end is None else min(end, written)))
+
+    def offset_to_child(self, child_name: str) -> int:
+        span = self.child_spans.get(child_name)
+        if span is not None:
+            return span[0]
+        return self.block.offset_to_child_when_packed(self.get_full_data(), child_name)
 
 
 class DocumentationCtxData:
@@ -281,6 +335,8 @@ class DocumentationCtxData:
 
 
 class DocumentationContext(BaseContext):
+    __slots__ = ('buffer',)
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.buffer = type('MockBuffer', (), {'tell': lambda *args, **kwargs: DocumentationCtxData('offset')})()
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from library.parse_cache import file_content_hash, hash_sources
+from version import __version__
+
+# bump when format of manifest changes
+MANIFEST_FORMAT_VERSION = 1
+MANIFEST_FILE_NAME = '.conversion-manifest.json'
+# conversion settings, which do not change output files
+IGNORED_SETTINGS = ['input_path', 'output_path']
+IGNORED_SETTINGS_PREFIX = 'multiprocess_'
+
+
+@lru_cache(maxsize=None)
+def converter_version() -> str:
+    """
+    Hash of application version and source code of read blocks, resources and serializers: any change there may change
+    output files
+    """
+    digest = hashlib.sha1(f'{MANIFEST_FORMAT_VERSION}:{__version__}'.encode())
+    hash_sources(digest, ['library', 'resources', 'serializers'])
+    return digest.hexdigest()
+
+
+def conversion_settings(settings: dict) -> dict:
+    return {key: value for key, value in settings.items()
+            if key not in IGNORED_SETTINGS and not key.startswith(IGNORED_SETTINGS_PREFIX)}
+
+
+def file_state(path: str) -> dict:
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': file_content_hash(path)}
+
+
+def is_file_unchanged(path: str, state: Optional[dict], content_hashes: Dict[str, str] = None) -> bool:
+    """
+    Compares file with recorded state, None for missing file. Content is hashed only if file was touched without
+    changing size. If content is the same, modification time in state is updated, so file is not hashed next time.
+    content_hashes: hashes of files, which were hashed already, by path
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return state is None
+    if state is None:
+        return False
+    if stat.st_size != state['size']:
+        return False
+    if stat.st_mtime_ns == state['mtime_ns']:
+        return True
+    try:
+        content_hash = content_hashes.get(path) if content_hashes is not None else None
+        if content_hash is None:
+            content_hash = file_content_hash(path)
+            if content_hashes is not None:
+                content_hashes[path] = content_hash
+    except OSError:
+        return False
+    if content_hash != state['hash']:
+        return False
+    # e.g. game files were copied or restored from backup
+    state['mtime_ns'] = stat.st_mtime_ns
+    return True
+
+
+def manifest_entry(path: str, output_files: Optional[List[str]], required_files: Iterable[str]) -> dict:
+    """
+    Manifest entry of converted file: state of input file, files returned by serializer and states of other files,
+    loaded by serializer with require_resource. Built right after conversion in worker process
+    """
+    input_path = os.path.abspath(path)
+    dependencies = {}
+    for required_path in required_files:
+        required_path = os.path.abspath(required_path)
+        if required_path != input_path and required_path not in dependencies:
+            try:
+                dependencies[required_path] = file_state(required_path)
+            except OSError:
+                # serializer managed without it, but output changes if file appears
+                dependencies[required_path] = None
+    return {
+        **file_state(path),
+        'outputs': [os.path.abspath(x) for x in output_files or []],
+        'dependencies': dependencies,
+    }
+
+
+class ConversionManifest:
+    """
+    Record of converted files in output directory, used by incremental conversion to skip input files, which
+    outputs are up to date. Entry is valid, if input file, all files, which its serializer loaded (palettes, textures
+    QFS, COL files), are not changed and all output files exist. Change of converter version or conversion settings
+    invalidates all entries. Files, which were not converted because of error, do not have entry
+    """
+
+    def __init__(self, out_path: str, settings: dict):
+        self.location = os.path.join(out_path, MANIFEST_FILE_NAME)
+        self.settings = conversion_settings(settings)
+        self.entries: Dict[str, dict] = {}
+        # hashes of touched files, computed while checking entries: many entries can depend on the same file
+        self._content_hashes: Dict[str, str] = {}
+
+    def load(self):
+        try:
+            with open(self.location, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (manifest.get('format_version') == MANIFEST_FORMAT_VERSION
+                and manifest.get('converter_version') == converter_version()
+                and manifest.get('settings') == json.loads(json.dumps(self.settings))):
+            self.entries = manifest.get('files', {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.location) or '.', exist_ok=True)
+        temp_location = f'{self.location}.{os.getpid()}.tmp'
+        with open(temp_location, 'w') as f:
+            json.dump({
+                'format_version': MANIFEST_FORMAT_VERSION,
+                'converter_version': converter_version(),
+                'settings': self.settings,
+                'files': self.entries,
+            }, f)
+        os.replace(temp_location, self.location)
+
+    def is_up_to_date(self, path: str) -> bool:
+        """
+        Refreshes modification times of entry, if files were touched without changing content: manifest should be
+        saved after checking
+        """
+        entry = self.entries.get(os.path.abspath(path))
+        if entry is None or not is_file_unchanged(path, entry, self._content_hashes):
+            return False
+        if not all(os.path.exists(output) for output in entry['outputs']):
+            return False
+        return all(is_file_unchanged(dependency, state, self._content_hashes)
+                   for dependency, state in entry['dependencies'].items())
+
+    def update(self, path: str, entry: Optional[dict]):
+        # entry is None if file was not converted
+        if entry is None:
+            self.entries.pop(os.path.abspath(path), None)
+        else:
+            self.entries[os.path.abspath(path)] = entry
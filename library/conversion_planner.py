@@ -0,0 +1,149 @@
+import os
+from typing import List, Optional
+
+from library.loader import probe_block_class
+
+# conversion is sent to worker processes in about this amount of tasks per process: less tasks mean less IPC
+# overhead, more tasks - better balance of load in the end of conversion
+TASKS_PER_PROCESS = 16
+# upper limit of files in task, joined from small batches, to keep progress updates frequent
+MAX_FILES_PER_TASK = 64
+# files, which are converted quickly, go first: small files and resources without 3D scenes, audio or video
+CHEAP_FILE_SIZE = 64 * 1024
+CHEAP_BLOCK_CLASSES = ['EacPalette', 'PaletteReference', 'TnfsConfigDat', 'CarPerformanceSpec',
+                       'CarSimplifiedPerformanceSpec', 'ShpiText', 'DashDeclarationFile', 'FfnFont', 'MapColFile']
+
+
+def probe_file(path: str):
+    """
+    Block class of file, determined by its header the same way as on loading, or None if file is not supported or
+    cannot be read
+    """
+    try:
+        with open(path, 'rb') as f:
+            return probe_block_class(f, path, os.path.getsize(path))
+    except Exception:
+        return None
+
+
+def file_dependencies(path: str, block_class) -> List[str]:
+    """
+    Paths of other files, which serializer of file loads with require_resource. Mirrors the references in serializers,
+    so should be updated together with them. References inside the same file (ORIP textures, palettes of FAM
+    archives) do not matter for scheduling
+    """
+    dependencies = []
+    class_name = block_class.__name__ if block_class else None
+    if class_name in ['TrkMap', 'FrdMap']:
+        # NFS1, NFS3 tracks: collision file with texture map and QFS with textures
+        dependencies += [path[:-3] + 'COL', path[:-4] + '0.QFS']
+    elif class_name == 'TriMap':
+        # TNFS open tracks: props are in the FAM file of track
+        dependencies.append('/'.join(path.split('/')[:-2] + ['ETRACKFM', f'{path.split("/")[-1][:3]}_001.FAM']))
+    elif class_name == 'GeoGeometry':
+        # NFS2 geometries: textures are in the QFS file with the same name
+        dependencies.append(path[:-4] + '.QFS')
+    if 'ART/CONTROL/' in path and class_name in ['EacCompressedBlock', 'ShpiBlock']:
+        # TNFS UI images without palette use palette of CENTRAL.QFS
+        dependencies.append('/'.join(path.split('/')[:-1] + ['CENTRAL.QFS']))
+    return [x for x in dependencies if x != path]
+
+
+def probe_files(files: List[str]) -> list:
+    return [probe_file(path) for path in files]
+
+
+def file_sizes(files: List[str]) -> List[int]:
+    sizes = []
+    for path in files:
+        try:
+            sizes.append(os.path.getsize(path))
+        except OSError:
+            sizes.append(0)
+    return sizes
+
+
+def plan_conversion(files: List[str], processes: int, sizes: Optional[List[int]] = None,
+                    block_classes: Optional[list] = None) -> List[List[int]]:
+    """
+    Splits files into batches, each of them is converted by one worker process. Files, which reference each other,
+    get into the same batch, so worker parses shared file only once and keeps it in files_cache. Referenced files go
+    first in batch. Batches are ordered by total size of files, largest first (longest processing time scheduling):
+    the largest files do not end up at the end of conversion, leaving other workers idle. Group, larger than fair
+    part of work per process, is split, because waiting for it would take longer than parsing shared file again.
+    Returns lists of indexes in files
+    """
+    if sizes is None:
+        sizes = file_sizes(files)
+    if block_classes is None:
+        block_classes = probe_files(files)
+    index_by_path = {path: i for i, path in enumerate(files)}
+    # groups of connected files (union-find)
+    parents = list(range(len(files)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    is_required = [False] * len(files)
+    for i, path in enumerate(files):
+        for dependency in file_dependencies(path, block_classes[i]):
+            j = index_by_path.get(dependency)
+            if j is None:
+                continue
+            is_required[j] = True
+            parents[find(i)] = find(j)
+    groups = {}
+    for i in range(len(files)):
+        groups.setdefault(find(i), []).append(i)
+
+    max_batch_size = sum(sizes) / max(processes, 1)
+    batches = []
+    for group in groups.values():
+        # referenced files first, the rest in the original order
+        group.sort(key=lambda i: (not is_required[i], i))
+        batch, batch_size = [], 0
+        for i in group:
+            if batch and not is_required[i] and batch_size + sizes[i] > max_batch_size:
+                batches.append((batch_size, batch))
+                batch, batch_size = [], 0
+            batch.append(i)
+            batch_size += sizes[i]
+        batches.append((batch_size, batch))
+    batches.sort(key=lambda x: (-x[0], x[1][0]))
+    return [batch for (_, batch) in batches]
+
+
+def chunk_batches(batches: List[List[int]], sizes: List[int], processes: int) -> List[List[int]]:
+    """
+    Joins consecutive batches into tasks for worker processes, until task has fair part of work per task. Batches are
+    ordered by plan_conversion largest first, so large batches stay alone, and small files in the end are sent to
+    workers in chunks. Unlike fixed chunksize of Pool, this does not give a few of the largest batches to one worker.
+    Returns lists of indexes in files
+    """
+    min_task_size = sum(sizes) / (max(processes, 1) * TASKS_PER_PROCESS)
+    tasks = []
+    task, task_size = [], 0
+    for batch in batches:
+        task += batch
+        task_size += sum(sizes[i] for i in batch)
+        if task_size >= min_task_size or len(task) >= MAX_FILES_PER_TASK:
+            tasks.append(task)
+            task, task_size = [], 0
+    if task:
+        tasks.append(task)
+    return tasks
+
+
+def prioritize_tasks(tasks: List[List[int]], sizes: List[int], block_classes: list) -> List[List[int]]:
+    """
+    Moves tasks of cheap files (palettes, configs, small files) to the beginning, keeping order inside of priority
+    lanes. They are done in the first seconds of conversion, so remaining work is not underestimated
+    """
+    def is_cheap(i):
+        return sizes[i] <= CHEAP_FILE_SIZE or (block_classes[i] is not None
+                                               and block_classes[i].__name__ in CHEAP_BLOCK_CLASSES)
+
+    return sorted(tasks, key=lambda task: 0 if all(is_cheap(i) for i in task) else 1)
@@ -0,0 +1,311 @@
+import importlib
+import logging
+import pkgutil
+import signal
+import threading
+import time
+from collections import deque
+from multiprocessing import Event, Pipe, Process
+from multiprocessing.connection import wait
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import config
+from library.loader import clear_files_cache, store_loaded_files
+from library.shared_resource_cache import SharedResourceManager, init_conversion_worker
+from library.utils.logging_setup import is_stdout_redirected
+
+# packages, imported by worker process on start, so the first files of every conversion do not wait for imports
+PRELOADED_PACKAGES = ['resources', 'serializers']
+# how often pool checks timeouts, if there are no messages from workers
+POLL_INTERVAL = 1.0
+
+# event of the pool, which current worker process belongs to, set when running conversion is cancelled
+_cancel_event = None
+
+
+class ConversionCancelled(Exception):
+    pass
+
+
+class ConversionTimeout(Exception):
+    pass
+
+
+class WorkerCrashed(Exception):
+    pass
+
+
+def preload_modules():
+    for package_name in PRELOADED_PACKAGES:
+        package = importlib.import_module(package_name)
+        for module_info in pkgutil.walk_packages(package.__path__, f'{package_name}.', onerror=lambda name: None):
+            try:
+                importlib.import_module(module_info.name)
+            except Exception:
+                # e.g. missing optional dependency: module fails the same way, when it is used
+                pass
+
+
+def init_pool_worker(stdout_redirected: bool, store, cancel_event):
+    global _cancel_event
+    # Ctrl+C in terminal is handled by main process, which cancels conversion
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init_conversion_worker(stdout_redirected, store)
+    _cancel_event = cancel_event
+    # forked worker inherits files, parsed by parent process, e.g. file opened in editor with not saved changes
+    clear_files_cache()
+    preload_modules()
+
+
+def is_conversion_cancelled() -> bool:
+    return _cancel_event is not None and _cancel_event.is_set()
+
+
+def _worker_main(tasks_connection, results_connection, stdout_redirected: bool, store, cancel_event):
+    """
+    Worker process: receives tasks (function, arguments for every file and settings of parent process), reports start
+    and result of every file. Exits on None
+    """
+    init_pool_worker(stdout_redirected, store, cancel_event)
+    while True:
+        task = tasks_connection.recv()
+        if task is None:
+            break
+        (func, items, settings) = task
+        # worker process outlives conversion, settings could be changed in parent process since it was started
+        config.apply_config(settings)
+        try:
+            for (index, args) in items:
+                if is_conversion_cancelled():
+                    result = ConversionCancelled()
+                else:
+                    results_connection.send(('started', index, None))
+                    try:
+                        result = func(*args)
+                    except Exception as ex:
+                        result = ex
+                try:
+                    results_connection.send(('done', index, result))
+                except Exception as ex:
+                    # result cannot be pickled
+                    results_connection.send(('done', index, RuntimeError(f'Cannot send result: {ex!r}')))
+        finally:
+            # files, which were read lazily, are completely loaded by conversion in most cases
+            store_loaded_files()
+            # worker process outlives conversion, files could change until the next one
+            clear_files_cache()
+
+
+class _Worker:
+
+    def __init__(self, process: Process, tasks_connection, results_connection):
+        self.process = process
+        self.tasks_connection = tasks_connection
+        self.results_connection = results_connection
+        # items of running task, which are not finished yet
+        self.items = None
+        # index of file being converted and start time
+        self.current = None
+        self.tasks_done = 0
+
+
+class ConversionWorkerPool:
+    """
+    Pool of conversion worker processes with shared resource store. Started on the first conversion and reused by the
+    next ones, restarted only if multiprocessing settings change: application settings are applied by workers for
+    every task. Conversions run one at a time. Unlike multiprocessing.Pool, it knows which file every worker converts:
+    - file, which is converted longer than timeout, or crashes worker process, is retried once in the end of
+      conversion, then reported as ConversionTimeout/WorkerCrashed. Hung worker is killed and replaced
+    - running conversion can be cancelled: workers finish current files and skip the rest, a hung file is still
+      limited by timeout. In terminal the first Ctrl+C cancels conversion, the second one kills workers
+    Pool.imap_unordered cannot do it: it does not tell, which file a worker is busy with, and a hung task blocks its
+    iterator with no way to kill only that worker. Its options have equivalents here: tasks are sized by
+    conversion_planner.chunk_batches instead of chunksize, max_tasks_per_child replaces worker after given amount of
+    tasks as maxtasksperchild does
+    """
+
+    def __init__(self):
+        # held for the time of conversion
+        self._lock = threading.Lock()
+        self._workers: List[_Worker] = []
+        self._retired: List[Process] = []
+        self._manager = None
+        self._store = None
+        self._cancel_event = None
+        self._settings = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _start(self, processes: int, shared_cache_size: int, max_tasks_per_child: Optional[int]):
+        # application settings are sent with every task, workers are restarted only for pool settings
+        settings = (processes, shared_cache_size, max_tasks_per_child)
+        if self._workers and self._settings == settings:
+            return
+        self._stop()
+        if shared_cache_size > 0:
+            self._manager = SharedResourceManager()
+            self._manager.start()
+            self._store = self._manager.SharedResourceStore(shared_cache_size)
+        self._cancel_event = Event()
+        self._workers = [self._spawn_worker() for _ in range(processes)]
+        self._settings = settings
+
+    def _spawn_worker(self) -> _Worker:
+        (tasks_reader, tasks_writer) = Pipe(duplex=False)
+        (results_reader, results_writer) = Pipe(duplex=False)
+        process = Process(target=_worker_main,
+                          args=(tasks_reader, results_writer, is_stdout_redirected(), self._store, self._cancel_event),
+                          daemon=True)
+        process.start()
+        tasks_reader.close()
+        results_writer.close()
+        return _Worker(process, tasks_writer, results_reader)
+
+    def _replace_worker(self, worker: _Worker, kill: bool):
+        if kill:
+            worker.process.kill()
+        else:
+            worker.tasks_connection.send(None)
+        self._retired.append(worker.process)
+        worker.tasks_connection.close()
+        worker.results_connection.close()
+        self._workers[self._workers.index(worker)] = self._spawn_worker()
+        self._retired = [x for x in self._retired if x.is_alive()]
+
+    def _stop(self):
+        for worker in self._workers:
+            worker.process.kill()
+            self._retired.append(worker.process)
+            worker.tasks_connection.close()
+            worker.results_connection.close()
+        for process in self._retired:
+            process.join()
+        if self._manager is not None:
+            self._manager.shutdown()
+        self._workers, self._retired, self._manager, self._store, self._cancel_event, self._settings = \
+            [], [], None, None, None, None
+
+    def run(self, func: Callable, tasks: Iterable[List[Tuple[int, tuple]]], processes: int, shared_cache_size: int,
+            max_tasks_per_child: Optional[int] = None, file_timeout: Optional[float] = None,
+            cancel_on_interrupt: bool = False):
+        """
+        Runs func(*args) for every file of tasks in worker processes. Task is a list of (index, args), its files are
+        converted in one worker in this order, tasks are started in given order. Yields (index, result) in order of
+        completion, result of cancelled file is ConversionCancelled. Shared store is cleared before conversion, files
+        could change since the previous one
+        """
+        with self._lock:
+            self._start(processes, shared_cache_size, max_tasks_per_child)
+            self._cancel_event.clear()
+            settings = config.current_config()
+            if self._store is not None:
+                self._store.clear()
+            try:
+                queue = deque(tasks)
+                retried = set()
+                interrupted = False
+                while queue or any(worker.items for worker in self._workers):
+                    cancelled = self._cancel_event.is_set()
+                    if cancelled:
+                        while queue:
+                            for (index, _) in queue.popleft():
+                                yield index, ConversionCancelled()
+                    for worker in self._workers:
+                        if worker.items is None and queue:
+                            worker.items = deque(queue.popleft())
+                            worker.tasks_connection.send((func, list(worker.items), settings))
+                    try:
+                        ready = wait([worker.results_connection for worker in self._workers if worker.items]
+                                     + [worker.process.sentinel for worker in self._workers if worker.items],
+                                     timeout=self._wait_timeout(file_timeout))
+                    except KeyboardInterrupt:
+                        if not cancel_on_interrupt or interrupted:
+                            self._stop()
+                            raise
+                        interrupted = True
+                        logging.warning('Cancelling conversion: waiting for files being converted. '
+                                        'Press Ctrl+C again to stop immediately')
+                        self._cancel_event.set()
+                        continue
+                    for worker in list(self._workers):
+                        if not worker.items:
+                            continue
+                        failure = None
+                        if worker.results_connection in ready or worker.process.sentinel in ready:
+                            try:
+                                while worker.results_connection.poll():
+                                    result = self._handle_message(worker, worker.results_connection.recv())
+                                    if result is not None:
+                                        yield result
+                            except (EOFError, OSError):
+                                failure = WorkerCrashed(f'Worker process exited with code {worker.process.exitcode}')
+                            if failure is None and worker.items and not worker.process.is_alive():
+                                failure = WorkerCrashed(f'Worker process exited with code {worker.process.exitcode}')
+                        if (failure is None and worker.current is not None and file_timeout
+                                and time.monotonic() - worker.current[1] > file_timeout):
+                            failure = ConversionTimeout(f'Conversion did not finish in {file_timeout} seconds')
+                        if failure is not None:
+                            yield from self._handle_failure(worker, failure, queue, retried)
+                        elif worker.items is not None and not worker.items:
+                            # task is finished
+                            worker.items = None
+                            worker.tasks_done += 1
+                            if max_tasks_per_child and worker.tasks_done >= max_tasks_per_child:
+                                # releases memory, which worker process could collect
+                                self._replace_worker(worker, kill=False)
+            finally:
+                if any(worker.items for worker in self._workers):
+                    # conversion is abandoned by caller or interrupted: workers should not continue it
+                    self._stop()
+
+    def _wait_timeout(self, file_timeout: Optional[float]) -> float:
+        timeout = POLL_INTERVAL
+        if file_timeout:
+            now = time.monotonic()
+            for worker in self._workers:
+                if worker.current is not None:
+                    timeout = min(timeout, max(worker.current[1] + file_timeout - now, 0) + 0.01)
+        return timeout
+
+    def _handle_message(self, worker: _Worker, message):
+        (kind, index, result) = message
+        if kind == 'started':
+            worker.current = (index, time.monotonic())
+            return None
+        worker.current = None
+        worker.items.popleft()
+        return index, result
+
+    def _handle_failure(self, worker: _Worker, failure: Exception, queue: deque, retried: set):
+        (index, args) = worker.items.popleft()
+        if worker.current is not None:
+            elapsed = time.monotonic() - worker.current[1]
+            failure.args = (f'{failure.args[0]} (elapsed {elapsed:.1f} seconds)',)
+        # the rest of task is converted by another worker first
+        if worker.items:
+            queue.appendleft(list(worker.items))
+        worker.items = None
+        worker.current = None
+        self._replace_worker(worker, kill=True)
+        if index in retried:
+            yield index, failure
+        else:
+            retried.add(index)
+            logging.warning(f'{failure.__class__.__name__}: {failure}. File will be retried in the end')
+            queue.append([(index, args)])
+
+    def shared_store_stats(self) -> Optional[dict]:
+        return self._store.stats() if self._store is not None else None
+
+    def cancel(self):
+        cancel_event = self._cancel_event
+        if cancel_event is not None and self._lock.locked():
+            cancel_event.set()
+
+    def close(self):
+        with self._lock:
+            self._stop()
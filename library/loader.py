@@ -1,13 +1,21 @@
+import os
+import shutil
+from contextlib import contextmanager
 from io import BufferedReader, BytesIO, SEEK_CUR
 from os.path import getsize
 from typing import Tuple
 
+from library.parse_cache import get_parse_cache
 from library.read_blocks import DataBlock
+from library.shared_resource_cache import load_shared, store_shared
+from library.utils.lazy_list import has_pending_items
+from library.utils.memory_view_buffer import MemoryViewBuffer
+from library.utils.write_sink import WriteSink
 
 
 # this looks like a mess, but it is intended to be like that: by using local imports we dramatically increase
 # performance, because we spawn process per file, and it doesn't need to load all those classes every time
-def _find_block_class(buffer: [BufferedReader, BytesIO], file_path: str, length = None):
+def _find_block_class(buffer: [BufferedReader, BytesIO, MemoryViewBuffer], file_path: str, length = None):
     header_bytes = buffer.read(4)
     buffer.seek(-len(header_bytes), SEEK_CUR)
     try:
@@ -138,7 +146,7 @@ def _find_block_class(buffer: [BufferedReader, BytesIO], file_path: str, length
     return None
 
 
-def probe_block_class(binary_file: [BufferedReader, BytesIO], file_path: str = None, length=None, resources_to_pick=None):
+def probe_block_class(binary_file: [BufferedReader, BytesIO, MemoryViewBuffer], file_path: str = None, length=None, resources_to_pick=None):
     block_class = _find_block_class(binary_file, file_path, length)
     if block_class and (not resources_to_pick or block_class in resources_to_pick):
         return block_class
@@ -153,9 +161,30 @@ def id_to_path(id: str) -> str:
     return id.split('__')[0].replace('---DRIVE', ':')
 
 
+# paths of files, loaded with require_resource while tracking is enabled
+_required_files = None
+
+
+@contextmanager
+def track_required_files():
+    """
+    Collects paths of files, loaded with require_resource inside of the context, e.g. by serializer of another file.
+    Yields set of paths, which is filled until the end of context
+    """
+    global _required_files
+    previous = _required_files
+    _required_files = set()
+    try:
+        yield _required_files
+    finally:
+        _required_files = previous
+
+
 def require_resource(id: str) -> Tuple[Tuple[str, "DataBlock", dict], Tuple[str, "DataBlock", dict]]:
     file_path = id_to_path(id)
-    (file_id, block, data) = require_file(file_path)
+    if _required_files is not None:
+        _required_files.add(file_path)
+    (file_id, block, data) = require_file(file_path, shared=True)
     if not data:
         return (id, None, None), (file_id, None, None)
     if file_id == id:
@@ -169,15 +198,21 @@ def require_resource(id: str) -> Tuple[Tuple[str, "DataBlock", dict], Tuple[str,
 
 # not shared between processes: in most cases if file requires another resource, it is in the same file, or it
 # requires one external file multiple times. It will be more time-consuming to serialize/deserialize it for sharing
-# between processes than load some file multiple times. + we avoid potential memory leaks
+# between processes than load some file multiple times. + we avoid potential memory leaks. External files, required
+# via require_resource, go through shared store of conversion (see shared_resource_cache)
 
 # TODO use root_ctx instead?
 files_cache = {}
 
+# parsed files, which should be stored to parse cache or shared store, but have lazily read parts (archive children):
+# pickling would decode all of them. Stored by store_loaded_files, if everything is loaded by then, e.g. in the end of conversion task
+_deferred_stores = {}
+
 
 def clear_file_cache(path: str):
     try:
         name = path_to_name(path)
+        _deferred_stores.pop(name, None)
         del files_cache[name]
         from library.read_blocks import DataBlock
         if name in DataBlock.root_read_ctx.children:
@@ -186,17 +221,77 @@ def clear_file_cache(path: str):
         pass
 
 
-def require_file(path: str) -> Tuple[str, "DataBlock", dict]:
+def clear_files_cache():
+    files_cache.clear()
+    _deferred_stores.clear()
+    from library.read_blocks import DataBlock
+    DataBlock.root_read_ctx.children.clear()
+
+
+# shared: file is likely to be required by other worker processes of conversion (e.g. file with textures for
+# geometry), so it is taken from/put to shared store of conversion, if there is one
+def require_file(path: str, shared: bool = False) -> Tuple[str, "DataBlock", dict]:
     name = path_to_name(path)
     (block, data) = files_cache.get(name, (None, None))
     if block is None or data is None:
-        with open(path, 'rb', buffering=100 * 1024 * 1024) as bdata:
-            file_size = getsize(path)
+        file_size = getsize(path)
+        # memory-mapped buffer: no read syscalls and no intermediate copies of the whole file. Empty file cannot be
+        # mapped, fall back to regular reader
+        with MemoryViewBuffer.from_file(path) if file_size > 0 else open(path, 'rb') as bdata:
             block_class = probe_block_class(bdata, path, file_size)
             block = block_class()
-            DataBlock.root_read_ctx.buffer = bdata
-            DataBlock.root_read_ctx.read_start_offset = 0
-            DataBlock.root_read_ctx.read_bytes_amount = file_size
-            data = block.unpack(DataBlock.root_read_ctx, name=name, read_bytes_amount=file_size)
+            data = load_shared(name) if shared else None
+            if data is None:
+                # persistent cache between runs, if enabled in settings
+                parse_cache = get_parse_cache()
+                data = parse_cache.load(path, block_class) if parse_cache else None
+                if data is None:
+                    DataBlock.root_read_ctx.buffer = bdata
+                    DataBlock.root_read_ctx.read_start_offset = 0
+                    DataBlock.root_read_ctx.read_bytes_amount = file_size
+                    data = block.unpack(DataBlock.root_read_ctx, name=name, read_bytes_amount=file_size)
+                    if parse_cache:
+                        _store_when_loaded(name, data, lambda x: parse_cache.store(path, block_class, x))
+                if shared:
+                    _store_when_loaded(name, data, lambda x: store_shared(name, x))
             files_cache[name] = (block, data)
     return name, block, data
+
+
+def _store_when_loaded(name: str, data, store_func):
+    if has_pending_items(data):
+        _deferred_stores.setdefault(name, (data, []))[1].append(store_func)
+    else:
+        store_func(data)
+
+
+def store_loaded_files():
+    """
+    Stores parsed files, which had lazily read parts, if all of them are loaded now. The rest are not stored: they
+    are read lazily next time as well
+    """
+    for (data, store_funcs) in _deferred_stores.values():
+        if not has_pending_items(data):
+            for store_func in store_funcs:
+                store_func(data)
+    _deferred_stores.clear()
+
+
+def write_file(path: str, block: "DataBlock", data):
+    """
+    Packs data straight to the file, without building the whole file in memory. Data is written to temporary file
+    next to the destination, which replaces it in the end: destination can be the file, which data was read from, and
+    it can still be read lazily during write
+    """
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        # readable: some blocks read written bytes back, e.g. checksum
+        with open(temp_path, 'w+b') as f:
+            block.pack_into(WriteSink(f), data)
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
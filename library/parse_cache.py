@@ -0,0 +1,185 @@
+import hashlib
+import os
+import pickle
+from functools import lru_cache
+from typing import List, Optional
+
+from version import __version__
+
+# bump when format of entries changes
+CACHE_FORMAT_VERSION = 1
+ENTRY_MAGIC = b'NFSPARSED' + bytes([CACHE_FORMAT_VERSION])
+ENTRIES_DIR = 'entries'
+PATHS_DIR = 'paths'
+HASH_CHUNK_SIZE = 1024 * 1024
+# eviction scans the whole cache directory, so process does it only after writing this part of max size
+EVICTION_CHECK_FRACTION = 0.05
+
+
+def hash_sources(digest, packages: List[str]):
+    """
+    Updates digest with paths and content of python source files of packages. In frozen build sources are not
+    available, nothing is added
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for package in packages:
+        for (dir_path, dir_names, file_names) in os.walk(os.path.join(root, package)):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                if not file_name.endswith('.py'):
+                    continue
+                file_path = os.path.join(dir_path, file_name)
+                digest.update(os.path.relpath(file_path, root).replace('\\', '/').encode())
+                with open(file_path, 'rb') as f:
+                    digest.update(f.read())
+
+
+@lru_cache(maxsize=None)
+def schema_version() -> str:
+    """
+    Version of parsed data format: hash of application version and source code of read blocks, resources and their
+    utils. Any change there invalidates all cache entries. In frozen build sources are not available, application
+    version is used alone
+    """
+    digest = hashlib.sha1(f'{CACHE_FORMAT_VERSION}:{__version__}'.encode())
+    hash_sources(digest, ['library', 'resources'])
+    return digest.hexdigest()
+
+
+def file_content_hash(file_path: str) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    Persistent content-addressed cache of parsed files. Entry is a decoded data tree of file, pickled, keyed by hash
+    of file content, block class and schema_version. To avoid hashing unchanged files, every file path has a small
+    record with size, modification time and content hash of the file. Total size of entries is limited, least
+    recently used entries are removed first. Entries are trusted pickles, so cache directory should not be writable
+    by anyone else
+    """
+
+    def __init__(self, path: str, max_size: int):
+        self.path = path
+        self.max_size = max_size
+        self._written_since_eviction = None
+
+    def _path_record_location(self, file_path: str) -> str:
+        key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8', errors='surrogateescape')).hexdigest()
+        return os.path.join(self.path, PATHS_DIR, key)
+
+    def _entry_location(self, content_hash: str, block_class) -> str:
+        key = hashlib.sha1(f'{schema_version()}:{block_class.__module__}.{block_class.__qualname__}:'
+                           f'{content_hash}'.encode()).hexdigest()
+        return os.path.join(self.path, ENTRIES_DIR, key[:2], key)
+
+    @staticmethod
+    def _write_atomically(location: str, content: bytes):
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+        temp_location = f'{location}.{os.getpid()}.tmp'
+        with open(temp_location, 'wb') as f:
+            f.write(content)
+        os.replace(temp_location, location)
+
+    def content_hash(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        record_location = self._path_record_location(file_path)
+        try:
+            with open(record_location, 'r') as f:
+                (size, mtime, content_hash) = f.read().split()
+            if int(size) == stat.st_size and int(mtime) == stat.st_mtime_ns:
+                return content_hash
+        except (OSError, ValueError):
+            pass
+        content_hash = file_content_hash(file_path)
+        try:
+            self._write_atomically(record_location, f'{stat.st_size} {stat.st_mtime_ns} {content_hash}'.encode())
+        except OSError:
+            pass
+        return content_hash
+
+    # returns parsed data of file or None if it is not cached
+    def load(self, file_path: str, block_class):
+        try:
+            location = self._entry_location(self.content_hash(file_path), block_class)
+            with open(location, 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None
+        try:
+            if not content.startswith(ENTRY_MAGIC):
+                raise ValueError('Unknown cache entry format')
+            data = pickle.loads(memoryview(content)[len(ENTRY_MAGIC):])
+        except Exception:
+            # broken entry, e.g. written by interrupted process of older version
+            self._remove(location)
+            return None
+        try:
+            # modification time of entry is its last usage time for eviction
+            os.utime(location)
+        except OSError:
+            pass
+        return data
+
+    # saves parsed data of file. Pickling loads all lazily loaded parts of data, so they should be loaded already
+    def store(self, file_path: str, block_class, data):
+        try:
+            content = ENTRY_MAGIC + pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # some data cannot be pickled, file will be parsed every time
+            return
+        try:
+            self._write_atomically(self._entry_location(self.content_hash(file_path), block_class), content)
+        except OSError:
+            return
+        if self._written_since_eviction is not None:
+            self._written_since_eviction += len(content)
+        if (self._written_since_eviction is None
+                or self._written_since_eviction >= self.max_size * EVICTION_CHECK_FRACTION):
+            self.evict()
+
+    def evict(self):
+        self._written_since_eviction = 0
+        entries = []
+        for (dir_path, _, file_names) in os.walk(os.path.join(self.path, ENTRIES_DIR)):
+            for file_name in file_names:
+                try:
+                    stat = os.stat(os.path.join(dir_path, file_name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, os.path.join(dir_path, file_name)))
+        total_size = sum(size for (_, size, _) in entries)
+        entries.sort()
+        for (_, size, location) in entries:
+            if total_size <= self.max_size:
+                break
+            self._remove(location)
+            total_size -= size
+
+    @staticmethod
+    def _remove(location: str):
+        try:
+            os.remove(location)
+        except OSError:
+            pass
+
+
+_parse_caches = {}
+
+
+def get_parse_cache() -> Optional[ParseCache]:
+    from config import general_config, PARSE_CACHE_PATH
+    config = general_config()
+    if not config.parse_cache_enabled:
+        return None
+    path = config.parse_cache_path or PARSE_CACHE_PATH
+    max_size = int(config.parse_cache_max_size_mb) * 1024 * 1024
+    cache = _parse_caches.get(path)
+    if cache is None:
+        cache = _parse_caches[path] = ParseCache(path, max_size)
+    cache.max_size = max_size
+    return cache
@@ -1,6 +1,43 @@
+import traceback
 from abc import ABC
+from bisect import bisect_right
+from typing import List, Tuple
 
-from library.read_blocks import CompoundBlock, DeclarativeCompoundBlock, BytesBlock, UTF8Block
+from library.context import ReadContext, WriteContext
+from library.exceptions import BlockDefinitionException
+from library.read_blocks import CompoundBlock, DeclarativeCompoundBlock, BytesBlock, UTF8Block, DataBlock
+from library.utils.lazy_list import LazyList
+from library.utils.memory_view_buffer import MemoryViewBuffer
+from library.utils.write_sink import WriteSink
+
+
+class ItemOffsetsIndex:
+    """
+    Offsets of archive items, relative to archive start, sorted once per archive read. Resolves the end of item (the
+    next greater offset or the end of archive) and length of item from items_descr without scanning or sorting
+    items_descr for every item. Archive read puts it to the archive data under "items_index" key, so length
+    functions of items can use it, and removes it after read together with items_descr
+    """
+
+    def __init__(self, offsets: List[int], end: int, lengths: List[int] = None):
+        self.offsets = sorted(set(offsets))
+        self.end = end
+        self.next_offsets = dict(zip(self.offsets, self.offsets[1:] + [end]))
+        self.lengths = {}
+        if lengths is not None:
+            # the first item wins, if items share offset
+            for (offset, length) in zip(reversed(offsets), reversed(lengths)):
+                self.lengths[offset] = length
+
+    def next_offset(self, offset: int) -> int:
+        res = self.next_offsets.get(offset)
+        if res is None:
+            i = bisect_right(self.offsets, offset)
+            res = self.offsets[i] if i < len(self.offsets) else self.end
+        return res
+
+    def length(self, offset: int) -> int:
+        return self.lengths[offset]
 
 
 # Base abstract class for archive blocks
@@ -9,16 +46,133 @@ from library.read_blocks import CompoundBlock, DeclarativeCompoundBlock, BytesBl
 # 2) Declare own compound block fields as usual, documentation and io friendly
 # 3) Declare fields like children offsets, children array etc. usage to be "io,doc" (skip showing in UI)
 # 4) Add `children = (ArrayBlock(child=None, length=None), {'usage': 'ui'})` to Fields class
-# 5) Update read function to produce "children" array as per structure, implemented here
-# 6) Update write function to use "children" array as per structure, and transform it to the io format
+# 5) Update read function to produce "children" array as per structure, implemented here. Length functions of items
+#    should use ItemOffsetsIndex, which read puts to the data, instead of searching items_descr
+# 6) Override build_items_descr to transform offsets of written children to the io format of items_descr
 # 7) Override estimate_packed_size (look at shpi example)
 class ArchiveBlock(DeclarativeCompoundBlock, ABC):
+
+    # when reading from memory-mapped buffer, children can be decoded on first access instead of archive read
+    lazy_children = True
+
     def __init__(self, item_block, alias_field=None, **kwargs):
         super().__init__(**kwargs)
         self.item_block = item_block
+        self.alias_field = alias_field
         fields = [('item', item_block, {}),
                   ('pre_offset_payload', BytesBlock(length=None), {}),
                   ('post_offset_payload', BytesBlock(length=None), {})]
         if alias_field is not None:
             fields.append(('alias', alias_field, {}))
         self.field_blocks_map['children'].child = CompoundBlock(fields=fields)
+
+    def can_read_children_lazily(self, ctx: ReadContext) -> bool:
+        return self.lazy_children and isinstance(ctx.buffer, MemoryViewBuffer)
+
+    # returns child and absolute position of the end of its item
+    def read_child(self, ctx: ReadContext, name: str, alias, payload_start, offset: int, length, payload_end,
+                   bytes_choice: int):
+        child = {'item': None}
+        if self.alias_field is not None:
+            child['alias'] = alias
+        child['pre_offset_payload'] = b''
+        child['post_offset_payload'] = b''
+        # bytes between the previous item (or the archive header) and this item
+        if payload_start is not None and offset > payload_start:
+            ctx.buffer.seek(payload_start)
+            child['pre_offset_payload'] = ctx.buffer.read(offset - payload_start)
+        ctx.buffer.seek(offset)
+        try:
+            child['item'] = self.item_block.unpack(ctx=ctx, name=name, read_bytes_amount=length)
+        except Exception:
+            traceback.print_exc()
+            ctx.buffer.seek(offset)
+            child['item'] = {'choice_index': bytes_choice, 'data': ctx.buffer.read(length)}
+        item_end = ctx.buffer.tell()
+        # bytes between the end of the last item and the end of archive
+        if payload_end is not None and item_end < payload_end:
+            child['post_offset_payload'] = ctx.buffer.read(payload_end - item_end)
+        return child, item_end
+
+    # ctx: archive read context, header: archive data as it was before reading children,
+    # children_descr: list of (name, alias, index of previous item in file or None, absolute payload start of the
+    # first item in file, absolute offset, length, absolute payload end of the last item in file or None).
+    # Bytes between two items are pre_offset_payload of the next one, like in eager read. They start where the
+    # previous item ends, so items before the loaded one are decoded first (in file order), if they are not yet
+    def read_children_lazily(self, ctx: ReadContext, header: dict,
+                             children_descr: List[Tuple[str, str, int, int, int, int, int]]) -> LazyList:
+        # own buffer over the same memory: the original one is closed when file read is finished
+        source = ctx.buffer.fork()
+        try:
+            bytes_choice = self.item_block.get_choice_index_by_class_name('BytesBlock')
+        except ValueError:
+            bytes_choice = -1
+        remaining = [len(children_descr)]
+        item_ends = [None] * len(children_descr)
+        children = LazyList()
+
+        def loader(index, name, alias, previous, payload_start, offset, length, payload_end):
+            def load():
+                if previous is not None:
+                    not_loaded = []
+                    i = previous
+                    while i is not None and item_ends[i] is None:
+                        not_loaded.append(i)
+                        i = children_descr[i][2]
+                    # one by one from the first one, without recursion
+                    for i in reversed(not_loaded):
+                        children[i]
+                    payload_start_ = item_ends[previous]
+                else:
+                    payload_start_ = payload_start
+                (buffer, data) = (ctx.buffer, ctx._data)
+                (ctx.buffer, ctx._data) = (source, header)
+                try:
+                    (child, item_ends[index]) = self.read_child(ctx, name, alias, payload_start_, offset, length,
+                                                                payload_end, bytes_choice)
+                finally:
+                    (ctx.buffer, ctx._data) = (buffer, data)
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    # every child is decoded, do not hold the memory anymore
+                    source.close()
+                return child
+
+            return load
+
+        children.extend(LazyList.Pending(loader(i, *descr)) for (i, descr) in enumerate(children_descr))
+        return children
+
+    # children: list of (alias, offset relative to archive start, length) of written items
+    def build_items_descr(self, children: List[Tuple[str, int, int]]) -> list:
+        raise NotImplementedError()
+
+    def write_fields_into(self, sink: WriteSink, data, ctx: WriteContext = None, name: str = ''):
+        # offsets of children are not known until they are written: items_descr is written with placeholder values
+        # of the same size and patched, when children are written to the sink. Children are not collected into
+        # data_bytes, they are written straight to the sink in write_field_into
+        data['items_descr'] = self.build_items_descr([(child.get('alias'), 0, 0) for child in data['children']])
+        data['data_bytes'] = b''
+        try:
+            super().write_fields_into(sink, data, ctx, name)
+        finally:
+            del data['items_descr']
+            del data['data_bytes']
+
+    def write_field_into(self, sink: WriteSink, name: str, field: DataBlock, data, ctx: WriteContext):
+        if name != 'data_bytes':
+            return super().write_field_into(sink, name, field, data, ctx)
+        archive_start = ctx.write_start_offset
+        children = []
+        for i, child in enumerate(ctx.get_full_data()['children']):
+            sink.write(child['pre_offset_payload'])
+            item_start = sink.tell()
+            self.item_block.pack_into(sink, data=child['item'], ctx=ctx.parent, name=str(i))
+            children.append((child.get('alias'), item_start - archive_start, sink.tell() - item_start))
+            sink.write(child['post_offset_payload'])
+        (descr_start, descr_end) = ctx.child_spans['items_descr']
+        items_descr = self.build_items_descr(children)
+        packed_descr = self.field_blocks_map['items_descr'].write(items_descr, ctx, 'items_descr')
+        if len(packed_descr) != descr_end - descr_start:
+            raise BlockDefinitionException(ctx=ctx, message='Size of items_descr depends on offsets of children')
+        sink.patch(archive_start + descr_start, packed_descr)
@@ -1,12 +1,19 @@
+import struct
 from abc import ABC
 from math import ceil
 from typing import Dict, Tuple, Any
 
+import numpy as np
+
 from library.context import ReadContext, WriteContext, DocumentationContext
 from library.exceptions import EndOfBufferException
-from library.read_blocks.basic import DataBlock, DataBlockWithChildren
-from library.read_blocks.numbers import IntegerBlock
+from library.read_blocks.basic import DataBlock, DataBlockWithChildren, STRUCT_BYTE_ORDERS
+from library.utils.bit_packing import unpack_bits, pack_bits
 from library.utils.docs import multiply_doc_numbers
+from library.utils.write_sink import WriteSink
+
+# sub-byte arrays with values up to this size deserialize values using lookup table
+MAX_LOOKUP_TABLE_BITS = 16
 
 
 class ArrayBlock(DataBlockWithChildren, DataBlock, ABC):
@@ -87,17 +94,38 @@ class ArrayBlock(DataBlockWithChildren, DataBlock, ABC):
         res = []
         self_ctx = ctx.get_or_create_child(name, self, read_bytes_amount, res)
         self_len = self.resolve_length(ctx) if resolved_length is None else resolved_length
-        if self.child.__class__ == IntegerBlock and self.child.length == 1 and not self.child.is_signed:
-            res = list(ctx.buffer.read(self_len))
-            if len(res) < self_len:
+        numpy_dtype = self.child.numpy_dtype
+        if numpy_dtype is not None and self.child.value_validator is None:
+            # numbers: decode the whole array at once
+            raw = ctx.read_view(self_len * numpy_dtype.itemsize)
+            if len(raw) < self_len * numpy_dtype.itemsize:
                 raise EndOfBufferException(ctx=ctx)
-            self_ctx.res = res
+            res = self.child.from_numpy_values(np.frombuffer(raw, dtype=numpy_dtype))
+            self_ctx._data = res
+            return res
+        layout = self.child.struct_layout
+        if layout is not None:
+            # fixed-size items: decode all items with single precompiled struct
+            (byte_order, value_format, _) = layout
+            item_struct = struct.Struct(STRUCT_BYTE_ORDERS.get(byte_order, '<') + value_format)
+            raw = ctx.read_view(self_len * item_struct.size)
+            if len(raw) < self_len * item_struct.size:
+                raise EndOfBufferException(ctx=ctx)
+            should_validate = self.child.value_validator is not None
+            for i, values in enumerate(item_struct.iter_unpack(raw) if item_struct.size > 0 else [()] * self_len):
+                item = self.child.from_struct_values(values, 0, self_ctx)
+                if should_validate:
+                    self.child.validate_after_read(item, self_ctx, str(i))
+                res.append(item)
             return res
         for i in range(self_len):
             res.append(self.child.unpack(ctx=self_ctx, name=str(i)))
         return res
 
     def estimate_packed_size(self, data, ctx: WriteContext = None):
+        numpy_dtype = self.child.numpy_dtype
+        if numpy_dtype is not None:
+            return len(data) * numpy_dtype.itemsize
         self_ctx = WriteContext(data=data, block=self, parent=ctx)
         res = 0
         for item in data:
@@ -110,14 +138,40 @@ class ArrayBlock(DataBlockWithChildren, DataBlock, ABC):
             raise IndexError()
         return self.estimate_packed_size(data[:index], ctx)
 
+    def _to_numpy_values(self, data):
+        if self.child.numpy_dtype is None or self.child.programmatic_value is not None:
+            return None
+        try:
+            return self.child.to_numpy_values(data)
+        except (TypeError, ValueError):
+            return None
+
     def write(self, data, ctx: WriteContext = None, name: str = '') -> bytes:
-        if self.child.__class__ == IntegerBlock and self.child.length == 1 and not self.child.is_signed:
-            return bytes(data)
+        values = self._to_numpy_values(data)
+        if values is not None:
+            return values.tobytes()
         self_ctx = WriteContext(data=data, block=self, parent=ctx, name=name)
-        res = bytes()
-        for i, item in enumerate(data):
-            res += self.child.pack(data=item, ctx=self_ctx, name=str(i))
-        return res
+        return b''.join(self.child.pack(data=item, ctx=self_ctx, name=str(i)) for i, item in enumerate(data))
+
+    def write_into(self, sink: WriteSink, data, ctx: WriteContext = None, name: str = ''):
+        if type(self).write is not ArrayBlock.write:
+            # subclass prepares data in own write, it cannot be skipped
+            return super().write_into(sink, data, ctx, name)
+        self._write_items_into(sink, data, ctx, name)
+
+    def _write_items_into(self, sink: WriteSink, data, ctx: WriteContext = None, name: str = ''):
+        values = self._to_numpy_values(data)
+        if values is not None:
+            sink.write(values.tobytes())
+            return
+        self_ctx = WriteContext(sink=sink, data=data, block=self, parent=ctx, name=name)
+        child = self.child
+        if type(child).write_into is DataBlock.write_into:
+            for i, item in enumerate(data):
+                sink.write(child.pack(data=item, ctx=self_ctx, name=str(i)))
+        else:
+            for i, item in enumerate(data):
+                child.pack_into(sink, data=item, ctx=self_ctx, name=str(i))
 
 
 # TODO maybe merge with LengthPrefixedUtf8Block, make abstract
@@ -166,6 +220,10 @@ class LengthPrefixedArrayBlock(ArrayBlock):
         items = super().write(data=data, ctx=ctx, name=name)
         return self.length_block.write(len(data), ctx, 'length') + items
 
+    def write_into(self, sink: WriteSink, data, ctx: WriteContext = None, name: str = ''):
+        sink.write(self.length_block.write(len(data), ctx, 'length'))
+        self._write_items_into(sink, data, ctx, name)
+
 
 class SubByteArrayBlock(DataBlock):
 
@@ -180,6 +238,7 @@ class SubByteArrayBlock(DataBlock):
         self.bits_per_value = bits_per_value
         self.value_deserialize_func = value_deserialize_func
         self.value_serialize_func = value_serialize_func
+        self._deserialized_values_table_cache = None
 
     @property
     def schema(self) -> Dict:
@@ -243,27 +302,34 @@ class SubByteArrayBlock(DataBlock):
             return []
         return [0] * self_len
 
+    # For value_deserialize_func, applied to every possible value once. Values can be deserialized with lookup then
+    @property
+    def _deserialized_values_table(self):
+        if self.bits_per_value > MAX_LOOKUP_TABLE_BITS:
+            return None
+        if self._deserialized_values_table_cache is None:
+            self._deserialized_values_table_cache = np.array(
+                [self.value_deserialize_func(x) for x in range(1 << self.bits_per_value)], dtype=object)
+        return self._deserialized_values_table_cache
+
     def read(self, ctx: ReadContext, name: str = '', read_bytes_amount=None):
         self_len = self.resolve_length(ctx)
-        raw = ctx.buffer.read(ceil(self.bits_per_value * self_len / 8))
-        bitstring = "".join([bin(x)[2:].rjust(8, "0") for x in raw])
-        values = [int(bitstring[i * self.bits_per_value:(i + 1) * self.bits_per_value], 2)
-                  for i in range(self_len)]
+        bytes_len = ceil(self.bits_per_value * self_len / 8)
+        raw = ctx.read_view(bytes_len)
+        if len(raw) < bytes_len:
+            raise EndOfBufferException(ctx=ctx)
+        values = unpack_bits(raw, self.bits_per_value, self_len)
         if self.value_deserialize_func:
-            values = [self.value_deserialize_func(x) for x in values]
-        return values
+            table = self._deserialized_values_table
+            if table is None:
+                return [self.value_deserialize_func(x) for x in values.tolist()]
+            return table[values.astype(np.intp)].tolist()
+        return values.tolist()
 
     def estimate_packed_size(self, data, ctx: WriteContext = None):
         return ceil(self.bits_per_value * len(data) / 8)
 
     def write(self, data, ctx: WriteContext = None, name: str = '') -> bytes:
-        value_serialize_func = self.value_serialize_func if self.value_serialize_func else lambda x: x
-        bitstring = "".join(bin(value_serialize_func(item))[2:].rjust(self.bits_per_value, "0") for item in data)
-        padding = len(bitstring) % 8
-        if padding != 0:
-            bitstring += '0' * (8 - padding)
-        byte_array = bytearray()
-        for i in range(0, len(bitstring), 8):
-            byte = int(bitstring[i:i + 8], 2)
-            byte_array.append(byte)
-        return bytes(byte_array)
+        if self.value_serialize_func:
+            data = [self.value_serialize_func(item) for item in data]
+        return pack_bits(data, self.bits_per_value)
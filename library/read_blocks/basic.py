@@ -1,11 +1,14 @@
 from abc import ABC, abstractmethod
-from io import SEEK_CUR
-from typing import Dict, Any, Tuple
+from io import SEEK_CUR, SEEK_END
+from typing import Dict, Any, Tuple, Optional
 
 from library.context import ReadContext, WriteContext, DocumentationContext
 from library.exceptions import DataIntegrityException, BlockDefinitionException, EndOfBufferException
 from library.read_blocks.misc.value_validators import ValueValidator
 from library.utils import represent_value_as_str
+from library.utils.write_sink import WriteSink
+
+STRUCT_BYTE_ORDERS = {'little': '<', 'big': '>'}
 
 
 class DataBlock(ABC):
@@ -51,6 +54,32 @@ class DataBlock(ABC):
     def serializer_class(self):
         return None
 
+    # For compiled struct-based reading of compound blocks. If block is always stored as fixed sequence of values,
+    # which can be decoded by python struct module, returns tuple (byte order, struct format without byte order
+    # prefix, amount of values). Byte order is None if it does not matter. Otherwise returns None
+    @property
+    def struct_layout(self) -> Optional[Tuple[Optional[str], str, int]]:
+        return None
+
+    # builds block value from values, unpacked with struct_layout format, starting from index start
+    def from_struct_values(self, values: tuple, start: int, ctx: ReadContext):
+        raise BlockDefinitionException(ctx=ctx, message='Block does not support struct-based reading')
+
+    # For vectorized reading/writing of arrays. If block value is a single number, stored as is in the numeric type,
+    # supported by numpy, returns numpy dtype of it. Otherwise returns None
+    @property
+    def numpy_dtype(self):
+        return None
+
+    # converts numpy array of raw values with numpy_dtype to list of block values
+    def from_numpy_values(self, values) -> list:
+        raise BlockDefinitionException(message='Block does not support vectorized reading')
+
+    # converts list of block values to numpy array with numpy_dtype. Returns None if data cannot be converted without
+    # changing the result of per-item write, e.g. value is out of range. In such case items should be written one by one
+    def to_numpy_values(self, data):
+        return None
+
     @abstractmethod
     def read(self, ctx: ReadContext, name: str = '', read_bytes_amount=None):
         pass
@@ -64,6 +93,12 @@ class DataBlock(ABC):
     def write(self, data, ctx: WriteContext = None, name: str = '') -> bytes:
         pass
 
+    # streaming alternative to write: appends packed data to the sink instead of returning it. By default writes the
+    # result of write. Blocks with children (compound, arrays, archives) override it, so children are written straight
+    # into the same sink instead of being copied into the parent's bytes on every nesting level
+    def write_into(self, sink: WriteSink, data, ctx: WriteContext = None, name: str = ''):
+        sink.write(self.write(data, ctx, name))
+
     def validate_after_read(self, value, ctx: ReadContext = root_read_ctx, name: str = ''):
         if self.value_validator and not self.value_validator.validate(value):
             raise DataIntegrityException(ctx=ctx, message=f'Expected {self.value_validator}, '
@@ -72,8 +107,12 @@ class DataBlock(ABC):
 
     ### final method, should never override
     def unpack(self, ctx: ReadContext = root_read_ctx, name: str = '', read_bytes_amount=None):
-        v = self.read(ctx=ctx, name=name, read_bytes_amount=read_bytes_amount)
-        self.validate_after_read(v, ctx, name)
+        try:
+            v = self.read(ctx=ctx, name=name, read_bytes_amount=read_bytes_amount)
+            self.validate_after_read(v, ctx, name)
+        finally:
+            # context of block, if read created it, is not needed anymore: data is returned to parent
+            ctx.children.pop(name, None)
         return v
 
     ### final method, should never override
@@ -82,6 +121,13 @@ class DataBlock(ABC):
             data = self.programmatic_value(ctx)
         return self.write(data, ctx, name)
 
+    ### final method, should never override
+    ### sink: WriteSink over bytearray or binary file object, opened for writing
+    def pack_into(self, sink: WriteSink, data, ctx: WriteContext = None, name: str = ''):
+        if self.programmatic_value:
+            data = self.programmatic_value(ctx)
+        self.write_into(sink, data, ctx, name)
+
 
 class DataBlockWithChildren(ABC):
 
@@ -101,10 +147,13 @@ class DataBlockWithChildren(ABC):
 
 class BytesBlock(DataBlock):
 
-    def __init__(self, length, allow_negative_length=False, **kwargs):
+    # skip_on_read: read only moves buffer position past the bytes and returns their amount instead of bytes. For
+    # fields, which are removed from data after read (archive heaps), so their bytes are never copied to memory
+    def __init__(self, length, allow_negative_length=False, skip_on_read=False, **kwargs):
         super().__init__(**kwargs)
         self._length = length
         self.allow_negative_length = allow_negative_length
+        self.skip_on_read = skip_on_read
 
     # For auto-generated documentation only
     @property
@@ -154,6 +203,16 @@ class BytesBlock(DataBlock):
             return b''
         return bytes([0] * self_len)
 
+    @property
+    def struct_layout(self):
+        if (type(self).read is not BytesBlock.read or self.skip_on_read or not isinstance(self._length, int)
+                or self._length < 0):
+            return None
+        return None, f'{self._length}s', 1
+
+    def from_struct_values(self, values: tuple, start: int, ctx: ReadContext):
+        return values[start]
+
     def read(self, ctx: ReadContext, name: str = '', read_bytes_amount=None):
         self_len = self.resolve_length(ctx)
         if self_len < 0:
@@ -161,6 +220,12 @@ class BytesBlock(DataBlock):
                 ctx.buffer.seek(self_len, SEEK_CUR)
                 return b''
             raise BlockDefinitionException(ctx=ctx, message='Cannot read bytes block with negative length')
+        if self.skip_on_read:
+            position = ctx.buffer.tell()
+            if ctx.buffer.seek(0, SEEK_END) < position + self_len:
+                raise EndOfBufferException(ctx=ctx.get_or_create_child(name, self))
+            ctx.buffer.seek(position + self_len)
+            return self_len
         res = ctx.buffer.read(self_len)
         if len(res) < self_len:
             raise EndOfBufferException(ctx=ctx.get_or_create_child(name, self))
@@ -1,13 +1,16 @@
+import struct
 from abc import ABC
 from typing import Dict, List, Tuple, Any, TypedDict, Union
 
 from library.utils.class_property import class_property
 
 from library.context import ReadContext, WriteContext
-from library.exceptions import BlockDefinitionException, DataIntegrityException
-from library.read_blocks.basic import DataBlock, DataBlockWithChildren
+from library.exceptions import BlockDefinitionException, DataIntegrityException, EndOfBufferException
+from library.read_blocks.basic import DataBlock, DataBlockWithChildren, STRUCT_BYTE_ORDERS
+from library.read_blocks.misc.programmatic_values import BackPatchedValue
 from library.read_blocks.numbers import IntegerBlock
 from library.utils.docs import add_doc_numbers
+from library.utils.write_sink import WriteSink
 
 
 class FieldExtras(TypedDict, total=False):
@@ -29,6 +32,27 @@ class FieldExtras(TypedDict, total=False):
     usage: str
 
 
+def is_io_field(extras: FieldExtras) -> bool:
+    usage = extras.get('usage', 'everywhere')
+    return usage == 'everywhere' or 'io' in usage
+
+
+class StructRun:
+    """
+    Sequence of consecutive fixed-layout fields of compound block, which is read with a single struct.unpack call.
+    Fields are stored as tuples (name, block, index of the first value, whether value should be validated)
+    """
+
+    def __init__(self, byte_order: str, fields: List[Tuple[str, DataBlock, int, bool]], value_formats: List[str],
+                 values_count: int):
+        self.byte_order = byte_order
+        self.fields = fields
+        self.format = ''.join(value_formats)
+        self.values_count = values_count
+        self.struct = struct.Struct(STRUCT_BYTE_ORDERS.get(byte_order, '<') + self.format)
+        self.size = self.struct.size
+
+
 class CompoundBlock(DataBlockWithChildren, DataBlock, ABC):
 
     # accepts list of fields. Field should be declared as tuple (name, block, extras)
@@ -40,6 +64,62 @@ class CompoundBlock(DataBlockWithChildren, DataBlock, ABC):
         self.field_blocks = [(name, instance) for (name, instance, _) in self.fields]
         self.field_blocks_map = {name: res for (name, res, _) in self.fields}
         self.field_extras_map = {name: extra for (name, _, extra) in self.fields}
+        self.io_field_blocks = [(name, instance) for (name, instance, extras) in self.fields if is_io_field(extras)]
+        self.read_plan = self._compile_read_plan()
+        self._write_plan = None
+        self._has_custom_write = type(self).write is not CompoundBlock.write
+        self._has_custom_field_writer = type(self).write_field_into is not CompoundBlock.write_field_into
+
+    # Splits IO fields to runs of consecutive fixed-layout fields, which are read by precompiled struct, and fields
+    # with dynamic layout, read by generic unpack. Returns list, where every item is either StructRun or tuple
+    # (name, block)
+    def _compile_read_plan(self) -> List[Union[StructRun, Tuple[str, DataBlock]]]:
+        plan = []
+        run = None
+        for name, field in self.io_field_blocks:
+            layout = field.struct_layout
+            if layout is not None and run is not None:
+                (byte_order, _, _) = layout
+                if byte_order is not None and run['byte_order'] is not None and byte_order != run['byte_order']:
+                    # struct format supports only one byte order, start new run
+                    plan.append(run)
+                    run = None
+            if layout is None:
+                if run is not None:
+                    plan.append(run)
+                    run = None
+                plan.append((name, field))
+                continue
+            (byte_order, value_format, values_count) = layout
+            if run is None:
+                run = {'byte_order': None, 'fields': [], 'formats': [], 'values_count': 0}
+            run['byte_order'] = run['byte_order'] or byte_order
+            run['fields'].append((name, field, run['values_count'], field.value_validator is not None))
+            run['formats'].append(value_format)
+            run['values_count'] += values_count
+        if run is not None:
+            plan.append(run)
+        return [StructRun(step['byte_order'], step['fields'], step['formats'], step['values_count'])
+                if isinstance(step, dict) else step
+                for step in plan]
+
+    # compound block, which consists of fixed-layout fields only, can be a part of parent's struct run
+    @property
+    def struct_layout(self):
+        if type(self).read is not CompoundBlock.read or len(self.read_plan) != 1:
+            return None
+        run = self.read_plan[0]
+        if not isinstance(run, StructRun):
+            return None
+        return run.byte_order, run.format, run.values_count
+
+    def from_struct_values(self, values: tuple, start: int, ctx: ReadContext):
+        res = dict()
+        for name, field, index, should_validate in self.read_plan[0].fields:
+            res[name] = value = field.from_struct_values(values, start + index, ctx)
+            if should_validate:
+                field.validate_after_read(value, ctx, name)
+        return res
 
     @property
     def schema(self) -> Dict:
@@ -85,10 +165,7 @@ class CompoundBlock(DataBlockWithChildren, DataBlock, ABC):
         acc = 0
         if callable(self.fields):
             return '?'
-        for name, field in self.field_blocks:
-            usage = self.field_extras_map.get(name, {}).get('usage', 'everywhere')
-            if usage != 'everywhere' and 'io' not in usage:
-                continue
+        for name, field in self.io_field_blocks:
             field_size_doc = field.size_doc_str
             acc = add_doc_numbers(acc, field_size_doc, show_expressions=False, produce_ranges=True)
         return acc
@@ -104,30 +181,32 @@ class CompoundBlock(DataBlockWithChildren, DataBlock, ABC):
     def read(self, ctx: ReadContext, name: str = '', read_bytes_amount=None):
         res = dict()
         self_ctx = ctx.get_or_create_child(name, self, read_bytes_amount, res)
-        for name, field in self.field_blocks:
-            usage = self.field_extras_map.get(name, {}).get('usage', 'everywhere')
-            if usage != 'everywhere' and 'io' not in usage:
+        for step in self.read_plan:
+            if type(step) is not StructRun:
+                (name, field) = step
+                res[name] = field.unpack(ctx=self_ctx, name=name)
                 continue
-            res[name] = field.unpack(ctx=self_ctx, name=name)
+            raw = self_ctx.read_view(step.size)
+            if len(raw) < step.size:
+                raise EndOfBufferException(ctx=self_ctx)
+            values = step.struct.unpack(raw)
+            for name, field, index, should_validate in step.fields:
+                res[name] = value = field.from_struct_values(values, index, self_ctx)
+                if should_validate:
+                    field.validate_after_read(value, self_ctx, name)
         return res
 
     def estimate_packed_size(self, data, ctx: WriteContext = None):
         self_ctx = WriteContext(data=data, block=self, parent=ctx)
         res = 0
-        for name, field in self.field_blocks:
-            usage = self.field_extras_map.get(name, {}).get('usage', 'everywhere')
-            if usage != 'everywhere' and 'io' not in usage:
-                continue
+        for name, field in self.io_field_blocks:
             res += field.estimate_packed_size(data=data.get(name), ctx=self_ctx)
         return res
 
     def offset_to_child_when_packed(self, data, child_name: str, ctx: WriteContext = None):
         self_ctx = WriteContext(data=data, block=self, parent=ctx)
         res = 0
-        for name, field in self.field_blocks:
-            usage = self.field_extras_map.get(name, {}).get('usage', 'everywhere')
-            if usage != 'everywhere' and 'io' not in usage:
-                continue
+        for name, field in self.io_field_blocks:
             if name == child_name:
                 return res
             res += field.estimate_packed_size(data=data.get(name), ctx=self_ctx)
@@ -135,14 +214,66 @@ class CompoundBlock(DataBlockWithChildren, DataBlock, ABC):
                                                       f'Child with such name not found')
 
     def write(self, data, ctx: WriteContext = None, name: str = '') -> bytes:
-        self_ctx = WriteContext(data=data, name=name, block=self, parent=ctx)
-        self_ctx.result = bytes()
-        for name, field in self.field_blocks:
-            usage = self.field_extras_map.get(name, {}).get('usage', 'everywhere')
-            if usage != 'everywhere' and 'io' not in usage:
+        sink = WriteSink()
+        self.write_fields_into(sink, data, ctx, name)
+        return sink.getvalue()
+
+    def write_into(self, sink: WriteSink, data, ctx: WriteContext = None, name: str = ''):
+        if self._has_custom_write:
+            # subclass prepares data in own write, it cannot be skipped
+            return super().write_into(sink, data, ctx, name)
+        self.write_fields_into(sink, data, ctx, name)
+
+    # used by both write and write_into. Subclass, which prepares data before writing, should override this method
+    # instead of write: overridden write is called in streaming write as well, but its result is copied to the sink
+    def write_fields_into(self, sink: WriteSink, data, ctx: WriteContext = None, name: str = ''):
+        self_ctx = WriteContext(sink=sink, data=data, name=name, block=self, parent=ctx)
+        block_start = self_ctx.write_start_offset
+        custom_field_writer = self._has_custom_field_writer
+        child_spans = self_ctx.child_spans
+        write = sink.write
+        position = 0
+        # fields, which values depend on sizes of written fields: placeholders are patched in the end
+        back_patched = []
+        for name, field, is_streamed in self.write_plan:
+            start = position
+            if isinstance(field.programmatic_value, BackPatchedValue):
+                back_patched.append((name, field, start))
+                value = bytes(field.estimate_packed_size(0, self_ctx))
+            elif custom_field_writer or is_streamed:
+                if custom_field_writer:
+                    self.write_field_into(sink, name, field, data.get(name), self_ctx)
+                else:
+                    field.pack_into(sink, data=data.get(name), ctx=self_ctx, name=name)
+                position = sink.tell() - block_start
+                child_spans[name] = (start, position)
                 continue
-            self_ctx.result += field.pack(data=data.get(name), ctx=self_ctx, name=name)
-        return self_ctx.result
+            else:
+                value = field.pack(data=data.get(name), ctx=self_ctx, name=name)
+            write(value)
+            position += len(value)
+            child_spans[name] = (start, position)
+        self_ctx.written_size = position
+        for name, field, start in back_patched:
+            (_, end) = self_ctx.child_spans[name]
+            value = field.pack(data=None, ctx=self_ctx, name=name)
+            if len(value) != end - start:
+                raise BlockDefinitionException(ctx=self_ctx, message=f'Back-patched field "{name}" should have '
+                                                                     f'fixed size')
+            sink.patch(block_start + start, value)
+
+    # writes one field of the block. ctx: context of the block
+    def write_field_into(self, sink: WriteSink, name: str, field: DataBlock, data, ctx: WriteContext):
+        field.pack_into(sink, data=data, ctx=ctx, name=name)
+
+    # (name, block, is_streamed) of IO fields. Fields, which are not streamed, do not override write_into, so
+    # they are packed to bytes as usual
+    @property
+    def write_plan(self) -> List[Tuple[str, DataBlock, bool]]:
+        if self._write_plan is None:
+            self._write_plan = [(name, field, type(field).write_into is not DataBlock.write_into)
+                                for name, field in self.io_field_blocks]
+        return self._write_plan
 
 
 class SubByteCompoundBlock(IntegerBlock):
@@ -201,8 +332,19 @@ class SubByteCompoundBlock(IntegerBlock):
                 res[alias] = 0
         return res
 
+    @property
+    def struct_layout(self):
+        if type(self).read is not SubByteCompoundBlock.read:
+            return None
+        return self._integer_struct_layout()
+
+    def from_struct_values(self, values: tuple, start: int, ctx: ReadContext):
+        return self._split_bits(self._integer_from_struct_values(values, start))
+
     def read(self, ctx: ReadContext, name: str = '', read_bytes_amount=None):
-        raw_value = super().read(ctx, name, read_bytes_amount)
+        return self._split_bits(super().read(ctx, name, read_bytes_amount))
+
+    def _split_bits(self, raw_value: int) -> dict:
         res = {}
         current_bit = self.length * 8
         for size, alias, type_name, details, _ in self._schema_def:
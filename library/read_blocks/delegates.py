@@ -6,6 +6,7 @@ from library.context import ReadContext, WriteContext, DocumentationContext
 from library.exceptions import DataIntegrityException
 from library.read_blocks.basic import DataBlock, BytesBlock
 from library.utils.id import join_id
+from library.utils.write_sink import WriteSink
 
 
 class DelegateBlock(DataBlock):
@@ -106,6 +107,13 @@ class DelegateBlock(DataBlock):
         delegated_block, data = self.possible_blocks[data['choice_index']], data['data']
         return delegated_block.write(data, ctx=ctx, name=name)
 
+    def write_into(self, sink: WriteSink, data, ctx: WriteContext = None, name: str = ''):
+        if type(self).write is not DelegateBlock.write:
+            # subclass prepares data in own write (e.g. compresses it), it cannot be skipped
+            return super().write_into(sink, data, ctx, name)
+        delegated_block, data = self.possible_blocks[data['choice_index']], data['data']
+        delegated_block.write_into(sink, data, ctx=ctx, name=name)
+
     def validate_after_read(self, value, ctx: ReadContext = DataBlock.root_read_ctx, name: str = ''):
         delegated_block, data = self.possible_blocks[value['choice_index']], value['data']
         return delegated_block.validate_after_read(data, ctx=ctx, name=name)
@@ -164,4 +172,9 @@ class EnumLookupDelegateBlock(DelegateBlock):
         data['choice_index'] = _enum_lookup(ctx, self.enum_field, len(self.possible_blocks) - 1)
         return super().write(data, ctx, name)
 
+    def write_into(self, sink: WriteSink, data, ctx: WriteContext = None, name: str = ''):
+        data['choice_index'] = _enum_lookup(ctx, self.enum_field, len(self.possible_blocks) - 1)
+        delegated_block, data = self.possible_blocks[data['choice_index']], data['data']
+        delegated_block.write_into(sink, data, ctx=ctx, name=name)
+
 
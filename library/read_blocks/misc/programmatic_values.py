@@ -0,0 +1,32 @@
+class BackPatchedValue:
+    """
+    Programmatic value of fixed-size field, which depends on packed size of compound block or offsets of its fields:
+    block length, pointer to child. Compound block writes placeholder instead of such field and patches it, when all
+    fields are written, so sizes are taken from written bytes instead of estimating packed size of the whole block
+    once more (for nested archives - once per nesting level). func receives WriteContext of compound block, see
+    WriteContext.packed_size and WriteContext.offset_to_child. Outside of compound block write sizes are estimated
+    """
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, ctx):
+        return self.func(ctx)
+
+
+class PackedSize(BackPatchedValue):
+    """
+    Packed size of compound block in bytes, or of its field, if child_name provided
+    """
+
+    def __init__(self, child_name: str = None):
+        super().__init__(lambda ctx: ctx.packed_size(child_name))
+
+
+class OffsetToChild(BackPatchedValue):
+    """
+    Offset to field of compound block, relative to block start
+    """
+
+    def __init__(self, child_name: str):
+        super().__init__(lambda ctx: ctx.offset_to_child(child_name))
@@ -1,9 +1,13 @@
 import struct
 from typing import Dict, Literal, List, Tuple
 
+import numpy as np
+
 from library.context import ReadContext, WriteContext
 from library.exceptions import EndOfBufferException, DataIntegrityException
-from library.read_blocks.basic import DataBlock
+from library.read_blocks.basic import DataBlock, STRUCT_BYTE_ORDERS
+
+STRUCT_INTEGER_CODES = {1: 'b', 2: 'h', 4: 'i', 8: 'q'}
 
 
 class IntegerBlock(DataBlock):
@@ -40,8 +44,58 @@ class IntegerBlock(DataBlock):
             return self.value_validator.new_data()
         return 0
 
+    # struct layout of raw integer value. Lengths, not supported by struct module, are read as bytes
+    def _integer_struct_layout(self):
+        code = STRUCT_INTEGER_CODES.get(self.length)
+        if code is None:
+            return None, f'{self.length}s', 1
+        return (self.byte_order if self.length > 1 else None), (code.upper() if not self.is_signed else code), 1
+
+    def _integer_from_struct_values(self, values: tuple, start: int) -> int:
+        value = values[start]
+        if self.length in STRUCT_INTEGER_CODES:
+            return value
+        return int.from_bytes(value, byteorder=self.byte_order, signed=self.is_signed)
+
+    @property
+    def struct_layout(self):
+        if type(self).read is not IntegerBlock.read:
+            # subclass with custom decoding
+            return None
+        return self._integer_struct_layout()
+
+    def from_struct_values(self, values: tuple, start: int, ctx: ReadContext):
+        return self._integer_from_struct_values(values, start)
+
+    def _integer_numpy_dtype(self):
+        if self.length not in STRUCT_INTEGER_CODES:
+            return None
+        return np.dtype(f'{STRUCT_BYTE_ORDERS[self.byte_order]}{"i" if self.is_signed else "u"}{self.length}')
+
+    @property
+    def numpy_dtype(self):
+        if type(self).read is not IntegerBlock.read:
+            return None
+        return self._integer_numpy_dtype()
+
+    def from_numpy_values(self, values) -> list:
+        return values.tolist()
+
+    def to_numpy_values(self, data):
+        if type(self).write is not IntegerBlock.write:
+            return None
+        values = np.asarray(data)
+        if values.dtype.kind not in 'iu':
+            # not integers or integers, which do not fit to int64
+            return None
+        dtype = self.numpy_dtype
+        info = np.iinfo(dtype)
+        if len(values) > 0 and (values.min() < info.min or values.max() > info.max):
+            return None
+        return values.astype(dtype)
+
     def read(self, ctx: ReadContext, name: str = '', read_bytes_amount=None):
-        raw = ctx.buffer.read(self.length)
+        raw = ctx.read_view(self.length)
         if len(raw) < self.length:
             raise EndOfBufferException(ctx=ctx)
         return int.from_bytes(raw, byteorder=self.byte_order, signed=self.is_signed)
@@ -74,6 +128,35 @@ class FixedPointBlock(IntegerBlock):
         super().__init__(**kwargs)
         self.fraction_bits = fraction_bits
 
+    @property
+    def struct_layout(self):
+        if type(self).read is not FixedPointBlock.read:
+            return None
+        return self._integer_struct_layout()
+
+    def from_struct_values(self, values: tuple, start: int, ctx: ReadContext):
+        return float(self._integer_from_struct_values(values, start) / (1 << self.fraction_bits))
+
+    @property
+    def numpy_dtype(self):
+        # 8-byte values do not fit to float64 mantissa
+        if type(self).read is not FixedPointBlock.read or self.length > 4:
+            return None
+        return self._integer_numpy_dtype()
+
+    def from_numpy_values(self, values) -> list:
+        return (values / (1 << self.fraction_bits)).tolist()
+
+    def to_numpy_values(self, data):
+        if type(self).write is not FixedPointBlock.write:
+            return None
+        values = np.asarray(data, dtype=np.float64)
+        if not np.all(np.isfinite(values)):
+            return None
+        info = np.iinfo(self.numpy_dtype)
+        # numpy rounds half to even, the same as built-in round
+        return np.clip(np.round(values * (1 << self.fraction_bits)), info.min, info.max).astype(self.numpy_dtype)
+
     def read(self, ctx: ReadContext, name: str = '', read_bytes_amount=None):
         return float(super().read(ctx, name, read_bytes_amount) / (1 << self.fraction_bits))
 
@@ -110,8 +193,35 @@ class DecimalBlock(DataBlock):
     def new_data(self, patch = None):
         return 0.0
 
+    @property
+    def struct_layout(self):
+        if type(self).read is not DecimalBlock.read:
+            return None
+        return self.byte_order, 'f' if self.length == 4 else 'd', 1
+
+    def from_struct_values(self, values: tuple, start: int, ctx: ReadContext):
+        return values[start]
+
+    @property
+    def numpy_dtype(self):
+        if type(self).read is not DecimalBlock.read:
+            return None
+        return np.dtype(f'{STRUCT_BYTE_ORDERS[self.byte_order]}f{self.length}')
+
+    def from_numpy_values(self, values) -> list:
+        return values.tolist()
+
+    def to_numpy_values(self, data):
+        if type(self).write is not DecimalBlock.write:
+            return None
+        values = np.asarray(data, dtype=np.float64)
+        if self.length == 4 and not np.all(np.abs(values[np.isfinite(values)]) <= np.finfo(np.float32).max):
+            # struct module raises an error on float overflow, let it be raised by per-item write
+            return None
+        return values.astype(self.numpy_dtype)
+
     def read(self, ctx: ReadContext, name: str = '', read_bytes_amount=None):
-        raw = ctx.buffer.read(self.length)
+        raw = ctx.read_view(self.length)
         if len(raw) < self.length:
             raise EndOfBufferException(ctx=ctx)
         f = 'f' if self.length == 4 else 'd'
@@ -149,6 +259,15 @@ class EnumByteBlock(IntegerBlock):
             return self.value_validator.new_data()
         return self.enum_names[0][1]
 
+    @property
+    def struct_layout(self):
+        if type(self).read is not EnumByteBlock.read or self.raise_error_on_unknown:
+            return None
+        return self._integer_struct_layout()
+
+    def from_struct_values(self, values: tuple, start: int, ctx: ReadContext):
+        return self.enum_name_map[values[start]]
+
     def read(self, ctx: ReadContext, name: str = '', read_bytes_amount=None):
         raw = super().read(ctx, name, read_bytes_amount)
         if self.raise_error_on_unknown and self.enum_name_map[raw] is None:
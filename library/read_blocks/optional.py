@@ -2,6 +2,7 @@ import re
 from typing import Union, Callable, Dict, Any, Tuple
 from library.context import ReadContext, WriteContext, DocumentationContext
 from library.read_blocks.basic import DataBlock
+from library.utils.write_sink import WriteSink
 
 
 class OptionalBlock(DataBlock):
@@ -53,3 +54,7 @@ class OptionalBlock(DataBlock):
         if self.criteria(ctx):
             return self.child.pack(data, ctx, name)
         return b''
+
+    def write_into(self, sink: WriteSink, data, ctx: WriteContext = None, name: str = ''):
+        if self.criteria(ctx):
+            self.child.pack_into(sink, data, ctx, name)
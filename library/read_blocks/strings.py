@@ -58,9 +58,21 @@ class UTF8Block(DataBlock):
             return self.value_validator.new_data()
         return ""
 
+    @property
+    def struct_layout(self):
+        if type(self).read is not UTF8Block.read or not isinstance(self._length, int):
+            return None
+        return None, f'{self._length}s', 1
+
+    def from_struct_values(self, values: tuple, start: int, ctx: ReadContext):
+        res = values[start].decode('utf-8')
+        if len(res) < len(values[start]):
+            raise EndOfBufferException(ctx=ctx)
+        return res.rstrip('\x00')
+
     def read(self, ctx: ReadContext, name: str = '', read_bytes_amount=None, resolved_length=None):
         self_len = self.resolve_length(ctx) if resolved_length is None else resolved_length
-        res = ctx.buffer.read(self_len).decode('utf-8')
+        res = str(ctx.read_view(self_len), 'utf-8')
         if len(res) < self_len:
             raise EndOfBufferException(ctx=ctx)
         if self._length == self_len:
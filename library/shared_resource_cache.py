@@ -0,0 +1,113 @@
+import pickle
+import threading
+from contextlib import contextmanager
+from multiprocessing.managers import BaseManager
+from typing import Optional
+
+
+class SharedResourceStore:
+    """
+    Pickled parsed files, shared between worker processes of conversion. Lives in the manager process, workers access
+    it via proxy. Total size of stored files is limited, files, which do not fit, are not stored
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = {}
+        self.counters = {'hits': 0, 'misses': 0, 'stored': 0, 'rejected': 0}
+        # manager serves every worker connection in own thread
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            payload = self.entries.get(key)
+            self.counters['hits' if payload is not None else 'misses'] += 1
+        return payload
+
+    def put(self, key: str, payload: bytes) -> bool:
+        with self.lock:
+            if key in self.entries:
+                return True
+            if self.size + len(payload) > self.max_size:
+                self.counters['rejected'] += 1
+                return False
+            self.entries[key] = payload
+            self.size += len(payload)
+            self.counters['stored'] += 1
+            return True
+
+    # forgets files of previous conversion: they could change since then
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            self.size = 0
+            self.counters = {'hits': 0, 'misses': 0, 'stored': 0, 'rejected': 0}
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {**self.counters, 'entries': len(self.entries), 'size': self.size}
+
+
+class SharedResourceManager(BaseManager):
+    pass
+
+
+SharedResourceManager.register('SharedResourceStore', SharedResourceStore)
+
+# proxy to the store of current conversion, set in worker processes
+_shared_store = None
+
+
+@contextmanager
+def shared_resource_store(max_size: int):
+    """
+    Starts manager process with shared store for the time of conversion. Yields store proxy, which should be passed
+    to init_conversion_worker of pool, or None if max_size is 0
+    """
+    if max_size <= 0:
+        yield None
+        return
+    with SharedResourceManager() as manager:
+        yield manager.SharedResourceStore(max_size)
+
+
+def install_shared_store(store):
+    global _shared_store
+    _shared_store = store
+
+
+def init_conversion_worker(stdout_redirected: bool, store=None):
+    from library.utils.logging_setup import setup_logging
+    setup_logging(stdout_redirected)
+    install_shared_store(store)
+
+
+# returns parsed data of file from shared store or None
+def load_shared(key: str):
+    if _shared_store is None:
+        return None
+    try:
+        payload = _shared_store.get(key)
+        return pickle.loads(payload) if payload is not None else None
+    except Exception:
+        # store is not available anymore or entry is broken: file is parsed as usual
+        return None
+
+
+def store_shared(key: str, data):
+    if _shared_store is None:
+        return
+    try:
+        payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        _shared_store.put(key, payload)
+    except Exception:
+        pass
+
+
+def format_shared_store_stats(stats: dict) -> str:
+    requests = stats['hits'] + stats['misses']
+    hit_rate = f"{stats['hits'] / requests:.0%}" if requests else 'n/a'
+    return (f"Shared resource cache: {stats['hits']} hits, {stats['misses']} misses (hit rate {hit_rate}), "
+            f"{stats['entries']} files stored ({stats['size'] / 1024 / 1024:.1f} MB), "
+            f"{stats['rejected']} did not fit")
@@ -1,8 +1,68 @@
 import re
 
-from library.utils.virtual_asm_flags import VirtualAsmFlags
+from library.utils.virtual_asm_flags import VirtualAsmFlags, VirtualFlags
 from library.utils.virtual_asm_registers import AsmRegisters
 
+FLAG_NAMES = ('CF', 'AF', 'ZF', 'SF', 'OF', 'PF')
+
+# python expressions of flags, which are set by flags mnemonic (see VirtualFlags), over operands a, b and result r,
+# masked to the operation size. {sign} and {bits} are replaced with sign bit mask and size in bits
+_COMMON_FLAG_EXPRESSIONS = {
+    'ZF': 'int(r == 0)',
+    'SF': 'int(r >= {sign})',
+    'PF': 'parity[r & 0xff]',
+}
+FLAG_EXPRESSIONS = {
+    'ADD': {'CF': 'int(r < a)', 'AF': '(a ^ b ^ r) & 0x10', 'OF': 'int((~(a ^ b) & (b ^ r) & {sign}) != 0)'},
+    'SUB': {'CF': 'int(a < b)', 'AF': '(a ^ b ^ r) & 0x10', 'OF': 'int(((a ^ b) & (a ^ r) & {sign}) != 0)'},
+    'NEG': {'CF': 'int(r != 0)', 'AF': 'int((r & 0x0f) != 0)', 'OF': 'int(r == {sign})'},
+    'LOGIC': {'CF': '0', 'OF': '0'},
+    'SHL': {'CF': '(int((a >> ({bits} - b)) & 0x01) if b <= {bits} else 0)',
+            'OF': '(int(((a ^ r) & {sign}) > 0) if b == 1 '
+                  'else 0 if b == 0 else int((((a << (b - 1)) ^ r) & {sign}) > 0))'},
+    'SHR': {'CF': 'int((a >> (b - 1)) & 0x01)', 'OF': '(int(a >= {sign}) if b == 1 else 0)'},
+    'INC': {'AF': 'int((r & 0x0f) == 0)', 'OF': 'int(r == {sign})'},
+    'DEC': {'AF': 'int((r & 0x0f) == 0x0f)', 'OF': 'int(r == {sign} - 1)'},
+}
+FLAG_EXPRESSIONS['CMP'] = FLAG_EXPRESSIONS['SUB']
+for _expressions in FLAG_EXPRESSIONS.values():
+    _expressions.update(_COMMON_FLAG_EXPRESSIONS)
+
+# flags, read by conditional jumps, and python expressions of jump condition
+JUMP_CONDITIONS = {
+    'jb': ({'CF'}, 'self.CF == 1'),
+    'jnb': ({'CF'}, 'self.CF == 0'),
+    'jz': ({'ZF'}, 'self.ZF == 1'),
+    'jnz': ({'ZF'}, 'self.ZF == 0'),
+    'jbe': ({'CF', 'ZF'}, 'self.CF == 1 or self.ZF == 1'),
+    'jl': ({'SF', 'OF'}, 'self.SF != self.OF'),
+    'jge': ({'SF', 'OF'}, 'self.SF == self.OF'),
+    'jle': ({'SF', 'OF', 'ZF'}, '(self.SF != self.OF) or self.ZF == 1'),
+    'js': ({'SF'}, 'self.SF == 1'),
+    'jns': ({'SF'}, 'self.SF == 0'),
+    'jmp': (set(), 'True'),
+}
+
+
+class _Instruction:
+    # one translated command: python lines, flags it reads, flags mnemonic (sets all flags of FLAG_EXPRESSIONS
+    # entry), operation size in bytes and python expressions of flags operands. Jump returns its condition, command,
+    # which is not translated, is run with run_command and may return jump condition as well
+    def __init__(self, command, lines, uses=frozenset(), flags_mnemonic=None, flags_size=None,
+                 flags_operands=None, is_jump=False, is_interpreted=False):
+        self.command = command
+        self.lines = lines
+        self.uses = uses
+        self.flags_mnemonic = flags_mnemonic
+        self.flags_size = flags_size
+        self.flags_operands = flags_operands
+        self.is_jump = is_jump
+        self.is_interpreted = is_interpreted
+
+    @property
+    def defines(self):
+        return set(FLAG_EXPRESSIONS[self.flags_mnemonic].keys()) if self.flags_mnemonic else set()
+
 
 class AsmRunner(AsmRegisters, VirtualAsmFlags):
 
@@ -10,6 +70,7 @@ class AsmRunner(AsmRegisters, VirtualAsmFlags):
         super().__init__(*args, **kwargs)
         self.asm_virtual_memory = bytearray(asm_virtual_memory_size)
         self.variables = dict()
+        self._compiled_blocks = dict()
 
     # dict: key is variable name, value is tuple of value and size
     variables: dict[str, tuple[int, int]]
@@ -54,7 +115,16 @@ class AsmRunner(AsmRegisters, VirtualAsmFlags):
             raise Exception(f'Variable {name} is already defined')
         self.variables[name] = (value, ptr_size)
 
+    # runs block of commands, returns if should jump after the last command. Block is translated to python function
+    # on the first run, so all variables, used in it, should be defined before that
     def run_block(self, block: str):
+        compiled = self._compiled_blocks.get(block)
+        if compiled is None:
+            compiled = self._compiled_blocks[block] = self.compile_block(block)
+        return compiled()
+
+    # runs block command by command with run_command, reference for compiled blocks
+    def interpret_block(self, block: str):
         should_jump = None
         for command in [c.strip() for c in block.splitlines() if c.strip()]:
             if should_jump is not None:
@@ -326,3 +396,211 @@ class AsmRunner(AsmRegisters, VirtualAsmFlags):
             return True
         else:
             raise Exception(f"Unknown command '{command}'")
+
+    def _rep_movs(self, size: int):
+        count = self.ecx
+        if count > 0:
+            memory = self.asm_virtual_memory
+            (source, destination, length) = (self.esi, self.edi, count * size)
+            if (not self.DF and max(source, destination) + length <= len(memory)
+                    and (size == 1 or not source < destination < source + length)):
+                if source < destination < source + length:
+                    # byte by byte forward copy into own source repeats bytes between source and destination
+                    period = memory[source:destination]
+                    memory[destination:destination + length] = (period * (length // len(period) + 1))[:length]
+                else:
+                    memory[destination:destination + length] = memory[source:source + length]
+                self.esi = source + length
+                self.edi = destination + length
+            else:
+                while count > 0:
+                    self.memstore(self.edi, self.memread(self.esi, size), size)
+                    if not self.DF:
+                        self.edi += size
+                        self.esi += size
+                    else:
+                        self.edi -= size
+                        self.esi -= size
+                    count -= 1
+        self.ecx = 0
+
+    # returns python expression of operand value and its size, as get_value returns them when command is run
+    def _translate_value(self, variable: str, force_size=None, is_pointer=False, optimistic=False) -> tuple[str, int]:
+        if variable.startswith('byte ptr '):
+            variable = variable[9:]
+            force_size = 1
+        if self._is_register_name(variable):
+            return f'self.{variable}', force_size or self._get_variable_size_in_bytes(variable)
+        value_match = re.match(r'^([\dA-Fa-f]+h?)$', variable)
+        if value_match:
+            value = value_match.group(1)
+            return str(int(value[:-1], 16) if value.endswith('h') else int(value, 10)), force_size
+        if variable.startswith('[') and variable.endswith(']'):
+            ptr_str = variable[1:-1]
+            size = self._get_ptr_size(ptr_str) or force_size or 4
+            ptr, _ = self._translate_value(ptr_str, is_pointer=True)
+            return f'memread({ptr}, {size})', size
+        if '+' in variable or '-' in variable:
+            variables = re.split(r'[+-]', variable)
+            operands = re.findall(r'([+-])', variable)
+            expression, size = self._translate_value(variables[0], force_size=force_size)
+            for operand, sub_variable in zip(operands, variables[1:]):
+                sub_expression, sub_size = self._translate_value(sub_variable)
+                expression += f' {operand} {sub_expression}'
+                if sub_size is not None:
+                    size = min(size, sub_size) if is_pointer else max(size, sub_size)
+            return f'({expression})', force_size or size
+        if '*' in variable:
+            variables = variable.split('*')
+            expression, size = self._translate_value(variables[0], force_size=force_size)
+            for sub_variable in variables[1:]:
+                sub_expression, sub_size = self._translate_value(sub_variable)
+                expression += f' * {sub_expression}'
+                if sub_size is not None:
+                    size = max(size, sub_size)
+            return f'({expression})', force_size or size
+        if variable in self.variables:
+            return f'variables[{variable!r}][0]', force_size or self.variables[variable][1]
+        if optimistic:
+            return '0', 0
+        raise Exception(f"Unknown variable '{variable}'")
+
+    # returns python statement, which stores value of expression as set_value does when command is run
+    def _translate_store(self, variable: str, expression: str, size: int = None) -> str:
+        variable_size = self._get_variable_size_in_bytes(variable) or size or 4
+        max_value = 1 << (variable_size * 8)
+        if self._is_register_name(variable):
+            # register setter wraps value itself
+            return f'self.{variable} = {expression}'
+        if hasattr(self, variable):
+            raise Exception(f"Cannot translate assignment to attribute '{variable}'")
+        if (variable.startswith('[') or variable.startswith('byte ptr [')) and variable.endswith(']'):
+            if variable.startswith('byte ptr '):
+                variable = variable[9:]
+                ptr_size = 1
+            else:
+                ptr_size = self._get_ptr_size(variable[1:-1]) or size or 4
+            ptr, _ = self._translate_value(variable[1:-1])
+            return f'memstore({ptr}, ({expression}) % {max_value}, {ptr_size})'
+        if variable in self.variables:
+            return f'variables[{variable!r}] = (({expression}) % {max_value}, {self.variables[variable][1]!r})'
+        raise Exception(f"Unknown variable '{variable}'")
+
+    def _translate_command(self, command: str) -> _Instruction:
+        search = re.search(r'^(\w+)\s+([\w\d,\s\[\]+\-:*]+)(\s;.*)?$', command)
+        if not search:
+            raise Exception(f"Cannot parse statement {command}")
+        operator = search.group(1)
+        args: list[str] = [x.strip() for x in search.group(2).split(',')]
+        if operator in JUMP_CONDITIONS:
+            (uses, condition) = JUMP_CONDITIONS[operator]
+            return _Instruction(command, [f'return {condition}'], uses=uses, is_jump=True)
+        if operator == 'call':
+            if not args[0].isidentifier():
+                raise Exception(f"Cannot translate call of '{args[0]}'")
+            # called function may read any flag
+            return _Instruction(command, ['push(1)', f'self.{args[0]}()', 'pop()'], uses=set(FLAG_NAMES))
+        if operator == 'rep' and args[0] in ['movsb', 'movsd']:
+            return _Instruction(command, [f'rep_movs({4 if args[0] == "movsd" else 1})'])
+        if operator == 'lea':
+            if not (args[1].startswith('[') and args[1].endswith(']')):
+                raise Exception(f'Cannot translate {command}')
+            return _Instruction(command, [self._translate_store(args[0], self._translate_value(args[1][1:-1])[0])])
+        (values, sizes) = zip(*[self._translate_value(x, optimistic=True) for x in args])
+        if operator == 'push':
+            if sizes[0] != 4:
+                raise Exception(f'Cannot push variable with size, {sizes[0]}')
+            return _Instruction(command, [f'push({values[0]})'])
+        if operator == 'pop':
+            return _Instruction(command, [self._translate_store(args[0], 'pop()', 4)])
+        if operator in ['mov', 'movzx']:
+            value, _ = self._translate_value(args[1], force_size=self._get_variable_size_in_bytes(args[0]))
+            return _Instruction(command, [self._translate_store(args[0], value,
+                                                                size=self._get_variable_size_in_bytes(args[1]))])
+        mask = self.get_mask(sizes[0])
+        if operator in ['test', 'cmp']:
+            # only flags are changed, so operands are not read at all if flags are not used later
+            return _Instruction(command, [], flags_mnemonic='LOGIC' if operator == 'test' else 'CMP',
+                                flags_size=sizes[0],
+                                flags_operands=(values[0], values[1], f'({values[0]}) & ({values[1]})'
+                                                if operator == 'test' else f'({values[0]}) - ({values[1]})'))
+        operations = {
+            'sub': ('SUB', 'a - b', sizes[0], 'b'),
+            'add': ('ADD', 'a + b', sizes[0], 'b'),
+            'shl': ('SHL', f'(a << (b & 0x1f)) & {mask}', sizes[0], 'b'),
+            'shr': ('SHR', 'a >> b', sizes[0], 'b'),
+            'xor': ('LOGIC', f'a ^ (b & {mask})', sizes[0], 'b'),
+            'or': ('LOGIC', f'a | (b & {mask})', sizes[0], 'b'),
+            'and': ('LOGIC', f'a & (b & {mask})', sizes[0], 'b'),
+            'inc': ('INC', 'a + 1', None, '1'),
+            'dec': ('DEC', 'a - 1', None, '1'),
+            'neg': ('NEG', '-a', sizes[0], '0'),
+        }
+        if operator not in operations:
+            raise Exception(f"Unknown command '{command}'")
+        (mnemonic, result, store_size, flags_op2) = operations[operator]
+        lines = [f'a = {values[0]}']
+        if flags_op2 == 'b':
+            lines.append(f'b = {values[1]}')
+        lines += [f'r = {result}', self._translate_store(args[0], 'r', store_size)]
+        return _Instruction(command, lines, flags_mnemonic=mnemonic, flags_size=sizes[0],
+                            flags_operands=('a', flags_op2, 'r'))
+
+    # translates block of commands to python function once, instead of parsing every command when it is run.
+    # Flags are computed only if they can be read later: by conditional jump or function call in this block, or by
+    # next blocks if flags are not overwritten till the end of this block. Commands, which translator does not
+    # support, are run with run_command
+    def compile_block(self, block: str):
+        commands = [c.strip() for c in block.splitlines() if c.strip()]
+        instructions = []
+        for command in commands:
+            try:
+                instruction = self._translate_command(command)
+            except Exception:
+                # interpreter raises the same error when (and if) command is reached
+                instruction = _Instruction(command, [f'should_jump = run_command({command!r})'],
+                                           uses=set(FLAG_NAMES), is_interpreted=True)
+            instructions.append(instruction)
+        live_flags = set(FLAG_NAMES)
+        live_flags_after = []
+        for instruction in reversed(instructions):
+            live_flags_after.append(live_flags)
+            live_flags = instruction.uses | (live_flags - instruction.defines)
+        live_flags_after.reverse()
+
+        lines = []
+        for i, instruction in enumerate(instructions):
+            is_last = i == len(instructions) - 1
+            lines.append(f'# {instruction.command}')
+            if instruction.is_jump and not is_last:
+                # condition has no side effects
+                lines.append("raise Exception('Cannot run command after jump')")
+                continue
+            lines += instruction.lines
+            if instruction.is_interpreted:
+                if is_last:
+                    lines.append('return should_jump')
+                else:
+                    lines.append('if should_jump is not None:')
+                    lines.append("    raise Exception('Cannot run command after jump')")
+            flags = [flag for flag in FLAG_NAMES if flag in live_flags_after[i] and flag in instruction.defines]
+            if flags:
+                mask = self.get_mask(instruction.flags_size)
+                sign_mask = (mask + 1) // 2
+                (a, b, r) = instruction.flags_operands
+                lines.append(f'(a, b, r) = ({a} & {mask}, {b} & {mask}, {r} & {mask})')
+                for flag in flags:
+                    expression = FLAG_EXPRESSIONS[instruction.flags_mnemonic][flag]
+                    lines.append(f'self.{flag} = {expression.format(sign=sign_mask, bits=instruction.flags_size * 8)}')
+        source = ('def make_block(self, variables, memread, memstore, push, pop, rep_movs, run_command, parity):\n'
+                  '    def compiled_block():\n'
+                  + ''.join(f'        {line}\n' for line in lines)
+                  + '        return None\n'
+                  + '    return compiled_block\n')
+        namespace = {}
+        exec(source, namespace)
+        compiled_block = namespace['make_block'](self, self.variables, self.memread, self.memstore, self._push,
+                                                 self._pop, self._rep_movs, self.run_command,
+                                                 VirtualFlags.parity_lookup_table)
+        compiled_block.source = source
+        return compiled_block
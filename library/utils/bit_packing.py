@@ -0,0 +1,50 @@
+import numpy as np
+
+# values up to this size are unpacked with numpy into uint64 array, wider ones are handled as python integers
+MAX_NUMPY_BITS = 63
+
+
+def unpack_bits(data, bits_per_value: int, count: int) -> np.ndarray:
+    """
+    Splits big-endian bit stream into count unsigned values of bits_per_value bits each. The first value occupies
+    the most significant bits of the first byte. Returns uint64 array (object array for values wider than 63 bits)
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if 8 % bits_per_value == 0:
+        # several whole values in every byte: shift and mask
+        shifts = np.arange(8 - bits_per_value, -1, -bits_per_value, dtype=np.uint8)
+        values = (raw[:, None] >> shifts) & ((1 << bits_per_value) - 1)
+        return values.reshape(-1)[:count].astype(np.uint64)
+    if bits_per_value <= MAX_NUMPY_BITS:
+        bits = np.unpackbits(raw)[:count * bits_per_value].reshape(count, bits_per_value).astype(np.uint64)
+        weights = np.uint64(1) << np.arange(bits_per_value - 1, -1, -1, dtype=np.uint64)
+        return (bits * weights).sum(axis=1, dtype=np.uint64)
+    # general integer path
+    total_bits = len(raw) * 8
+    stream = int.from_bytes(raw.tobytes(), 'big')
+    mask = (1 << bits_per_value) - 1
+    return np.array([(stream >> (total_bits - (i + 1) * bits_per_value)) & mask for i in range(count)],
+                    dtype=object)
+
+
+def pack_bits(values, bits_per_value: int) -> bytes:
+    """
+    Reverse of unpack_bits. Every value is truncated to bits_per_value bits, the last byte is padded with zero bits
+    """
+    count = len(values)
+    mask = (1 << bits_per_value) - 1
+    if bits_per_value > MAX_NUMPY_BITS:
+        stream = 0
+        for value in values:
+            stream = (stream << bits_per_value) | (int(value) & mask)
+        padding = -count * bits_per_value % 8
+        return (stream << padding).to_bytes((count * bits_per_value + padding) // 8, 'big')
+    values = np.asarray(values, dtype=np.uint64) & np.uint64(mask)
+    if 8 % bits_per_value == 0:
+        values_per_byte = 8 // bits_per_value
+        values = np.pad(values, (0, -count % values_per_byte)).reshape(-1, values_per_byte)
+        shifts = np.arange(8 - bits_per_value, -1, -bits_per_value, dtype=np.uint64)
+        return np.bitwise_or.reduce(values << shifts, axis=1).astype(np.uint8).tobytes()
+    shifts = np.arange(bits_per_value - 1, -1, -1, dtype=np.uint64)
+    bits = ((values[:, None] >> shifts) & np.uint64(1)).astype(np.uint8)
+    return np.packbits(bits.reshape(-1)).tobytes()
@@ -0,0 +1,116 @@
+# wraps list method, which compares or copies items in C code, bypassing __getitem__/__iter__: all pending items are
+# loaded before calling it
+def _materializing(method_name):
+    method = getattr(list, method_name)
+
+    def wrapper(self, *args, **kwargs):
+        self.materialize()
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = method_name
+    return wrapper
+
+
+class LazyList(list):
+    """
+    A list, which items can be produced on demand. Not yet produced item is stored as LazyList.Pending wrapper around
+    loader function, and gets replaced with actual value on first access. Copying/pickling produces a plain list with
+    all items loaded. Operations of list, which read items in C code (comparison, concatenation, search, sorting), load
+    all pending items first
+    """
+
+    class Pending:
+        __slots__ = ('loader',)
+
+        def __init__(self, loader: callable):
+            self.loader = loader
+
+    def _load(self, index):
+        value = list.__getitem__(self, index)
+        if type(value) is LazyList.Pending:
+            value = value.loader()
+            list.__setitem__(self, index, value)
+        return value
+
+    def is_loaded(self, index) -> bool:
+        return type(list.__getitem__(self, index)) is not LazyList.Pending
+
+    @property
+    def pending_count(self) -> int:
+        return sum(1 for x in list.__iter__(self) if type(x) is LazyList.Pending)
+
+    # force-loads all pending items
+    def materialize(self) -> 'LazyList':
+        for i in range(len(self)):
+            self._load(i)
+        return self
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._load(i) for i in range(*index.indices(len(self)))]
+        return self._load(index)
+
+    def __iter__(self):
+        i = 0
+        while i < len(self):
+            yield self._load(i)
+            i += 1
+
+    def __reversed__(self):
+        for i in range(len(self) - 1, -1, -1):
+            yield self._load(i)
+
+    def pop(self, index=-1):
+        self._load(index)
+        return super().pop(index)
+
+    def copy(self):
+        return list(self)
+
+    # list.__add__ of plain list on the left copies our storage in C, Pending wrappers included
+    def __radd__(self, other):
+        if not isinstance(other, list):
+            return NotImplemented
+        return list(other) + list(self)
+
+    def __reduce_ex__(self, protocol):
+        return list, (list(self),)
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    __contains__ = _materializing('__contains__')
+    __eq__ = _materializing('__eq__')
+    __ne__ = _materializing('__ne__')
+    __lt__ = _materializing('__lt__')
+    __le__ = _materializing('__le__')
+    __gt__ = _materializing('__gt__')
+    __ge__ = _materializing('__ge__')
+    __add__ = _materializing('__add__')
+    __mul__ = _materializing('__mul__')
+    __rmul__ = _materializing('__rmul__')
+    count = _materializing('count')
+    index = _materializing('index')
+    remove = _materializing('remove')
+    sort = _materializing('sort')
+
+
+def has_pending_items(value) -> bool:
+    """
+    Whether data tree contains items of LazyList, which are not loaded yet. Does not load them
+    """
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(x for x in value.values() if isinstance(x, (dict, list)))
+        elif isinstance(value, list):
+            for x in list.__iter__(value):
+                if type(x) is LazyList.Pending:
+                    return True
+                if isinstance(x, (dict, list)):
+                    stack.append(x)
+    return False
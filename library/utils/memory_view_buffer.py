@@ -0,0 +1,85 @@
+import mmap
+from io import SEEK_SET, SEEK_CUR, SEEK_END
+
+
+class MemoryViewBuffer:
+    """
+    Read-only file-like object over a memoryview (usually over memory-mapped file). Supports the subset of
+    BufferedReader/BytesIO API used by read blocks, plus read_view method, which returns zero-copy slice of
+    underlying memory instead of newly allocated bytes object
+    """
+
+    def __init__(self, data, name: str = None):
+        self.view = data if isinstance(data, memoryview) else memoryview(data)
+        self.length = len(self.view)
+        self.name = name
+        self.pos = 0
+        self._mmap = None
+
+    @classmethod
+    def from_file(cls, path: str) -> 'MemoryViewBuffer':
+        with open(path, 'rb') as f:
+            # mapping keeps its own file descriptor, file itself can be closed right away
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = cls(mapping, name=path)
+        buffer._mmap = mapping
+        return buffer
+
+    # new buffer over the same memory with own position. Stays valid after this buffer is closed
+    def fork(self) -> 'MemoryViewBuffer':
+        return MemoryViewBuffer(self.view[:], name=self.name)
+
+    @property
+    def closed(self):
+        return self.view is None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=SEEK_SET):
+        if whence == SEEK_SET:
+            pos = offset
+        elif whence == SEEK_CUR:
+            pos = self.pos + offset
+        elif whence == SEEK_END:
+            pos = self.length + offset
+        else:
+            raise ValueError(f'Invalid whence ({whence})')
+        if pos < 0:
+            raise ValueError(f'Negative seek position {pos}')
+        self.pos = pos
+        return pos
+
+    def read_view(self, size=-1) -> memoryview:
+        start = min(self.pos, self.length)
+        end = self.length if size is None or size < 0 else min(start + size, self.length)
+        self.pos = max(self.pos, end)
+        return self.view[start:end]
+
+    def read(self, size=-1) -> bytes:
+        return self.read_view(size).tobytes()
+
+    def close(self):
+        if self.view is None:
+            return
+        try:
+            self.view.release()
+            if self._mmap is not None:
+                self._mmap.close()
+        except BufferError:
+            # somebody still holds a slice of the mapping. It will be unmapped by GC when slice is released
+            pass
+        self.view = None
+        self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,48 @@
+import os
+
+from library.utils import format_exception
+from library.utils.path_join import path_join
+
+SKIPPED_FILE_NAME = 'skipped.txt'
+
+
+class SkippedResourcesWriter:
+    """
+    Writes errors of files, which were not converted, to skipped.txt in output directory of every input directory.
+    Errors are appended as soon as they are known, so conversion of huge amount of files does not keep them in memory.
+    On close entries of every written file are sorted by file name
+    """
+
+    def __init__(self, base_input_path: str, out_path: str):
+        self.base_input_path = base_input_path
+        self.out_path = out_path
+        self.written_paths = set()
+
+    def add(self, file_path: str, ex: Exception):
+        file_path = file_path.replace('\\', '/')
+        path, name = '/'.join(file_path.split('/')[:-1]), file_path.split('/')[-1]
+        path_suffix = path[len(self.base_input_path):]
+        if path_suffix.startswith('/'):
+            path_suffix = path_suffix[1:]
+        skipped_txt_output_path = path_join(self.out_path, path_suffix, SKIPPED_FILE_NAME)
+        if skipped_txt_output_path not in self.written_paths:
+            os.makedirs(os.path.dirname(skipped_txt_output_path), exist_ok=True)
+        with open(skipped_txt_output_path, 'a' if skipped_txt_output_path in self.written_paths else 'w') as f:
+            f.write("%s\t\t%s\n" % (name, format_exception(ex)))
+        self.written_paths.add(skipped_txt_output_path)
+
+    def close(self):
+        for skipped_txt_output_path in self.written_paths:
+            with open(skipped_txt_output_path, 'r') as f:
+                lines = f.readlines()
+            # error message can be multiline, entry starts with the line, which has name separator
+            entries = []
+            for line in lines:
+                if '\t\t' in line or not entries:
+                    entries.append([line])
+                else:
+                    entries[-1].append(line)
+            entries.sort(key=lambda x: x[0].split('\t\t')[0])
+            with open(skipped_txt_output_path, 'w') as f:
+                f.writelines(line for entry in entries for line in entry)
+        self.written_paths.clear()
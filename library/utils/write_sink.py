@@ -0,0 +1,47 @@
+from io import SEEK_SET
+
+
+class WriteSink:
+    """
+    Destination of streaming block write (see DataBlock.write_into): growing bytearray or binary file object, opened
+    for writing. Blocks append packed bytes to it instead of returning them to the parent, so data is not copied
+    once per nesting level. Positions are relative to the position, where sink was created. Already written bytes
+    can be patched (back-patched lengths and offsets) and read back (checksums), the latter requires readable file
+    """
+
+    def __init__(self, target=None):
+        self.target = bytearray() if target is None else target
+        self.in_memory = isinstance(self.target, bytearray)
+        self.start = len(self.target) if self.in_memory else self.target.tell()
+        # appends bytes. Bound to the target itself: blocks call it for every small field
+        self.write = self.target.extend if self.in_memory else self.target.write
+
+    def tell(self) -> int:
+        return (len(self.target) if self.in_memory else self.target.tell()) - self.start
+
+    def patch(self, position: int, data):
+        size = self.tell()
+        if position + len(data) > size:
+            raise ValueError('Cannot patch bytes, which are not written yet')
+        if self.in_memory:
+            self.target[self.start + position:self.start + position + len(data)] = data
+        else:
+            self.target.seek(self.start + position, SEEK_SET)
+            self.target.write(data)
+            self.target.seek(self.start + size, SEEK_SET)
+
+    def read(self, start: int, end: int) -> bytes:
+        size = self.tell()
+        end = min(end, size)
+        if self.in_memory:
+            return bytes(self.target[self.start + start:self.start + end])
+        self.target.seek(self.start + start, SEEK_SET)
+        try:
+            return self.target.read(end - start)
+        finally:
+            self.target.seek(self.start + size, SEEK_SET)
+
+    def getvalue(self) -> bytes:
+        if not self.in_memory:
+            return self.read(0, self.tell())
+        return bytes(self.target[self.start:]) if self.start else bytes(self.target)
@@ -10,8 +10,9 @@ from library.read_blocks import (DeclarativeCompoundBlock,
                                  ArrayBlock,
                                  AutoDetectBlock,
                                  BytesBlock)
-from library.read_blocks.archives import ArchiveBlock
+from library.read_blocks.archives import ArchiveBlock, ItemOffsetsIndex
 from library.read_blocks.misc.value_validators import Eq
+from library.read_blocks.misc.programmatic_values import PackedSize
 from library.read_blocks.strings import NullTerminatedUTF8Block
 from resources.eac.audios import EacsAudioFile, SoundBankHeaderEntry
 from resources.common.bitmaps.targa_image import TargaImage
@@ -45,10 +46,8 @@ class WwwwBlock(ArchiveBlock):
             ShpiBlock(),
             OripGeometry(),
             self,
-            BytesBlock(length=(lambda ctx: next(x for x in (
-                x - ctx.local_buffer_pos
-                for x in (sorted(ctx.data('items_descr')) + [ctx.read_bytes_amount])
-            ) if x > 0), 'item_length'))]),
+            BytesBlock(length=(lambda ctx: ctx.data('items_index').next_offset(ctx.local_buffer_pos)
+                                           - ctx.local_buffer_pos, 'item_length'))]),
             **kwargs)
 
     class Fields(ArchiveBlock.Fields):
@@ -62,7 +61,7 @@ class WwwwBlock(ArchiveBlock):
                        {'usage': 'io,doc',
                         'description': 'An array of offsets to items data in file, relatively to wwww block start '
                                        '(where resource id string is presented)'})
-        data_bytes = (BytesBlock(length=lambda ctx: ctx.read_bytes_remaining),
+        data_bytes = (BytesBlock(length=lambda ctx: ctx.read_bytes_remaining, skip_on_read=True),
                       {'usage': 'io,doc',
                        'description': 'A part of block, where items data is located. Offsets are defined in previous '
                                       'block, lengths are calculated: either up to next item offset, or up to the end '
@@ -84,19 +83,24 @@ class WwwwBlock(ArchiveBlock):
         block_start = ctx.buffer.tell()
         res = super().read(ctx, name, read_bytes_amount)
         end_pos = ctx.buffer.tell()
-        ctx.buffer.seek(-len(res['data_bytes']), SEEK_CUR)
+        ctx.buffer.seek(-res['data_bytes'], SEEK_CUR)
         res['children'] = []
 
-        offsets = [block_start + x for x in res['items_descr']]
-        lengths = []
-        for offset in offsets:
-            try:
-                lengths.append(sorted(x for x in offsets if x > offset)[0] - offset)
-            except IndexError:
-                lengths.append(block_start + read_bytes_amount - offset)
-        abs_offsets = list(zip(offsets, lengths))
+        res['items_index'] = items_index = ItemOffsetsIndex(res['items_descr'], read_bytes_amount)
+        abs_offsets = [(block_start + x, items_index.next_offset(x) - x) for x in res['items_descr']]
 
         self_ctx = ctx.get_or_create_child(name, self, read_bytes_amount, res)
+        if self.can_read_children_lazily(ctx):
+            header = {k: v for k, v in res.items() if k != 'data_bytes'}
+            heap_start = ctx.buffer.tell()
+            res['children'] = self.read_children_lazily(self_ctx, header, [
+                (str(i), None, i - 1 if i > 0 else None, heap_start, offset, length, None)
+                for i, (offset, length) in enumerate(abs_offsets)])
+            ctx.buffer.seek(end_pos)
+            del res['items_descr']
+            del res['items_index']
+            del res['data_bytes']
+            return res
         try:
             bytes_choice = self.item_block.get_choice_index_by_class_name('BytesBlock')
         except StopIteration:
@@ -116,24 +120,12 @@ class WwwwBlock(ArchiveBlock):
                 child['item'] = {'choice_index': bytes_choice, 'data': ctx.buffer.read(length)}
         ctx.buffer.seek(end_pos)
         del res['items_descr']
+        del res['items_index']
         del res['data_bytes']
         return res
 
-    def write(self, data, ctx: WriteContext = None, name: str = '') -> bytes:
-        data['data_bytes'] = b''
-        data['items_descr'] = []
-        for i, child in enumerate(data['children']):
-            item_data = self.item_block.pack(data=child['item'], ctx=ctx, name=str(i))
-            data['items_descr'].append(len(data['data_bytes']))
-            data['data_bytes'] += child['pre_offset_payload']
-            data['data_bytes'] += item_data
-            data['data_bytes'] += child['post_offset_payload']
-        heap_offset = 8 + len(data['items_descr']) * 4
-        data['items_descr'] = [x + heap_offset for x in data['items_descr']]
-        ret = super().write(data=data, ctx=ctx, name=name)
-        del data['items_descr']
-        del data['data_bytes']
-        return ret
+    def build_items_descr(self, children):
+        return [offset for (_, offset, _) in children]
 
     def serializer_class(self):
         from serializers import WwwwArchiveSerializer
@@ -175,19 +167,14 @@ class BigfBlock(ArchiveBlock):
             EacCompressedBlock(),
             TargaImage(),
             self,
-            BytesBlock(
-                length=(lambda ctx: next(x
-                                         for x in ctx.data('items_descr')
-                                         if x['offset'] == ctx.local_buffer_pos)['length'],
-                        'item_length'))]),
+            BytesBlock(length=(lambda ctx: ctx.data('items_index').length(ctx.local_buffer_pos), 'item_length'))]),
             alias_field=NullTerminatedUTF8Block(length=8),
             **kwargs)
 
     class Fields(ArchiveBlock.Fields):
         resource_id = (UTF8Block(length=4, value_validator=Eq('BIGF')),
                        {'description': 'Resource ID'})
-        length = (IntegerBlock(length=4, byte_order='big',
-                               programmatic_value=lambda ctx: ctx.block.estimate_packed_size(ctx.get_full_data())),
+        length = (IntegerBlock(length=4, byte_order='big', programmatic_value=PackedSize()),
                   {'description': 'The length of this BIGF block in bytes'})
         num_items = (IntegerBlock(length=4, byte_order='big',
                                   programmatic_value=lambda ctx: len(ctx.data('items_descr'))),
@@ -197,7 +184,7 @@ class BigfBlock(ArchiveBlock):
         items_descr = (ArrayBlock(length=lambda ctx: ctx.data('num_items'),
                                   child=BigfItemDescriptionBlock()),
                        {'usage': 'io,doc'})
-        data_bytes = (BytesBlock(length=lambda ctx: ctx.read_bytes_remaining),
+        data_bytes = (BytesBlock(length=lambda ctx: ctx.read_bytes_remaining, skip_on_read=True),
                       {'usage': 'io,doc',
                        'description': 'A part of block, where items data is located. Offsets and lengths are defined '
                                       'in previous block. Possible item types:'
@@ -219,14 +206,31 @@ class BigfBlock(ArchiveBlock):
         block_start = ctx.buffer.tell()
         res = super().read(ctx, name, read_bytes_amount)
         end_pos = ctx.buffer.tell()
-        ctx.buffer.seek(-len(res['data_bytes']), SEEK_CUR)
+        ctx.buffer.seek(-res['data_bytes'], SEEK_CUR)
         res['children'] = []
+        res['items_index'] = ItemOffsetsIndex([x['offset'] for x in res['items_descr']], read_bytes_amount,
+                                              lengths=[x['length'] for x in res['items_descr']])
 
         abs_offsets = [
             (i, x['name'], block_start + x['offset'], x['length'])
             for i, x in sorted(list(enumerate(res['items_descr'])), key=lambda x: x[1]['offset'])
         ]
         self_ctx = ctx.get_or_create_child(name, self, read_bytes_amount, res)
+        if self.can_read_children_lazily(ctx):
+            header = {k: v for k, v in res.items() if k != 'data_bytes'}
+            heap_start = ctx.buffer.tell()
+            archive_end = block_start + res['length'] if res.get('length') is not None else None
+            children_descr = [None] * len(abs_offsets)
+            for i, (descr_index, alias, offset, length) in enumerate(abs_offsets):
+                children_descr[descr_index] = (f"{descr_index}_{alias}", alias,
+                                               abs_offsets[i - 1][0] if i > 0 else None, heap_start, offset, length,
+                                               archive_end if i == len(abs_offsets) - 1 else None)
+            res['children'] = self.read_children_lazily(self_ctx, header, children_descr)
+            ctx.buffer.seek(end_pos)
+            del res['items_descr']
+            del res['items_index']
+            del res['data_bytes']
+            return res
         try:
             bytes_choice = self.item_block.get_choice_index_by_class_name('BytesBlock')
         except StopIteration:
@@ -254,29 +258,13 @@ class BigfBlock(ArchiveBlock):
             res['children'].extend(cs)
         ctx.buffer.seek(end_pos)
         del res['items_descr']
+        del res['items_index']
         del res['data_bytes']
         return res
 
-    def write(self, data, ctx: WriteContext = None, name: str = '') -> bytes:
-        data['data_bytes'] = b''
-        children = []
-        for i, child in enumerate(data['children']):
-            data['data_bytes'] += child['pre_offset_payload']
-            item_data = self.item_block.pack(data=child['item'], ctx=ctx, name=str(i))
-            children.append((child['alias'], len(data['data_bytes']), len(item_data)))
-            data['data_bytes'] += item_data
-            data['data_bytes'] += child['post_offset_payload']
-        data['items_descr'] = [{'name': name, 'offset': offset, 'length': length} for (name, offset, length) in children
-                               if name is not None]
-        heap_offset = 16
-        for x in data['items_descr']:
-            heap_offset += 9 + len(x['name'])
-        for x in data['items_descr']:
-            x['offset'] += heap_offset
-        ret = super().write(data=data, ctx=ctx, name=name)
-        del data['items_descr']
-        del data['data_bytes']
-        return ret
+    def build_items_descr(self, children):
+        return [{'name': alias, 'offset': offset, 'length': length} for (alias, offset, length) in children
+                if alias is not None]
 
     def serializer_class(self):
         from serializers import BigfArchiveSerializer
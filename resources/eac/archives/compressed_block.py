@@ -1,16 +1,20 @@
 from io import BytesIO, SEEK_CUR
 from typing import Dict
 
+from config import general_config
 from library.context import ReadContext, WriteContext
 from library.read_blocks import (AutoDetectBlock,
                                  BytesBlock)
+from library.utils.memory_view_buffer import MemoryViewBuffer
 from resources.eac.car_specs import CarSimplifiedPerformanceSpec, CarPerformanceSpec
 from .shpi_block import ShpiBlock
 
 
 class EacCompressedBlock(AutoDetectBlock):
 
-    def __init__(self, **kwargs):
+    # compression: algorithm used on write, "refpack" or "qfs2". If not provided, taken from general config
+    # compression_level: RefPack compression level 1-9, if not provided, taken from general config
+    def __init__(self, compression: str = None, compression_level: int = None, **kwargs):
         from resources.eac.geometries import CrpGeometry
         super().__init__(possible_blocks=[ShpiBlock(),
                                           CarSimplifiedPerformanceSpec(),
@@ -18,6 +22,8 @@ class EacCompressedBlock(AutoDetectBlock):
                                           CrpGeometry(),
                                           BytesBlock(length=(lambda ctx: ctx.read_bytes_amount))],
                          **kwargs)
+        self.compression = compression
+        self.compression_level = compression_level
 
     @property
     def schema(self) -> Dict:
@@ -32,6 +38,21 @@ class EacCompressedBlock(AutoDetectBlock):
                         {'id': 'file_path', 'title': 'File path', 'type': 'file_output',
                          'file_name_suffix': '_uncompressed'}
                     ],
+                },
+                {
+                    'method': 'save_compressed',
+                    'title': 'Save with compression',
+                    'description': 'Saves data to a new file, compressed with chosen algorithm. RefPack is faster '
+                                   'and usually compresses better',
+                    'is_pure': True,
+                    'args': [
+                        {'id': 'file_path', 'title': 'File path', 'type': 'file_output'},
+                        {'id': 'algorithm', 'title': 'Algorithm', 'type': 'enum_string',
+                         'choices': ['RefPack', 'QFS2']},
+                        {'id': 'level', 'title': 'RefPack compression level',
+                         'description': 'From 1 (fastest) to 9 (smallest file)', 'type': 'number',
+                         'default': 4},
+                    ],
                 }
             ]}
 
@@ -55,23 +76,37 @@ class EacCompressedBlock(AutoDetectBlock):
     def read(self, ctx: ReadContext, name: str = '', read_bytes_amount=None):
         compression = self._detect_compression(ctx.buffer)
         uncompressed_bytes = compression.uncompress(ctx.buffer, read_bytes_amount)
-        uncompressed = BytesIO(uncompressed_bytes)
+        uncompressed = MemoryViewBuffer(uncompressed_bytes)
         self_ctx = ctx.get_or_create_child(name, self, read_bytes_amount)
         self_ctx.buffer = uncompressed
         self_ctx.read_bytes_amount = len(uncompressed_bytes)
         res = super().read(ctx=self_ctx, name='uncompressed', read_bytes_amount=len(uncompressed_bytes))
         return res
 
+    def compress(self, uncompressed_bytes: bytes, algorithm: str = None, level: int = None) -> bytes:
+        # NFS does not care which algorithm is used anyway
+        algorithm = (algorithm or self.compression or general_config().qfs_compression).lower()
+        if algorithm == 'refpack':
+            from resources.eac.compressions.ref_pack import RefPackCompression
+            level = int(level or self.compression_level or general_config().qfs_compression_level)
+            return RefPackCompression().compress(BytesIO(uncompressed_bytes), len(uncompressed_bytes), level=level)
+        elif algorithm == 'qfs2':
+            from resources.eac.compressions.qfs2 import Qfs2Compression
+            return Qfs2Compression().compress(BytesIO(uncompressed_bytes), len(uncompressed_bytes))
+        raise ValueError(f'Unsupported compression algorithm: {algorithm}')
+
     def write(self, data, ctx: WriteContext = None, name: str = '') -> bytes:
         uncompressed_bytes = super().write(data, ctx, name)
-        # NFS does not care which algorithm is used anyway
-        from resources.eac.compressions.qfs2 import Qfs2Compression
-        compression = Qfs2Compression()
-        compressed = compression.compress(BytesIO(uncompressed_bytes), len(uncompressed_bytes))
-        return compressed
+        return self.compress(uncompressed_bytes)
 
     def action_save_uncompressed(self, read_data, file_path, **kwargs):
         inner_block = self.possible_blocks[read_data['choice_index']]
         res = inner_block.write(read_data['data'])
         with open(file_path, 'wb') as f:
             f.write(res)
+
+    def action_save_compressed(self, read_data, file_path, algorithm='RefPack', level=None, **kwargs):
+        uncompressed_bytes = super().write(read_data)
+        res = self.compress(uncompressed_bytes, algorithm=algorithm, level=level)
+        with open(file_path, 'wb') as f:
+            f.write(res)
@@ -2,6 +2,8 @@ import traceback
 from io import SEEK_CUR
 from typing import Dict
 
+import numpy as np
+
 from library.context import ReadContext, WriteContext
 from library.read_blocks import (CompoundBlock,
                                  DeclarativeCompoundBlock,
@@ -10,8 +12,9 @@ from library.read_blocks import (CompoundBlock,
                                  ArrayBlock,
                                  AutoDetectBlock,
                                  BytesBlock, LengthPrefixedArrayBlock)
-from library.read_blocks.archives import ArchiveBlock
+from library.read_blocks.archives import ArchiveBlock, ItemOffsetsIndex
 from library.read_blocks.misc.value_validators import Eq
+from library.read_blocks.misc.programmatic_values import PackedSize
 from library.utils.id import join_id
 from resources.eac.bitmaps import EacImage, EacPalette
 from resources.eac.misc import ShpiText
@@ -87,19 +90,15 @@ class ShpiBlock(ArchiveBlock):
             EacPalette(),
             PaletteReference(),
             ShpiText(),
-            BytesBlock(length=(lambda ctx: next(x for x in (
-                x['offset'] - ctx.local_buffer_pos
-                for x in (sorted(ctx.data('items_descr'), key=lambda x: x['offset'])
-                          + [{'offset': ctx.read_bytes_amount}])
-            ) if x > 0), 'item_length'))]),
+            BytesBlock(length=(lambda ctx: ctx.data('items_index').next_offset(ctx.local_buffer_pos)
+                                           - ctx.local_buffer_pos, 'item_length'))]),
             alias_field=UTF8Block(length=4),
             **kwargs)
 
     class Fields(ArchiveBlock.Fields):
         resource_id = (UTF8Block(length=4, value_validator=Eq('SHPI')),
                        {'description': 'Resource ID'})
-        length = (IntegerBlock(length=4,
-                               programmatic_value=lambda ctx: ctx.block.estimate_packed_size(ctx.get_full_data())),
+        length = (IntegerBlock(length=4, programmatic_value=PackedSize()),
                   {'description': 'The length of this SHPI block in bytes'})
         num_items = (IntegerBlock(length=4,
                                   programmatic_value=lambda ctx: len(ctx.data('items_descr'))),
@@ -118,7 +117,7 @@ class ShpiBlock(ArchiveBlock):
                         'description': 'An array of items, each of them represents name of SHPI item (image or palette)'
                                        ' and offset to item data in file, relatively to SHPI block start (where '
                                        'resource id string is presented). Names are not always unique'})
-        data_bytes = (BytesBlock(length=lambda ctx: determine_shpi_length(ctx)),
+        data_bytes = (BytesBlock(length=lambda ctx: determine_shpi_length(ctx), skip_on_read=True),
                       {
                           'usage': 'io,doc',
                           'description': 'A part of block, where items data is located. Offsets to some of the entries are '
@@ -146,8 +145,9 @@ class ShpiBlock(ArchiveBlock):
         block_start = ctx.buffer.tell()
         res = super().read(ctx, name, read_bytes_amount)
         end_pos = ctx.buffer.tell()
-        ctx.buffer.seek(-len(res['data_bytes']), SEEK_CUR)
+        ctx.buffer.seek(-res['data_bytes'], SEEK_CUR)
         res['children'] = []
+        res['items_index'] = ItemOffsetsIndex([x['offset'] for x in res['items_descr']], read_bytes_amount)
 
         abs_offsets = [
             (i, x['name'], block_start + x['offset'], None)
@@ -195,26 +195,12 @@ class ShpiBlock(ArchiveBlock):
             res['children'].extend(cs)
         ctx.buffer.seek(end_pos)
         del res['items_descr']
+        del res['items_index']
         del res['data_bytes']
         return res
 
-    def write(self, data, ctx: WriteContext = None, name: str = '') -> bytes:
-        data['data_bytes'] = b''
-        children = []
-        for i, child in enumerate(data['children']):
-            data['data_bytes'] += child['pre_offset_payload']
-            item_data = self.item_block.pack(data=child['item'], ctx=ctx, name=str(i))
-            children.append((child['alias'], len(data['data_bytes']), len(item_data)))
-            data['data_bytes'] += item_data
-            data['data_bytes'] += child['post_offset_payload']
-        data['items_descr'] = [{'name': name, 'offset': offset} for (name, offset, _) in children if name is not None]
-        heap_offset = 16 + len(data['items_descr']) * 8
-        for x in data['items_descr']:
-            x['offset'] += heap_offset
-        ret = super().write(data=data, ctx=ctx, name=name)
-        del data['items_descr']
-        del data['data_bytes']
-        return ret
+    def build_items_descr(self, children):
+        return [{'name': alias, 'offset': offset} for (alias, offset, _) in children if alias is not None]
 
     def action_convert_to_8bit(self, read_data, name, palette_name, palette_type, num_colors, id, **kwargs):
         # notes for future:
@@ -291,7 +277,7 @@ class ShpiBlock(ArchiveBlock):
             q_img = Image.frombytes("P", img.size, bytes(data))
             q_img.putpalette(rgba_palette_data, "RGBA")
             child['item']['data']['resource_id'] = '8Bit'
-            child['item']['data']['bitmap'] = list(q_img.get_flattened_data())
+            child['item']['data']['bitmap'] = np.frombuffer(q_img.tobytes(), dtype=np.uint8).copy()
         pal = EacPalette().new_data()
         pal['resource_id'] = '32Bit color format palette'
         pal['colors']['data'] = [
@@ -1,6 +1,5 @@
 from copy import deepcopy
 from functools import lru_cache
-from io import BytesIO
 from typing import Tuple, Any, Dict
 
 import numpy as np
@@ -10,13 +9,13 @@ from library.context import ReadContext, WriteContext
 from library.read_blocks import (DataBlock,
                                  DeclarativeCompoundBlock,
                                  IntegerBlock,
-                                 SubByteArrayBlock,
                                  BytesBlock,
                                  ArrayBlock,
                                  EnumByteBlock,
                                  EnumLookupDelegateBlock,
                                  )
 from library.utils import transform_bitness, extract_number
+from library.utils.write_sink import WriteSink
 from resources.eac.fields.misc import Point2D
 
 
@@ -42,6 +41,52 @@ def revert_color_bitness(color, alpha_bitness, red_bitness, green_bitness, blue_
             | blue)
 
 
+# lookup table for vectorized transform_bitness: maps every value of given bitness to 8-bit value
+@lru_cache()
+def _bitness_lookup_table(bitness):
+    return np.array([transform_bitness(x, bitness) for x in range(1 << bitness)], dtype=np.uint32)
+
+
+# vectorized transform_color_bitness, returns uint32 array of RGBA colors
+def transform_colors_bitness(colors, alpha_bitness, red_bitness, green_bitness, blue_bitness) -> np.ndarray:
+    colors = np.asarray(colors).astype(np.uint32)
+    alpha = (_bitness_lookup_table(alpha_bitness)[extract_number(colors, alpha_bitness,
+                                                                 red_bitness + green_bitness + blue_bitness)]
+             if alpha_bitness else np.uint32(0xFF))
+    red = _bitness_lookup_table(red_bitness)[extract_number(colors, red_bitness, green_bitness + blue_bitness)]
+    green = _bitness_lookup_table(green_bitness)[extract_number(colors, green_bitness, blue_bitness)]
+    blue = _bitness_lookup_table(blue_bitness)[extract_number(colors, blue_bitness)]
+    return red << 24 | green << 16 | blue << 8 | alpha
+
+
+# vectorized revert_color_bitness
+def revert_colors_bitness(colors, alpha_bitness, red_bitness, green_bitness, blue_bitness) -> np.ndarray:
+    colors = np.asarray(colors, dtype=np.uint32)
+    alpha = (colors & 0xff) >> (8 - alpha_bitness)
+    red = (colors & 0xff000000) >> (32 - red_bitness)
+    green = (colors & 0xff0000) >> (24 - green_bitness)
+    blue = (colors & 0xff00) >> (16 - blue_bitness)
+    return (alpha << (red_bitness + green_bitness + blue_bitness)
+            | red << (green_bitness + blue_bitness)
+            | green << blue_bitness
+            | blue)
+
+
+# maps 8-bit palette indexes to RGBA colors. Indexes out of palette are transparent. Without palette, returns white
+# colors with alpha taken from indexes
+def apply_palette(indexes, palette_data=None) -> np.ndarray:
+    # one more transparent color for indexes out of palette
+    palette = np.zeros(257, dtype=np.uint32)
+    if palette_data is None:
+        palette[:256] = 0xffffff00 | np.arange(256, dtype=np.uint32)
+    else:
+        colors = np.asarray(palette_data['colors']['data'], dtype=np.uint32)[:256]
+        palette[:len(colors)] = colors
+        if palette_data['last_color_transparent']:
+            palette[255] = 0
+    return palette[np.minimum(np.asarray(indexes, dtype=np.intp), 256)]
+
+
 def get_bitmap_len(resource_id, width, height):
     if resource_id[:2] == '16':
         return 2 * width * height
@@ -171,7 +216,7 @@ class EacImage(DeclarativeCompoundBlock):
         data = super().new_data()
         data['width'] = 1
         data['height'] = 1
-        data['bitmap'] = [[0]]
+        data['bitmap'] = np.zeros((1, 1), dtype=np.uint32)
         return data
 
     def estimate_packed_size(self, data, ctx: WriteContext = None):
@@ -184,89 +229,69 @@ class EacImage(DeclarativeCompoundBlock):
     def _native_to_internal(self, resource_id, width, height, bd):
         if resource_id == '16Bit_4444 color format bitmap':
             bitmap = np.frombuffer(bd, dtype='<u2')
-            return [transform_color_bitness(x, 4, 4, 4, 4) for x in bitmap]
+            return transform_colors_bitness(bitmap, 4, 4, 4, 4)
         elif resource_id == '16Bit_0565 color format bitmap':
             bitmap = np.frombuffer(bd, dtype='<u2')
-            ret = []
-            for pxl in bitmap:
-                if pxl == 0x7c0:
-                    ret.append(0)  # transparent
-                else:
-                    ret.append(transform_color_bitness(pxl, 0, 5, 6, 5))
+            ret = transform_colors_bitness(bitmap, 0, 5, 6, 5)
+            ret[bitmap == 0x7c0] = 0  # transparent
             return ret
         elif resource_id.startswith('4Bit'):
-            field = ArrayBlock(length=height,
-                               child=SubByteArrayBlock(bits_per_value=4,
-                                                       length=width,
-                                                       value_deserialize_func=(lambda x:
-                                                                               0xFFFFFF00
-                                                                               | transform_bitness(x, 4)),
-                                                       value_serialize_func=lambda x: (x & 0xFF) >> 4))
-            ret = field.unpack(ReadContext(BytesIO(bd)))
+            # every row is padded to the whole byte, first pixel is stored in high nibble
+            row_length = ceil(width / 2)
+            packed = np.frombuffer(bd, dtype=np.uint8)[:row_length * height].reshape(height, row_length)
+            pixels = np.empty((height, row_length * 2), dtype=np.uint32)
+            pixels[:, 0::2] = packed >> 4
+            pixels[:, 1::2] = packed & 0xF
+            pixels = pixels[:, :width]
             if resource_id == '4Bit (swapped)':
-                for row in ret:
-                    for i in range(0, len(row), 2):
-                        row[i], row[i + 1] = row[i + 1], row[i]
-            return ret
+                even_width = width - width % 2
+                pixels[:, 0:even_width:2], pixels[:, 1:even_width:2] = (pixels[:, 1:even_width:2].copy(),
+                                                                        pixels[:, 0:even_width:2].copy())
+            return 0xFFFFFF00 | _bitness_lookup_table(4)[pixels]
         elif resource_id == '8Bit':
-            return list(bd)
+            return np.frombuffer(bd, dtype=np.uint8).copy()
         elif resource_id == '16Bit_1555 color format bitmap':
             bitmap = np.frombuffer(bd, dtype='<u2')
-            return [transform_color_bitness(x, 1, 5, 5, 5)
-                    for x in bitmap]
+            return transform_colors_bitness(bitmap, 1, 5, 5, 5)
         elif resource_id == '24Bit color format bitmap':
-            b4 = bytes(bd)
-            b = []
-            for i in range(0, len(b4), 3):
-                b.extend(b4[i:i + 3])
-                b.append(0)
-            bitmap = np.frombuffer(bytes(b), dtype='<u4')
-            return [int((x << 8) | 0xFF) for x in bitmap]
+            bitmap = np.frombuffer(bd, dtype=np.uint8).reshape(-1, 3).astype(np.uint32)
+            return bitmap[:, 2] << 24 | bitmap[:, 1] << 16 | bitmap[:, 0] << 8 | 0xFF
         elif resource_id == '32Bit color format bitmap':
             bitmap = np.frombuffer(bd, dtype='<u4')
             # ARGB => RGBA
-            return [int((x & 0x00_ff_ff_ff) << 8 | (x & 0xff_00_00_00) >> 24) for x in bitmap]
+            return (bitmap & 0x00_ff_ff_ff) << 8 | (bitmap & 0xff_00_00_00) >> 24
         else:
             raise NotImplementedError(f"Bitmap resource ID {resource_id} is not supported")
 
     def _internal_to_native(self, resource_id, width, height, bd):
         if resource_id == '16Bit_4444 color format bitmap':
-            arr = [revert_color_bitness(x, 4, 4, 4, 4) for x in bd]
-            return np.asarray(arr, dtype='<u2').tobytes()
+            return revert_colors_bitness(bd, 4, 4, 4, 4).astype('<u2').tobytes()
         elif resource_id == '16Bit_0565 color format bitmap':
-            arr = []
-            for pxl in bd:
-                if (pxl & 0xff) < 128:
-                    # transparent
-                    arr.append(0x7c0)
-                else:
-                    arr.append(revert_color_bitness(pxl, 0, 5, 6, 5))
-            return np.asarray(arr, dtype='<u2').tobytes()
+            bitmap = np.asarray(bd, dtype=np.uint32)
+            arr = revert_colors_bitness(bitmap, 0, 5, 6, 5)
+            arr[(bitmap & 0xff) < 128] = 0x7c0  # transparent
+            return arr.astype('<u2').tobytes()
         elif resource_id.startswith('4Bit'):
-            field = ArrayBlock(length=height,
-                               child=SubByteArrayBlock(bits_per_value=4,
-                                                       length=width,
-                                                       value_deserialize_func=(lambda x:
-                                                                               0xFFFFFF00
-                                                                               | transform_bitness(x, 4)),
-                                                       value_serialize_func=lambda x: (x & 0xFF) >> 4))
+            pixels = (np.asarray(bd, dtype=np.uint32).reshape(len(bd), -1) & 0xFF) >> 4
+            width = pixels.shape[1]
             if resource_id == '4Bit (swapped)':
-                for row in bd:
-                    for i in range(0, len(row), 2):
-                        row[i], row[i + 1] = row[i + 1], row[i]
-            return field.pack(bd)
+                even_width = width - width % 2
+                pixels[:, 0:even_width:2], pixels[:, 1:even_width:2] = (pixels[:, 1:even_width:2].copy(),
+                                                                        pixels[:, 0:even_width:2].copy())
+            if width % 2:
+                pixels = np.pad(pixels, ((0, 0), (0, 1)))
+            return (pixels[:, 0::2] << 4 | pixels[:, 1::2]).astype(np.uint8).tobytes()
         elif resource_id == '8Bit':
-            return bytes(bd)
+            return np.asarray(bd, dtype=np.uint8).tobytes()
         elif resource_id == '16Bit_1555 color format bitmap':
-            arr = [revert_color_bitness(x, 1, 5, 5, 5) for x in bd]
-            return np.asarray(arr, dtype='<u2').tobytes()
+            return revert_colors_bitness(bd, 1, 5, 5, 5).astype('<u2').tobytes()
         elif resource_id == '24Bit color format bitmap':
-            b4 = np.asarray([x >> 8 for x in bd], dtype='<u4').tobytes()
-            return bytes([b for i, b in enumerate(b4) if i % 4 != 3])
+            bitmap = np.asarray(bd, dtype=np.uint32)
+            return np.stack([bitmap >> 8, bitmap >> 16, bitmap >> 24], axis=-1).astype(np.uint8).tobytes()
         elif resource_id == '32Bit color format bitmap':
+            bitmap = np.asarray(bd, dtype=np.uint32)
             # RGBA => ARGB
-            arr = [(x & 0xff_ff_ff_00) >> 8 | (x & 0xff) << 24 for x in bd]
-            return np.asarray(arr, dtype='<u4').tobytes()
+            return ((bitmap & 0xff_ff_ff_00) >> 8 | (bitmap & 0xff) << 24).astype('<u4').tobytes()
         else:
             raise NotImplementedError(f"Bitmap resource ID {resource_id} is not supported")
 
@@ -283,10 +308,11 @@ class EacImage(DeclarativeCompoundBlock):
     # 5) Change color space back
     # 6) Save
     # 7) Compare with original FSH
-    def write(self, data, ctx: WriteContext = None, name: str = ''):
-        copied = deepcopy(data)
-        copied['bitmap'] = self._internal_to_native(data['resource_id'], data['width'], data['height'], data['bitmap'])
-        return super().write(copied, ctx, name)
+    def write_fields_into(self, sink: WriteSink, data, ctx: WriteContext = None, name: str = ''):
+        copied = {**data,
+                  'bitmap': self._internal_to_native(data['resource_id'], data['width'], data['height'],
+                                                     data['bitmap'])}
+        super().write_fields_into(sink, copied, ctx, name)
 
     def serializer_class(self):
         from serializers import ImageSerializer
@@ -305,40 +331,35 @@ class EacImage(DeclarativeCompoundBlock):
             raise ValueError(f'Invalid channel: {channel}')
         return mask, offs
 
+    # converts RGBA colors to 8-bit values of given channel. RGB channel means grayscale
+    def _rgba_to_channel(self, bitmap, channel):
+        bitmap = np.asarray(bitmap, dtype=np.uint32)
+        if channel == 'RGB':
+            r = (bitmap >> 24) & 0xFF
+            g = (bitmap >> 16) & 0xFF
+            b = (bitmap >> 8) & 0xFF
+            return (r * 77 + g * 150 + b * 29) >> 8
+        (mask, offs) = self._get_channel_mask_offset(channel)
+        return (bitmap & mask) >> offs
+
+    # pixels of 4-bit bitmap (which is stored as rows) as flat array
+    def _flatten_4bit(self, read_data):
+        return np.asarray(read_data['bitmap'], dtype=np.uint32)[:read_data['height'], :read_data['width']].reshape(-1)
+
     def action_convert_to_4bit(self, read_data, mode, channel, **kwargs):
         current_color_format = read_data['resource_id']
         target_color_format = mode
         if current_color_format == target_color_format:
             return
         elif current_color_format == '8Bit':
-            new_bitmap = []
-            for j in range(read_data['height']):
-                new_bitmap.append([])
-                for i in range(read_data['width']):
-                    pxl = read_data['bitmap'][j * read_data['width'] + i]
-                    new_bitmap[j].append(0xffffff00 | pxl)
-            read_data['bitmap'] = new_bitmap
+            bitmap = np.asarray(read_data['bitmap'], dtype=np.uint32)[:read_data['width'] * read_data['height']]
+            read_data['bitmap'] = (0xffffff00 | bitmap).reshape(read_data['height'], read_data['width'])
         elif current_color_format.startswith('4Bit'):
             pass
         else:
-            if channel == 'RGB':
-                def transform(color):
-                    r = (color >> 24) & 0xFF
-                    g = (color >> 16) & 0xFF
-                    b = (color >> 8) & 0xFF
-                    return 0xffffff00 | ((r * 77 + g * 150 + b * 29) >> 8)
-            else:
-                (mask, offs) = self._get_channel_mask_offset(channel)
-
-                def transform(color):
-                    return 0xffffff00 | ((color & mask) >> offs)
-            new_bitmap = []
-            for j in range(read_data['height']):
-                new_bitmap.append([])
-                for i in range(read_data['width']):
-                    pxl = read_data['bitmap'][j * read_data['width'] + i]
-                    new_bitmap[j].append(transform(pxl))
-            read_data['bitmap'] = new_bitmap
+            bitmap = np.asarray(read_data['bitmap'], dtype=np.uint32)[:read_data['width'] * read_data['height']]
+            read_data['bitmap'] = (0xffffff00 | self._rgba_to_channel(bitmap, channel)).reshape(read_data['height'],
+                                                                                                 read_data['width'])
         read_data['resource_id'] = target_color_format
         return
 
@@ -348,70 +369,43 @@ class EacImage(DeclarativeCompoundBlock):
         if current_color_format == target_color_format:
             return
         elif current_color_format.startswith('4Bit'):
-            new_bitmap = []
-            for j in range(read_data['height']):
-                for i in range(read_data['width']):
-                    pxl = read_data['bitmap'][j][i]
-                    new_bitmap.append(pxl & 0xff)
-            read_data['bitmap'] = new_bitmap
+            read_data['bitmap'] = (self._flatten_4bit(read_data) & 0xff).astype(np.uint8)
         else:
-            if channel == 'RGB':
-                def transform(color):
-                    r = (color >> 24) & 0xFF
-                    g = (color >> 16) & 0xFF
-                    b = (color >> 8) & 0xFF
-                    return (r * 77 + g * 150 + b * 29) >> 8
-            else:
-                (mask, offs) = self._get_channel_mask_offset(channel)
-
-                def transform(color):
-                    return (color & mask) >> offs
-            read_data['bitmap'] = [transform(pxl) for pxl in read_data['bitmap']]
+            read_data['bitmap'] = self._rgba_to_channel(read_data['bitmap'], channel).astype(np.uint8)
         read_data['resource_id'] = target_color_format
         return
 
     def action_convert_to_rgba(self, read_data, color_mode, output_colors, id, **kwargs):
         current_color_format = read_data['resource_id']
         target_color_format = color_mode
-        new_bitmap8 = []
+        new_bitmap8 = None
         if current_color_format.startswith('4Bit'):
-            for j in range(read_data['height']):
-                for i in range(read_data['width']):
-                    pxl = read_data['bitmap'][j][i]
-                    new_bitmap8.append(pxl & 0xff)
+            new_bitmap8 = self._flatten_4bit(read_data) & 0xff
         elif current_color_format == '8Bit':
             if output_colors == 'use palette':
                 from resources.eac.utils import determine_palette_for_8_bit_bitmap
                 (palette_block, palette_data) = determine_palette_for_8_bit_bitmap(self, read_data, id)
-                bitmap = []
                 if palette_block is None:
-                    new_bitmap8 = read_data['bitmap']
+                    new_bitmap8 = np.asarray(read_data['bitmap'], dtype=np.uint32)
                 else:
-                    palette_colors = [c for c in palette_data['colors']['data']]
-                    if palette_data['last_color_transparent']:
-                        palette_colors[255] = 0
-                    for index in read_data['bitmap']:
-                        try:
-                            bitmap.append(palette_colors[index])
-                        except IndexError:
-                            bitmap.append(0)
+                    bitmap = apply_palette(read_data['bitmap'], palette_data)
                     native = self._internal_to_native(target_color_format, read_data['width'], read_data['height'],
                                                       bitmap)
                     read_data['bitmap'] = self._native_to_internal(target_color_format, read_data['width'],
                                                                    read_data['height'],
                                                                    native)
             else:
-                new_bitmap8 = read_data['bitmap']
+                new_bitmap8 = np.asarray(read_data['bitmap'], dtype=np.uint32)
         else:
             native = self._internal_to_native(target_color_format, read_data['width'], read_data['height'],
                                               read_data['bitmap'])
             read_data['bitmap'] = self._native_to_internal(target_color_format, read_data['width'], read_data['height'],
                                                            native)
-        if new_bitmap8:
+        if new_bitmap8 is not None and len(new_bitmap8) > 0:
             if output_colors in ['transparent-white', 'use palette']:
-                read_data['bitmap'] = [x | 0xffffff00 for x in new_bitmap8]
+                read_data['bitmap'] = new_bitmap8 | 0xffffff00
             elif output_colors == 'black-white':
-                read_data['bitmap'] = [(x << 24) | (x << 16) | (x << 8) | 0xff for x in new_bitmap8]
+                read_data['bitmap'] = (new_bitmap8 << 24) | (new_bitmap8 << 16) | (new_bitmap8 << 8) | 0xff
             else:
                 raise ValueError(f'Unknown output_colors value: {output_colors}')
         read_data['resource_id'] = target_color_format
@@ -552,10 +546,10 @@ class EacPalette(DeclarativeCompoundBlock):
         data['colors']['data'] = self._colors_native_to_internal(data['resource_id'], data['colors']['data'])
         return data
 
-    def write(self, data, ctx: WriteContext = None, name: str = ''):
+    def write_fields_into(self, sink: WriteSink, data, ctx: WriteContext = None, name: str = ''):
         copied = deepcopy(data)
         copied['colors']['data'] = self._colors_internal_to_native(copied['resource_id'], copied['colors']['data'])
-        return super().write(copied, ctx, name)
+        super().write_fields_into(sink, copied, ctx, name)
 
     def action_invert_colors(self, read_data, **kwargs):
         for (i, color) in enumerate(read_data['colors']['data']):
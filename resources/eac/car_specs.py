@@ -184,7 +184,7 @@ class CarPerformanceSpec(DeclarativeCompoundBlock):
         grip_table_r = (ArrayBlock(length=512, child=FixedPointBlock(length=1, fraction_bits=4)),
                         {'description': 'Grip table for rear axle. Unit is unknown. Windows version overwrites this '
                                         'table with values from "grip_table_f" at 0x00440349'})
-        checksum = (IntegerBlock(length=4, programmatic_value=lambda ctx: sum(ctx.result[:1880])),
+        checksum = (IntegerBlock(length=4, programmatic_value=lambda ctx: sum(ctx.written_bytes(0, 1880))),
                     {'description': 'Check sum of this block contents. Equals to sum of 1880 first bytes. If wrong, '
                                     'game sets field "efficiency" to zero'})
 
@@ -1,11 +1,76 @@
-from heapq import nsmallest, nlargest
 from io import BufferedReader, SEEK_CUR, BytesIO
 from time import time
 
-from library.utils.douby_linked_list import DoublyLinkedList
+import numpy as np
+
 from resources.eac.compressions.base import BaseCompressionAlgorithm
 
 
+def _visited_positions(wide_steps: np.ndarray) -> np.ndarray:
+    """
+    Data is walked from the first byte, making a step of 2 bytes from positions, where wide_steps is True, and a step
+    of 1 byte from others. Returns mask of positions, where the walk stops
+    """
+    length = len(wide_steps)
+    if length == 0:
+        return np.zeros(0, dtype=bool)
+    indexes = np.arange(length)
+    # the first position of every run of wide steps is always visited: a walk never skips two positions in a row.
+    # Inside of the run, every second position is visited
+    run_starts = wide_steps & np.concatenate(([True], ~wide_steps[:-1]))
+    run_start_index = np.maximum.accumulate(np.where(run_starts, indexes, 0))
+    visited_in_run = wide_steps & ((indexes - run_start_index) % 2 == 0)
+    # other positions are skipped only when jumped over from the previous one
+    visited = np.ones(length, dtype=bool)
+    visited[1:] = ~visited_in_run[:-1]
+    return visited | visited_in_run
+
+
+def _count_frequencies(data: np.ndarray, escape_int: int):
+    # walk over the tokens, skipping escaped pairs. The last token is never counted
+    plain = _visited_positions(data == escape_int) & (data != escape_int)
+    plain[-1:] = False
+    plain_indexes = np.flatnonzero(plain)
+    freq_array = np.bincount(data[plain_indexes], minlength=256)
+    plain_indexes = plain_indexes[data[plain_indexes + 1] != escape_int]
+    pairs = (data[plain_indexes].astype(np.int32) << 8) | data[plain_indexes + 1]
+    freq_array_2 = np.bincount(pairs, minlength=256 * 256)
+    return freq_array, freq_array_2
+
+
+def _replace_pairs(data: np.ndarray, replacements, escape_int: int) -> np.ndarray:
+    """
+    Replaces pairs (left, right) with pattern id in a single left to right pass, skipping escaped pairs. Pattern id
+    bytes, which already exist in data, get escaped. For every position the first matching replacement wins
+    """
+    length = len(data)
+    is_pair = np.zeros(length, dtype=bool)
+    is_escape = np.zeros(length, dtype=bool)
+    pattern_values = data.copy()
+    for (pattern, left, right) in reversed(replacements):
+        pair_matches = np.zeros(length, dtype=bool)
+        pair_matches[:-1] = (data[:-1] == left) & (data[1:] == right)
+        escape_matches = data == pattern
+        matches = pair_matches | escape_matches
+        is_pair[matches] = pair_matches[matches] & ~escape_matches[matches]
+        is_escape[matches] = escape_matches[matches]
+        pattern_values[pair_matches] = pattern
+    is_escaped_pair = data == escape_int
+    is_pair &= ~is_escaped_pair
+    is_escape &= ~is_escaped_pair
+    visited = np.flatnonzero(_visited_positions(is_escaped_pair | is_pair))
+    first = np.where(is_pair[visited], pattern_values[visited],
+                     np.where(is_escape[visited], escape_int, data[visited])).astype(np.uint8)
+    # escaped pair keeps its second byte, escaped pattern id byte goes after inserted escape
+    has_second = is_escaped_pair[visited] | is_escape[visited]
+    second = np.where(is_escaped_pair[visited], data[np.minimum(visited + 1, length - 1)], data[visited])
+    offsets = np.arange(len(visited)) + np.concatenate(([0], np.cumsum(has_second)[:-1])).astype(np.int64)
+    result = np.empty(len(visited) + int(has_second.sum()), dtype=np.uint8)
+    result[offsets] = first
+    result[offsets[has_second] + 1] = second[has_second]
+    return result
+
+
 class Qfs2Compression(BaseCompressionAlgorithm):
 
     def _read_value(self, buffer, patterns) -> bytes:
@@ -59,63 +124,27 @@ class Qfs2Compression(BaseCompressionAlgorithm):
         pairs_per_pass = 10
 
         start_time = time()
-        data_dll = DoublyLinkedList.from_list(buffer.read(input_length))
+        data = np.frombuffer(buffer.read(input_length), dtype=np.uint8)
         terminate_int = 0x00
         # TODO test if other escape ints supported on real NFS. Some files have many of them, and after compression they take more space than uncompressed
         escape_int = 0xFF
         patterns = {}
 
         def build_frequency_map():
-            freq_array = [0] * 256
-            freq_array_2 = [0] * (256 * 256)
-            node = data_dll.head
-            while node and node.next:
-                # escape characters and patter ids are already escaped
-                if node.data == escape_int:
-                    if node.next:
-                        node = node.next.next
-                        continue
-                    else:
-                        break
-                freq_array[node.data] += 1
-                if node.next.data != escape_int:
-                    freq_array_2[(node.data << 8) | (node.next.data)] += 1
-                node = node.next
+            (freq_array, freq_array_2) = _count_frequencies(data, escape_int)
+            # stable sorts keep lower values first among equal frequencies
+            order = np.argsort(freq_array, kind='stable')
+            order = order[(order != escape_int) & (order != terminate_int)]
+            order_2 = np.argsort(-freq_array_2, kind='stable')[:256]
+            order_2 = order_2[freq_array_2[order_2] > 0]
             return (
-                nsmallest(256, (x for x in enumerate(freq_array) if x[0] not in [escape_int, terminate_int]),
-                          key=lambda item: item[1]),
-                nlargest(256, (x for x in enumerate(freq_array_2) if x[1] > 0), key=lambda item: item[1]),
+                list(zip(order.tolist(), freq_array[order].tolist())),
+                list(zip(order_2.tolist(), freq_array_2[order_2].tolist())),
             )
 
-        def replace_pattern_in_data(replacements):
-            len_delta = 0
-            node = data_dll.head
-            while node:
-                if node.data == escape_int:
-                    node = node.next.next
-                    continue
-                node_next = node.next
-                for (pattern, left, right) in replacements:
-                    if node.data == pattern:
-                        data_dll.insert(escape_int, node.prev, node)
-                        len_delta += 1
-                        node = node_next
-                        break
-                    elif (node_next is not None and node.data == left and node_next.data == right):
-                        data_dll.insert(pattern, node.prev, node_next.next)
-                        len_delta -= 1
-                        node = node_next.next
-                        break
-                else:
-                    node = node_next
-            return len_delta
-
         # escape "escape character"
-        escape_chars_count = 0
-        for node in data_dll.nodes():
-            if node.data == escape_int:
-                escape_chars_count += 1
-                data_dll.insert(escape_int, node.prev, node)
+        escape_chars_count = int(np.count_nonzero(data == escape_int))
+        data = np.repeat(data, np.where(data == escape_int, 2, 1))
         print(f"Escaping bytes added: {escape_chars_count}")
 
         # when we create pattern X = YZ, we never allow to use Y or Z as pattern id, since
@@ -162,7 +191,9 @@ class Qfs2Compression(BaseCompressionAlgorithm):
                     this_pass_replacements = []
             for (pid, l, r) in this_pass_replacements:
                 patterns[pid] = (l, r)
-            saved_bytes_this_pass = -replace_pattern_in_data(this_pass_replacements)
+            previous_length = len(data)
+            data = _replace_pairs(data, this_pass_replacements, escape_int)
+            saved_bytes_this_pass = previous_length - len(data)
             print(f"Pass {p}: {saved_bytes_this_pass} bytes saved. Replaced patterns: {len(this_pass_replacements)}")
             if hardcoded_patterns is None and saved_bytes_this_pass < input_length // 200:
                 print("Saved less than 0.5% of input length, breaking.")
@@ -178,8 +209,7 @@ class Qfs2Compression(BaseCompressionAlgorithm):
             compressed.append(pattern_id)
             compressed.append(left)
             compressed.append(right)
-        for item in data_dll.items():
-            compressed.append(item)
+        compressed.extend(data.tobytes())
         compressed.append(escape_int)
         compressed.append(terminate_int)
 
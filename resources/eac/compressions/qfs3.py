@@ -1,432 +1,245 @@
-from io import BufferedReader, BytesIO
-from typing import Literal
+from io import BufferedReader, BytesIO, SEEK_END
 
-from library.utils.asm_runner import AsmRunner
-from resources.eac.compressions.base import BaseCompressionAlgorithm
-
-def read_int(buffer: [BufferedReader, BytesIO], byteorder: Literal["little", "big"] = 'little') -> int:
-    return int.from_bytes(buffer.read(4), byteorder=byteorder)
-
-
-def read_short(buffer: [BufferedReader, BytesIO], byteorder: Literal["little", "big"] = 'little') -> int:
-    value = buffer.read(2)
-    value = value.ljust(2, b'\0')
-    return int.from_bytes(value, byteorder=byteorder)
-
-
-class Qfs3Compression(BaseCompressionAlgorithm, AsmRunner):
-
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, asm_virtual_memory_size=2 * 1024, **kwargs)
-        self.output_length = 0
-        self.index_table_0 = []
-        self.unk_table = [0] * 256
-        self.unk_table_2 = [0] * 256
-        self.unk_table_3 = [0] * 256  # maybe has different size
-        self.accumulator = 0
-        self.available_acc_bits = 0
-
-    def append_to_output(self, buffer, value):
-        buffer.extend(value.to_bytes(1, 'little'))
+import numpy as np
 
-    def reuse_output_byte(self, buffer, length):
-        value = buffer[-1]
-        for i in range(length):
-            self.append_to_output(buffer, value)
-
-    def read_next(self, buffer):
-        self.accumulator = (read_short(buffer, 'big') | (self.accumulator << 16))
-
-    def accumulate_if_needed(self, buffer):
-        if self.available_acc_bits < 0:
-            self.read_next(buffer)
-            self.esi = self.accumulator << -self.available_acc_bits
-            self.available_acc_bits += 16
-
-    def uncompress(self, buffer: BufferedReader, input_length: int) -> bytes:
-        uncompressed: bytearray = bytearray()
-
-        table_110 = [0] * 16
-
-        self.define_variable('var_14C', -0x14C, 4)
-        self.define_variable('var_154', -0x154, 4)
-
-        index_table_0_capacity = 0
-        unk_counter = 0
+from resources.eac.compressions.base import BaseCompressionAlgorithm
 
-        self.available_acc_bits = 0
-        file_header = self.accumulator = read_short(buffer, 'big')
+# code lengths in the 8-bit lookup table: code is longer than 8 bits, or it is the clue (escape) symbol
+LONG_CODE = 0x40
+CLUE_CODE = 0x60
+MAX_CODE_LENGTH = 16
+# decoded symbols are checked to fit the output length only after the bit window refill or a long code, as in the
+# original decoder, so output may get a few bytes longer before the end code
+OUTPUT_SLACK = 64
+
+
+class Qfs3Compression(BaseCompressionAlgorithm):
+    """
+    EA Huffman compression with run-length encoding. Bit stream is read with 32-bit window (MSB is the next bit),
+    which is refilled with 16 bits every time it has less than 16 unread bits. Data is decoded with a lookup table by
+    16-bit prefix, built once per stream
+    """
+
+    def uncompress(self, buffer: [BufferedReader, BytesIO], input_length: int) -> bytearray:
+        start = buffer.tell()
+        data = buffer.read(-1 if input_length is None else input_length)
+        data_length = len(data)
+        # all reads past the end of data produce zeros
+        padded = bytearray(data)
+        padded += bytes(8)
+
+        file_header = (padded[0] << 8) | padded[1]
         if (file_header & 0xfb) != 0xfb:
             raise ValueError("Invalid QFS3 file header")
-        self.read_next(buffer)
-        self.esi = self.accumulator << 16
+        # window and amount of unread bits in it above 16
+        window = ((padded[2] << 8) | padded[3]) << 16
+        accumulator = window >> 16
+        available = 0
+        pos = 4
         # if compressed size presented
         if file_header & 0x100:
-            self.edx = read_int(buffer, 'big')
-            self.available_acc_bits = 8
-            self.esi = self.edx << 8
-            self.accumulator = self.edx
+            accumulator = int.from_bytes(padded[pos:pos + 4], 'big')
+            pos += 4
+            available = 8
+            window = (accumulator << 8) & 0xFFFFFFFF
             # reset size presented flag bit
             file_header = file_header & 0xFEFF
-        self.ebx = self.esi >> 0x18
-        self.available_acc_bits -= 8
-        self.esi = self.esi << 8
-        self.accumulate_if_needed(buffer)
-        self.eax = self.esi >> 16
-        self.available_acc_bits -= 16
-        self.esi = self.esi << 16
-        self.output_length = self.eax
-        self.accumulate_if_needed(buffer)
-        self.edx = self.output_length = self.output_length | (self.ebx << 16)
-        self.ebx = 1
-        self.eax = self.esi >> 0x18
-        self.available_acc_bits -= 8
-        self.esi = self.esi << 8
-        unk_1 = self.al
-        self.accumulate_if_needed(buffer)
-        unk_90 = 1
-        unk_3 = 15
-        unk_2 = 4
-        self.ebp = 0
-        while True:
-            self.ebp = self.ebp << 1
-            self.ecx = index_table_0_capacity
-            self.eax = self.ebp - self.ecx
-            self.edx = unk_2
-            assert self.edx % 4 == 0  # logic below will work in different way if not
-            self.unk_table_3[int(self.edx / 4)] = self.eax
-            if self.get_register_signed_value('esi') >= 0:
-                self.eax = 2
-                if (self.esi >> 16) == 0:
-                    self.edx = 0
-                    while self.edx == 0:
-                        self.edx = self.esi >> 0x1F
-                        self.eax += 1
-                        self.available_acc_bits -= 1
-                        self.esi = self.esi << 1
-                        self.accumulate_if_needed(buffer)
-                else:
-                    while self.get_register_signed_value('esi') >= 0:
-                        self.esi = self.esi << 1
-                        self.eax += 1
-                    self.edx = self.eax - 1
-                    self.available_acc_bits -= self.edx
-                    self.esi = self.esi << 1
-                    self.accumulate_if_needed(buffer)
-                if self.get_register_signed_value('eax') <= 16:
-                    self.edx = self.esi >> (0x20 - self.eax)
-                    self.ecx = self.al
-                    self.available_acc_bits -= self.eax
-                    self.esi = self.esi << self.cl
-                    self.accumulate_if_needed(buffer)
-                else:
-                    self.ebx = self.eax - 16
-                    self.edx = self.esi >> (0x20 - self.ebx)
-                    self.ecx = self.bl
-                    self.available_acc_bits -= self.ebx
-                    self.esi = self.esi << self.cl
-                    self.accumulate_if_needed(buffer)
-                    self.ebx = self.esi >> 16
-                    self.available_acc_bits -= 16
-                    self.esi = self.esi << 16
-                    self.accumulate_if_needed(buffer)
-                    self.edx = (self.edx << 16) | self.ebx
-                self.edx += (1 << self.al)
-            else:
-                self.edx = self.esi >> 0x1D
-                self.available_acc_bits -= 3
-                self.esi = self.esi << 3
-                self.accumulate_if_needed(buffer)
-            self.edx -= 4
-            self.eax = unk_2
-            assert self.eax % 4 == 0
-            table_110[int(self.eax / 4)] = self.edx
-            self.eax = index_table_0_capacity
-            self.ebp += self.edx
-            self.eax += self.edx
-            self.ecx = 0
-            index_table_0_capacity = self.eax
-            if self.edx != 0:
-                self.cl = unk_3 & 0xFF
-                self.eax = self.ebp << self.cl
-                self.ecx = self.eax & 0xFFFF
-            self.ebx = unk_3 - 1
-            self.eax = unk_2 = unk_2 + 4
-            unk_3 = self.ebx
-            self.ebx = unk_90 + 1
-            self.set_value('[esp+eax+550h+var_154]', self.ecx)
-            unk_90 = self.ebx
-            if self.edx == 0:
-                continue
-            if self.ecx == 0:
-                break
-        self.ecx = 0xFFFFFFFF
-        unk_8 = self.ebx - 1
-        self.set_value('[esp+ebx*4+550h+var_154]', self.ecx)
-        self.ebx = 0
-        huff_table_0_iter_ptr = 0
-        self.eax = 0xFF
-        unk_4 = 0
-        if index_table_0_capacity > 0:
-            self.index_table_0 = [None] * index_table_0_capacity
-            while True:
-                if self.get_register_signed_value('esi') >= 0:
-                    self.edx = 2
-                    if (self.esi >> 16) == 0:
-                        while True:
-                            self.ebp = self.esi
-                            self.edx += 1
-                            self.available_acc_bits -= 1
-                            self.ebp = self.ebp >> 0x1F
-                            self.esi = self.esi << 1
-                            self.accumulate_if_needed(buffer)
-                            if self.ebp != 0:
-                                break
-                    else:
-                        while self.get_register_signed_value('esi') >= 0:
-                            self.esi = self.esi << 1
-                            self.edx += 1
-                        self.ebx = self.edx - 1
-                        self.available_acc_bits -= self.ebx
-                        self.esi = self.esi << 1
-                        self.accumulate_if_needed(buffer)
-                    self.ebx = self.accumulator << 8
-                    if self.get_register_signed_value('edx') <= 16:
-                        self.ebx = self.esi >> (0x20 - self.edx)
-                        self.cl = self.dl
-                        self.available_acc_bits -= self.edx
-                        self.esi = self.esi << self.cl
-                        self.accumulate_if_needed(buffer)
-                    else:
-                        unk_4 = self.edx - 16
-                        self.ecx = 0x20 - unk_4
-                        self.ebx = self.esi >> self.cl
-                        self.cl = unk_4
-                        self.esi = self.esi << self.cl
-                        self.available_acc_bits -= unk_4
-                        self.accumulate_if_needed(buffer)
-                        self.ecx = self.esi >> 16
-                        self.available_acc_bits -= 16
-                        self.esi = self.esi << 16
-                        unk_7 = self.ecx
-                        self.accumulate_if_needed(buffer)
-                        self.ecx = unk_7
-                        self.ebx = (self.ebx << 16) | self.ecx
-                    self.cl = self.dl
-                    self.edx = 1 << self.cl
-                    self.ebx += self.edx
-                else:
-                    self.ebx = self.esi >> 0x1D
-                    self.available_acc_bits -= 3
-                    self.esi = self.esi << 3
-                    self.accumulate_if_needed(buffer)
-                self.ebx -= 3
-                while self.ebx != 0:
-                    self.al += 1
-                    self.edx = self.al
-                    if self.edx not in self.index_table_0:
-                        self.ebx -= 1
-                self.edx = self.al
-                self.edx = huff_table_0_iter_ptr
-                self.ecx = index_table_0_capacity
-                self.ebx = self.edx + 1
-                self.index_table_0[self.edx] = self.al
-                huff_table_0_iter_ptr = self.ebx
-                if self.get_register_signed_value('ebx') >= self.get_register_signed_value('ecx'):
-                    break
-        self.unk_table_2 = [0x40] * 256
-        self.edx = 0
-        self.ebx = 0
-        self.ecx = unk_8
-        unk_5 = 1
-        unk_9 = 0
-        if self.ecx >= 1:
-            self.ecx = 7
-            self.eax = 4
-            unk_2 = self.ecx
-            unk_3 = self.eax
-            while True:
-                self.eax = unk_3
-                assert self.eax % 4 == 0
-                self.eax = table_110[int(self.eax / 4)]
-                self.ebp = unk_5
-                unk_6 = self.eax
-                if self.get_register_signed_value('ebp') >= 9:
-                    break
-                self.ecx = unk_2
-                self.ebp = 1 << self.cl
-                break_outer = False
-                continue_outer = False
+
+        def read_bits(count):
+            nonlocal window, available, accumulator, pos
+            value = window >> (32 - count)
+            available -= count
+            window = (window << count) & 0xFFFFFFFF
+            if available < 0:
+                if pos + 2 > len(padded):
+                    padded.extend(bytes(1024))
+                accumulator = ((accumulator << 16) | (padded[pos] << 8) | padded[pos + 1]) & 0xFFFFFFFF
+                pos += 2
+                window = (accumulator << -available) & 0xFFFFFFFF
+                available += 16
+            return value
+
+        # variable length number: 1xx for 4-7, otherwise 0...01 prefix with n zeros, followed by n+2 bits
+        def read_number():
+            if window & 0x80000000:
+                return read_bits(3)
+            if window >> 16 == 0:
+                length = 2
                 while True:
-                    self.eax = unk_6 - 1
-                    unk_6 = self.eax
-                    if self.eax == 0xFFFFFFFF:
-                        self.ebp = unk_3 = unk_3 + 4
-                        self.eax = unk_2 = unk_2 - 1
-                        self.ecx = unk_5 + 1
-                        unk_5 = self.ecx
-                        self.ebp = unk_8
-                        if self.get_register_signed_value('ecx') <= self.get_register_signed_value('ebp'):
-                            continue_outer = True
-                            break
-                        else:
-                            break_outer = True
-                            break
-                    else:
-                        index_table_0_value = self.index_table_0[unk_counter]
-                        unk_counter += 1
-                        unk_0 = unk_5
-                        self.ecx = index_table_0_value
-                        self.eax = unk_1
-                        if self.eax == self.ecx:
-                            self.eax = unk_5
-                            unk_9 = self.eax
-                            unk_0 = 0x60
-                        self.eax = 0
-                        if self.get_register_signed_value('ebp') <= 0:
-                            continue
-                        while self.get_register_signed_value('eax') < self.get_register_signed_value('ebp'):
-                            self.edx += 1
-                            self.cl = index_table_0_value
-                            self.ebx += 1
-                            self.unk_table[self.edx - 1] = self.cl
-                            self.cl = unk_0
-                            self.eax += 1
-                            self.unk_table_2[self.ebx - 1] = self.cl
-                if break_outer:
-                    break
-                if continue_outer:
-                    continue
-                break
-        while True:
-            if len(uncompressed) > self.output_length:
-                raise Exception('Uncompress algorythm writes more that file length')
-            self.eax = self.unk_table_2[self.esi >> 0x18]
-            self.available_acc_bits -= self.eax
-            while self.available_acc_bits >= 0:
-                self.edx = self.esi >> 0x18
-                for _ in range(4):
-                    self.append_to_output(uncompressed, self.unk_table[self.edx])
-                    self.esi = self.esi << self.al
-                    self.edx = self.esi >> 0x18
-                    self.eax = self.unk_table_2[self.edx]
-                    self.available_acc_bits -= self.eax
-                    if self.available_acc_bits < 0:
+                    length += 1
+                    if read_bits(1):
                         break
-            self.available_acc_bits += 0x10
-            if self.available_acc_bits >= 0:
-                self.append_to_output(uncompressed, self.unk_table[(self.esi >> 0x18)])
-                self.read_next(buffer)
-                self.esi = self.accumulator << (0x10 - self.available_acc_bits)
-                continue
-            self.available_acc_bits += self.eax - 0x10
-            if self.eax == 0x60:
-                self.eax = unk_9
             else:
-                self.eax = 8
-                self.edx = self.esi >> 16
-                self.ecx = 0x20
-                while True:
-                    self.eax += 1
-                    self.ebp = self.get_value('[esp+ecx+550h+var_14C]')[0]
-                    self.ecx += 4
-                    if self.edx < self.ebp:
-                        break
-            self.ecx = 0x20 - self.eax
-            self.edx = self.esi >> self.cl
-            self.cl = self.al
-            self.available_acc_bits -= self.eax
-            self.esi = self.esi << self.cl
-            self.ecx = self.unk_table_3[self.eax]
-            self.eax = self.edx - self.ecx
-            self.al = self.index_table_0[self.eax]
-            if self.al != unk_1:
-                if self.available_acc_bits >= 0:
-                    self.append_to_output(uncompressed, self.al)
+                length = 2
+                while not (window << (length - 2)) & 0x80000000:
+                    length += 1
+                read_bits(length - 1)
+            if length <= 16:
+                value = read_bits(length)
+            else:
+                value = read_bits(length - 16) << 16
+                value |= read_bits(16)
+            return ((1 << length) & 0xFFFFFFFF) + value
+
+        output_length = read_bits(8) << 16
+        output_length |= read_bits(16)
+        clue = read_bits(8)
+
+        # canonical huffman code: amount of codes of every length, code of the first symbol of every length
+        # minus index of that symbol, and left-justified 16-bit limit of codes of every length
+        codes_count = [0] * (MAX_CODE_LENGTH + 2)
+        code_bases = [0] * (MAX_CODE_LENGTH + 2)
+        code_limits = [0] * (MAX_CODE_LENGTH + 3)
+        symbols_count = 0
+        next_code = 0
+        max_length = 0
+        while True:
+            max_length += 1
+            if max_length > MAX_CODE_LENGTH:
+                raise ValueError('Error while unpacking QFS3 archive: invalid code lengths')
+            next_code = (next_code << 1) & 0xFFFFFFFF
+            code_bases[max_length] = (next_code - symbols_count) & 0xFFFFFFFF
+            count = (read_number() - 4) & 0xFFFFFFFF
+            codes_count[max_length] = count
+            next_code = (next_code + count) & 0xFFFFFFFF
+            symbols_count = (symbols_count + count) & 0xFFFFFFFF
+            limit = 0
+            if count != 0:
+                limit = (next_code << (16 - max_length)) & 0xFFFF
+            code_limits[max_length + 1] = limit
+            if count != 0 and limit == 0:
+                break
+        code_limits[max_length + 1] = 0xFFFFFFFF
+        if symbols_count > 256:
+            raise ValueError(f'Error while unpacking QFS3 archive: invalid symbols count {symbols_count}')
+
+        # symbols in order of codes. Symbol is encoded as amount of not yet used byte values to skip since the
+        # previous symbol
+        symbols = [None] * symbols_count
+        used = [False] * 256
+        symbol = 0xFF
+        for i in range(symbols_count):
+            skip = (read_number() - 3) & 0xFFFFFFFF
+            while skip != 0:
+                symbol = (symbol + 1) & 0xFF
+                if not used[symbol]:
+                    skip -= 1
+            symbols[i] = symbol
+            used[symbol] = True
+
+        # lookup table by 8-bit prefix for codes up to 8 bits
+        short_symbols = [0] * 256
+        short_lengths = [LONG_CODE] * 256
+        clue_length = 0
+        table_index = 0
+        symbol_index = 0
+        for length in range(1, min(max_length, 8) + 1):
+            entries = 1 << (8 - length)
+            for _ in range(codes_count[length]):
+                symbol = symbols[symbol_index]
+                symbol_index += 1
+                entry_length = length
+                if symbol == clue:
+                    clue_length = length
+                    entry_length = CLUE_CODE
+                if table_index + entries > 256:
+                    raise ValueError('Error while unpacking QFS3 archive: invalid code lengths')
+                short_symbols[table_index:table_index + entries] = [symbol] * entries
+                short_lengths[table_index:table_index + entries] = [entry_length] * entries
+                table_index += entries
+
+        (decode_table, decode_lengths) = self._build_decode_table(short_symbols, short_lengths, clue_length,
+                                                                  code_limits, code_bases, symbols, clue)
+
+        output = bytearray(output_length + OUTPUT_SLACK)
+        out_pos = 0
+        overflow_message = 'Uncompress algorythm writes more that file length'
+        while True:
+            prefix = window >> 16
+            length = decode_lengths[prefix]
+            if length == 0:
+                raise ValueError('Error while unpacking QFS3 archive: invalid code')
+            symbol = decode_table[prefix]
+            # inlined read_bits(length)
+            available -= length
+            window = (window << length) & 0xFFFFFFFF
+            if available < 0:
+                if pos + 2 > len(padded):
+                    padded.extend(bytes(1024))
+                accumulator = ((accumulator << 16) | (padded[pos] << 8) | padded[pos + 1]) & 0xFFFFFFFF
+                pos += 2
+                window = (accumulator << -available) & 0xFFFFFFFF
+                available += 16
+                if symbol >= 0:
+                    output[out_pos] = symbol & 0xFF
+                    out_pos += 1
+                    if out_pos > output_length:
+                        raise ValueError(overflow_message)
                     continue
-            self.accumulate_if_needed(buffer)
-            if self.al != unk_1:
-                self.append_to_output(uncompressed, self.al)
+            elif symbol >= 0:
+                output[out_pos] = symbol & 0xFF
+                out_pos += 1
+                if symbol > 0xFF and out_pos > output_length:
+                    raise ValueError(overflow_message)
                 continue
-            if self.get_register_signed_value('esi') >= 0:
-                self.eax = 2
-                if (self.esi >> 16) == 0:
-                    self.ebp = 0
-                    while unk0 == 0:
-                        unk0 = self.esi >> 0x1F
-                        self.eax += 1
-                        self.available_acc_bits -= 1
-                        self.esi = self.esi << 1
-                        self.accumulate_if_needed(buffer)
-                else:
-                    while True:
-                        self.esi = self.esi << 1
-                        self.eax += 1
-                        if self.get_register_signed_value('esi') < 0:
-                            break
-                    self.ecx = self.eax - 1
-                    self.available_acc_bits -= self.ecx
-                    self.esi = self.esi << 1
-                    self.accumulate_if_needed(buffer)
-                if self.get_register_signed_value('eax') <= 16:
-                    self.ecx = 0x20 - self.eax
-                    self.ebp = self.esi >> self.cl
-                    self.available_acc_bits -= self.eax
-                    self.cl = self.al
-                    fill_bytes_length = self.ebp
-                    self.esi = self.esi << self.cl
-                    self.accumulate_if_needed(buffer)
-                    self.cl = self.al
-                    self.eax = (1 << self.cl) + fill_bytes_length
-                else:
-                    self.ecx = self.eax - 16
-                    self.ebp = self.esi >> (0x20 - self.ecx)
-                    self.esi = self.esi << self.cl
-                    self.available_acc_bits -= self.ecx
-                    unk_4 = self.ecx
-                    fill_bytes_length = self.ebp
-                    self.accumulate_if_needed(buffer)
-                    self.ecx = self.esi >> 16
-                    self.available_acc_bits -= 16
-                    self.esi = self.esi << 16
-                    unk3 = self.ecx
-                    self.accumulate_if_needed(buffer)
-                    self.ecx = fill_bytes_length << 16
-                    self.eax = (1 << self.al) + (self.ecx | unk3)
-                self.eax = self.eax - 4
-                fill_bytes_length = self.eax
-            else:
-                self.eax = self.esi >> 0x1D
-                self.available_acc_bits -= 3
-                self.esi = self.esi << 3
-                fill_bytes_length = self.eax
-                self.accumulate_if_needed(buffer)
-                fill_bytes_length -= 4
-            self.ebp = fill_bytes_length
-            if self.ebp == 0:
-                self.ebp = self.esi >> 0x1F
-                self.available_acc_bits -= 1
-                self.esi = self.esi << 1
-                self.accumulate_if_needed(buffer)
-                if self.ebp != 0:
-                    if file_header == 0x34FB:
-                        value_b = value_a = 0
-                        for i in range(self.output_length):
-                            value_a += uncompressed[i]
-                            value_b += value_a
-                            uncompressed[i] = value_b & 0xFF
-                    elif file_header == 0x32FB:
-                        value = 0
-                        for i in range(self.output_length):
-                            value += uncompressed[i]
-                            uncompressed[i] = value & 0xFF
-                    break
-                else:
-                    self.eax = self.esi >> 0x18
-                    self.available_acc_bits -= 8
-                    self.esi = self.esi << 8
-                    self.accumulate_if_needed(buffer)
-                    self.append_to_output(uncompressed, self.eax & 0xFF)
+            # clue symbol: run of repeated last byte, escaped byte or the end of data
+            run_length = (read_number() - 4) & 0xFFFFFFFF
+            if run_length != 0:
+                if out_pos == 0 or out_pos + run_length > output_length:
+                    raise ValueError(overflow_message)
+                output[out_pos:out_pos + run_length] = output[out_pos - 1:out_pos] * run_length
+                out_pos += run_length
+            elif read_bits(1):
+                break
             else:
-                self.reuse_output_byte(uncompressed, self.ebp)
-        return uncompressed
+                output[out_pos] = read_bits(8)
+                out_pos += 1
+                if out_pos > output_length:
+                    raise ValueError(overflow_message)
+
+        # leave buffer where bit reader stopped, reads past the end of buffer do not move it
+        buffer_end = buffer.seek(0, SEEK_END)
+        buffer.seek(min(start + pos, max(buffer_end, start + data_length)))
+
+        del output[out_pos:]
+        if file_header in (0x34FB, 0x32FB):
+            if out_pos < output_length:
+                raise ValueError(f'Error while unpacking QFS3 archive: expected length {output_length}, '
+                                 f'actual length: {out_pos}')
+            # delta-encoded data (twice for 0x34FB). Bytes after the declared length are left as is
+            values = np.frombuffer(output, dtype=np.uint8, count=output_length)
+            values = np.cumsum(values, dtype=np.uint8)
+            if file_header == 0x34FB:
+                values = np.cumsum(values, dtype=np.uint8)
+            output[:output_length] = values.tobytes()
+        return output
+
+    @staticmethod
+    def _build_decode_table(short_symbols, short_lengths, clue_length, code_limits, code_bases, symbols, clue):
+        """
+        Builds lookup tables of decoded symbol and code length by 16-bit prefix of bit stream. Clue symbol is -1,
+        symbols of codes, which original decoder handles on the slow path, have 0x100 bit set. Code length 0 marks
+        invalid codes
+        """
+        prefixes = np.arange(1 << 16, dtype=np.int64)
+        short_lengths = np.array(short_lengths, dtype=np.int64)[prefixes >> 8]
+        symbols_array = np.array(symbols + [0], dtype=np.int64)
+        lengths = np.where(short_lengths == CLUE_CODE, clue_length, short_lengths)
+        table = np.array(short_symbols, dtype=np.int64)[prefixes >> 8]
+        is_clue = short_lengths == CLUE_CODE
+        # longer codes: the first length, which limit is above the prefix
+        is_long = short_lengths == LONG_CODE
+        long_lengths = np.zeros(1 << 16, dtype=np.int64)
+        for length in range(MAX_CODE_LENGTH, 8, -1):
+            long_lengths[prefixes < code_limits[length + 1]] = length
+        lengths = np.where(is_long, long_lengths, lengths)
+        # codes, which symbol is found by canonical code index: all longer ones and the clue
+        by_index = is_long | is_clue
+        shifts = np.clip(16 - lengths, 0, 16)
+        indexes = ((prefixes >> shifts) - np.array(code_bases + [0] * 2, dtype=np.int64)[np.clip(lengths, 0, 17)]) \
+            & 0xFFFFFFFF
+        valid_index = indexes < len(symbols)
+        table = np.where(by_index, symbols_array[np.where(valid_index, indexes, len(symbols))], table)
+        lengths = np.where(by_index & ~valid_index, 0, lengths)
+        table = np.where(by_index, np.where(table == clue, -1, table | 0x100), table)
+        return table.tolist(), lengths.tolist()
@@ -1,8 +1,79 @@
-from io import BufferedReader, SEEK_CUR, BytesIO
+from io import BufferedReader, BytesIO
 
+import numpy as np
+
+from library.utils.memory_view_buffer import MemoryViewBuffer
 from resources.eac.compressions.base import BaseCompressionAlgorithm
 
 
+# compression level: (window size, max amount of checked match candidates per position, lazy matching)
+COMPRESSION_LEVELS = {
+    1: (0x400, 4, False),
+    2: (0x4000, 8, False),
+    3: (0x4000, 16, False),
+    4: (0x20000, 16, False),
+    5: (0x20000, 32, True),
+    6: (0x20000, 64, True),
+    7: (0x20000, 128, True),
+    8: (0x20000, 256, True),
+    9: (0x20000, 1024, True),
+}
+DEFAULT_COMPRESSION_LEVEL = 4
+
+MIN_MATCH_LENGTH = 3
+MAX_MATCH_LENGTH = 1028
+MAX_OFFSET = 0x20000
+MAX_LITERALS_BLOCK = 112
+MAX_OUTPUT_LENGTH = 0xFFFFFF
+
+
+# shortest match, which can be encoded with given offset
+def _min_match_length(offset):
+    if offset <= 0x400:
+        return 3
+    if offset <= 0x4000:
+        return 4
+    return 5
+
+
+# length of common prefix of data[a:] and data[b:], not longer than limit. First MIN_MATCH_LENGTH bytes are known
+# to be equal
+def _match_length(data: bytes, a: int, b: int, limit: int) -> int:
+    length = MIN_MATCH_LENGTH
+    step = 8
+    while True:
+        end = min(length + step, limit)
+        if data[a + length:a + end] != data[b + length:b + end]:
+            break
+        length = end
+        if length == limit:
+            return length
+        step <<= 1
+    # mismatch is somewhere in [length, end)
+    while end - length > 8:
+        middle = (length + end) // 2
+        if data[a + length:a + middle] == data[b + length:b + middle]:
+            length = middle
+        else:
+            end = middle
+    while data[a + length] == data[b + length]:
+        length += 1
+    return length
+
+
+# for every position returns the closest previous position, starting with the same 3 bytes, or -1
+def _previous_occurrences(data: bytes) -> list:
+    if len(data) < MIN_MATCH_LENGTH:
+        return []
+    values = np.frombuffer(data, dtype=np.uint8).astype(np.int32)
+    keys = (values[:-2] << 16) | (values[1:-1] << 8) | values[2:]
+    order = np.argsort(keys, kind='stable')
+    same = keys[order[1:]] == keys[order[:-1]]
+    previous = np.full(len(keys), -1, dtype=np.int64)
+    previous[order[1:][same]] = order[:-1][same]
+    return previous.tolist()
+
+
 # http://wiki.niotso.org/RefPack
 # https://www.wiki.sc4devotion.com/index.php?title=DBPF_Compression
 class RefPackCompression(BaseCompressionAlgorithm):
@@ -14,72 +85,183 @@ class RefPackCompression(BaseCompressionAlgorithm):
         contains_compressed_size = bool(flags_byte & 0b0000_0001)
         return long_file, contains_compressed_size
 
-    def _copy_bytes_to_output(self, buffer, uncompressed: bytearray, length):
-        uncompressed.extend(buffer.read(length))
-
-    def _reuse_bytes_in_output(self, buffer, uncompressed: bytearray, length, offset):
-        if length > offset:
-            old_length = len(uncompressed)
-            while len(uncompressed) < old_length + length:
-                uncompressed.extend(uncompressed[-offset].to_bytes(1, byteorder='big'))
-        elif offset == length:
-            uncompressed.extend(uncompressed[-offset:])
-        elif length > 0:
-            uncompressed.extend(uncompressed[-offset:-offset + length])
-
-    def uncompress(self, buffer: [BufferedReader, BytesIO], input_length: int):
-        uncompressed: bytearray = bytearray()
-        use_4_bytes, contains_compressed_size = self._parse_archive_flags(buffer.read(1)[0])
-        hdr2 = buffer.read(1)[0]
-        if hdr2 != 0xfb:
+    @staticmethod
+    def _reuse_bytes_in_output(output: bytearray, start: int, length: int, offset: int):
+        if offset > len(output) - start:
+            raise ValueError(f'Error while unpacking QFS archive: back-reference offset {offset} is out of output')
+        source = len(output) - offset
+        if length <= offset:
+            output += output[source:source + length]
+            return
+        # overlapping reference repeats last offset bytes. Every copy doubles the already repeated run, so it takes
+        # log2(length / offset) slice copies instead of copying byte by byte
+        end = len(output) + length
+        while len(output) < end:
+            output += output[source:source + min(end - len(output), len(output) - source)]
+
+    # decompresses RefPack stream (including header) from bytes-like data and appends result to the output.
+    # Returns amount of consumed input bytes
+    def uncompress_into(self, data, output: bytearray) -> int:
+        view = data if isinstance(data, memoryview) else memoryview(data)
+        input_length = len(view)
+        start = len(output)
+        use_4_bytes, contains_compressed_size = self._parse_archive_flags(view[0])
+        if view[1] != 0xfb:
             raise ValueError("Invalid RefPack file header")
-        output_length = (buffer.read(1)[0] << 16) + (buffer.read(1)[0] << 8) + buffer.read(1)[0]
-        bytes_used = 5
-        if contains_compressed_size:
-            buffer.seek(3, SEEK_CUR)
-            bytes_used = 8
-        pack_code = buffer.read(1)[0]
-        bytes_used = bytes_used + 1
-        last_uncompressed_len = -1
-        while pack_code < 0xFC:
-            if last_uncompressed_len == len(uncompressed):
-                raise ValueError(f'Error while unpacking QFS archive: infinite loop detected')
-            last_uncompressed_len = len(uncompressed)
-            pack_a, pack_b = buffer.read(1)[0], buffer.read(1)[0]
-            bytes_used = bytes_used + 2
-            if not (pack_code & 0x80):
-                length = pack_code & 3
-                buffer.seek(-1, SEEK_CUR)
-                self._copy_bytes_to_output(buffer, uncompressed, length)
-                bytes_used = bytes_used + length - 1
-                offset = ((pack_code >> 5) << 8) + pack_a + 1
-                length = ((pack_code & 0x1c) >> 2) + 3
-                self._reuse_bytes_in_output(buffer, uncompressed, length, offset)
-            elif not pack_code & 0x40:
-                length = (pack_a >> 6) & 3
-                self._copy_bytes_to_output(buffer, uncompressed, length)
-                bytes_used = bytes_used + length
-                offset = (pack_a & 0x3f) * 256 + pack_b + 1
-                length = (pack_code & 0x3f) + 4
-                self._reuse_bytes_in_output(buffer, uncompressed, length, offset)
-            elif not pack_code & 0x20:
-                pack_c = buffer.read(1)[0]
-                length = pack_code & 3
-                self._copy_bytes_to_output(buffer, uncompressed, length)
-                bytes_used = bytes_used + length + 1
-                offset = ((pack_code & 0x10) << 12) + 256 * pack_a + pack_b + 1
-                length = ((pack_code >> 2) & 3) * 256 + pack_c + 5
-                self._reuse_bytes_in_output(buffer, uncompressed, length, offset)
-            else:
-                length = (pack_code & 0x1f) * 4 + 4
-                buffer.seek(-2, SEEK_CUR)
-                self._copy_bytes_to_output(buffer, uncompressed, length)
-                bytes_used = bytes_used + length - 2
-            pack_code = buffer.read(1)[0]
-            bytes_used = bytes_used + 1
-        if bytes_used < input_length and len(uncompressed) < output_length:
-            self._copy_bytes_to_output(buffer, uncompressed, input_length - bytes_used)
-        if output_length != len(uncompressed):
+        output_length = (view[2] << 16) + (view[3] << 8) + view[4]
+        pos = 8 if contains_compressed_size else 5
+        reuse = self._reuse_bytes_in_output
+        try:
+            pack_code = view[pos]
+            pos += 1
+            while pack_code < 0xFC:
+                pack_a = view[pos]
+                if not (pack_code & 0x80):
+                    length = pack_code & 3
+                    output += view[pos + 1:pos + 1 + length]
+                    pos += 1 + length
+                    offset = ((pack_code >> 5) << 8) + pack_a + 1
+                    length = ((pack_code & 0x1c) >> 2) + 3
+                elif not pack_code & 0x40:
+                    pack_b = view[pos + 1]
+                    length = (pack_a >> 6) & 3
+                    output += view[pos + 2:pos + 2 + length]
+                    pos += 2 + length
+                    offset = (pack_a & 0x3f) * 256 + pack_b + 1
+                    length = (pack_code & 0x3f) + 4
+                elif not pack_code & 0x20:
+                    pack_b, pack_c = view[pos + 1], view[pos + 2]
+                    length = pack_code & 3
+                    output += view[pos + 3:pos + 3 + length]
+                    pos += 3 + length
+                    offset = ((pack_code & 0x10) << 12) + 256 * pack_a + pack_b + 1
+                    length = ((pack_code >> 2) & 3) * 256 + pack_c + 5
+                else:
+                    length = (pack_code & 0x1f) * 4 + 4
+                    output += view[pos:pos + length]
+                    pos += length
+                    pack_code = view[pos]
+                    pos += 1
+                    continue
+                reuse(output, start, length, offset)
+                pack_code = view[pos]
+                pos += 1
+        except IndexError:
+            raise ValueError('Error while unpacking QFS archive: unexpected end of compressed data')
+        if pos < input_length and len(output) - start < output_length:
+            output += view[pos:]
+            pos = input_length
+        if output_length != len(output) - start:
             raise ValueError(
-                f'Error while unpacking QFS archive: expected length {output_length}, actual length: {len(uncompressed)}')
+                f'Error while unpacking QFS archive: expected length {output_length}, '
+                f'actual length: {len(output) - start}')
+        return pos
+
+    def uncompress(self, buffer: [BufferedReader, BytesIO, MemoryViewBuffer], input_length: int):
+        start = buffer.tell()
+        if isinstance(buffer, MemoryViewBuffer):
+            data = buffer.read_view(input_length)
+        else:
+            data = buffer.read(-1 if input_length is None else input_length)
+        uncompressed = bytearray()
+        bytes_used = self.uncompress_into(data, uncompressed)
+        # leave buffer right after the consumed compressed stream
+        buffer.seek(start + bytes_used)
         return bytes(uncompressed)
+
+    @staticmethod
+    def _write_literals(output: bytearray, data: bytes, start: int, end: int) -> int:
+        # literals are written with blocks of 4..112 bytes, up to 3 remaining bytes go with the next command.
+        # Returns position of remaining literals
+        while end - start > 3:
+            length = min(MAX_LITERALS_BLOCK, (end - start) & ~3)
+            output.append(0xE0 | ((length - 4) >> 2))
+            output += data[start:start + length]
+            start += length
+        return start
+
+    @staticmethod
+    def _write_match(output: bytearray, literals: bytes, length: int, offset: int):
+        literals_count = len(literals)
+        offset -= 1
+        if length <= 10 and offset < 0x400:
+            output += bytes(((offset >> 8) << 5 | (length - 3) << 2 | literals_count,
+                             offset & 0xFF))
+        elif length <= 67 and offset < 0x4000:
+            output += bytes((0x80 | (length - 4),
+                             literals_count << 6 | offset >> 8,
+                             offset & 0xFF))
+        else:
+            length -= 5
+            output += bytes((0xC0 | (offset >> 16) << 4 | (length >> 8) << 2 | literals_count,
+                             (offset >> 8) & 0xFF,
+                             offset & 0xFF,
+                             length & 0xFF))
+        output += literals
+
+    def compress(self, buffer: [BufferedReader, BytesIO], input_length: int, level: int = DEFAULT_COMPRESSION_LEVEL,
+                 window_size: int = None):
+        data = buffer.read(input_length)
+        if len(data) > MAX_OUTPUT_LENGTH:
+            raise ValueError(f'RefPack cannot compress more than {MAX_OUTPUT_LENGTH} bytes, got {len(data)}')
+        if level not in COMPRESSION_LEVELS:
+            raise ValueError(f'Unknown RefPack compression level {level}, '
+                             f'expected one of {list(COMPRESSION_LEVELS.keys())}')
+        (default_window_size, max_chain, lazy) = COMPRESSION_LEVELS[level]
+        window_size = min(window_size or default_window_size, MAX_OFFSET)
+        data_length = len(data)
+        # hash chain: exact, since 3-byte keys do not collide
+        previous = _previous_occurrences(data)
+
+        def find_match(pos):
+            limit = min(MAX_MATCH_LENGTH, data_length - pos)
+            if limit < MIN_MATCH_LENGTH:
+                return 0, 0
+            best_length = MIN_MATCH_LENGTH - 1
+            best_offset = 0
+            candidate = previous[pos]
+            min_candidate = max(0, pos - window_size)
+            checked = 0
+            while candidate >= min_candidate and checked < max_chain:
+                checked += 1
+                # quick reject: candidate cannot be longer than the best one
+                if data[candidate + best_length] == data[pos + best_length]:
+                    length = _match_length(data, candidate, pos, limit)
+                    offset = pos - candidate
+                    if length > best_length and (offset <= 0x400 or length >= _min_match_length(offset)):
+                        best_length = length
+                        best_offset = offset
+                        if length == limit:
+                            break
+                candidate = previous[candidate]
+            if best_offset == 0:
+                return 0, 0
+            return best_length, best_offset
+
+        output = bytearray(b'\x10\xfb')
+        output += data_length.to_bytes(3, byteorder='big')
+        literals_start = 0
+        pos = 0
+        match = find_match(0)
+        while pos < data_length - 2:
+            (length, offset) = match
+            if length == 0:
+                pos += 1
+                match = find_match(pos)
+                continue
+            if lazy and length < MAX_MATCH_LENGTH:
+                # a longer match may start at the next byte
+                next_match = find_match(pos + 1)
+                if next_match[0] > length:
+                    pos += 1
+                    match = next_match
+                    continue
+            literals_start = self._write_literals(output, data, literals_start, pos)
+            self._write_match(output, data[literals_start:pos], length, offset)
+            pos += length
+            literals_start = pos
+            match = find_match(pos)
+        literals_start = self._write_literals(output, data, literals_start, data_length)
+        output.append(0xFC | (data_length - literals_start))
+        output += data[literals_start:]
+        return bytes(output)
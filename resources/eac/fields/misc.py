@@ -3,6 +3,7 @@ from typing import Dict
 
 from library.context import WriteContext
 from library.read_blocks import IntegerBlock, CompoundBlock
+from library.utils.write_sink import WriteSink
 
 
 class Point2D(CompoundBlock):
@@ -24,7 +25,7 @@ class Point2D(CompoundBlock):
         super().__init__(fields=[('x', child, {}),
                                  ('y', child, {})], **kwargs)
 
-    def write(self, data, ctx: WriteContext = None, name: str = '') -> bytes:
+    def write_fields_into(self, sink: WriteSink, data, ctx: WriteContext = None, name: str = ''):
         if self.normalized:
             length = math.sqrt(data['x'] ** 2 + data['y'] ** 2)
             if length == 0:
@@ -32,7 +33,7 @@ class Point2D(CompoundBlock):
             elif length != 1:
                 data['x'] /= length
                 data['y'] /= length
-        return super().write(data, ctx, name)
+        super().write_fields_into(sink, data, ctx, name)
 
 
 class Point3D(CompoundBlock):
@@ -55,7 +56,7 @@ class Point3D(CompoundBlock):
                                  ('y', child, {}),
                                  ('z', child, {})], **kwargs)
 
-    def write(self, data, ctx: WriteContext = None, name: str = '') -> bytes:
+    def write_fields_into(self, sink: WriteSink, data, ctx: WriteContext = None, name: str = ''):
         if self.normalized:
             length = math.sqrt(data['x'] ** 2 + data['y'] ** 2 + data['z'] ** 2)
             if length == 0:
@@ -64,7 +65,7 @@ class Point3D(CompoundBlock):
                 data['x'] /= length
                 data['y'] /= length
                 data['z'] /= length
-        return super().write(data, ctx, name)
+        super().write_fields_into(sink, data, ctx, name)
 
 
 class RGBBlock(CompoundBlock):
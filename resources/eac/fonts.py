@@ -12,6 +12,7 @@ from library.read_blocks import (IntegerBlock,
                                  OptionalBlock,
                                  )
 from library.read_blocks.misc.value_validators import Or
+from library.read_blocks.misc.programmatic_values import BackPatchedValue, OffsetToChild
 from resources.eac.bitmaps import EacImage
 from resources.eac.fields.misc import Point2D
 
@@ -105,9 +106,9 @@ class FfnFont(DeclarativeCompoundBlock):
                                                                'FntA'])),
                        {'description': 'Resource ID'})
         block_size = (IntegerBlock(length=4,
-                                   programmatic_value=lambda ctx: ctx.block.estimate_packed_size(ctx.get_full_data())
-                                                                  - len(ctx.data('remaining_bytes'))
-                                                                  - _block_size_delta(ctx)),
+                                   programmatic_value=BackPatchedValue(lambda ctx: ctx.packed_size()
+                                                                       - len(ctx.data('remaining_bytes'))
+                                                                       - _block_size_delta(ctx))),
                       {'usage': 'io,doc',
                        'description': 'The length of this FFN block in bytes. Does not include "remaining_bytes" '
                                       'length. For older versions (I set version <= 101, but it can be anywhere < 309), '
@@ -135,23 +136,16 @@ class FfnFont(DeclarativeCompoundBlock):
         center = Point2D(child=IntegerBlock(length=1, is_signed=False))
         ascent = IntegerBlock(length=1, is_signed=False)
         descent = IntegerBlock(length=1, is_signed=False)
-        definitions_ptr = (IntegerBlock(length=4,
-                                        programmatic_value=lambda ctx: ctx.block.offset_to_child_when_packed(
-                                            ctx.get_full_data(),
-                                            'definitions')),
+        definitions_ptr = (IntegerBlock(length=4, programmatic_value=OffsetToChild('definitions')),
                            {'usage': 'io,doc',
                             'description': 'Pointer to definitions block'})
         kernings_ptr = (IntegerBlock(length=4,
-                                     programmatic_value=lambda ctx: (
+                                     programmatic_value=BackPatchedValue(lambda ctx: (
                                          0 if len(ctx.data('kernings')) == 0
-                                         else ctx.block.offset_to_child_when_packed(
-                                             ctx.get_full_data(), 'kernings'))),
+                                         else ctx.offset_to_child('kernings')))),
                         {'usage': 'io,doc',
                          'description': 'Pointer to kernings. 0 if there is no kernings table'})
-        bdata_ptr = (IntegerBlock(length=4,
-                                  programmatic_value=lambda ctx: ctx.block.offset_to_child_when_packed(
-                                      ctx.get_full_data(),
-                                      'bitmap')),
+        bdata_ptr = (IntegerBlock(length=4, programmatic_value=OffsetToChild('bitmap')),
                      {'usage': 'io,doc',
                       'description': 'Pointer to bitmap block'})
         padding_0 = (Padding(to=lambda ctx: ctx.data('definitions_ptr')),
@@ -13,6 +13,7 @@ from library.read_blocks import (DeclarativeCompoundBlock,
                                  SubByteCompoundBlock,
                                  )
 from library.read_blocks.misc.value_validators import Eq, Or
+from library.read_blocks.misc.programmatic_values import PackedSize
 from library.read_blocks.strings import NullTerminatedUTF8Block
 from resources.eac.archives.shpi_block import ShpiBlock
 from resources.eac.fields.misc import Point3D
@@ -123,8 +124,7 @@ class FSHPart(DeclarativeCompoundBlock):
                       {'description': 'Identifier'})
         unk0 = (IntegerBlock(length=1),
                 {'is_unknown': True})
-        len = (IntegerBlock(length=3, programmatic_value=lambda ctx: sum(ShpiBlock().estimate_packed_size(shpi, None)
-                                                                         for shpi in ctx.data('data'))),
+        len = (IntegerBlock(length=3, programmatic_value=PackedSize('data')),
                {'usage': 'io,doc',
                 'description': 'Data length in bytes'})
         num_data = (IntegerBlock(length=4, programmatic_value=lambda ctx: len(ctx.data('data'))),
@@ -723,6 +723,8 @@ class CrpGeometry(DeclarativeCompoundBlock):
         raw_data_offset = ctx.buffer.tell()
         raw_data_len = ctx.read_bytes_remaining
 
+        # contexts of parts are discarded after they are read: recreated with data of delegated block
+        common_parts_ctx = self_ctx.get_or_create_child('common_parts')
         for (i, misc_part) in enumerate(data['common_parts']):
             misc_block = misc_part_block.possible_blocks[misc_part['choice_index']]
             data_block = misc_block.field_blocks_map.get('data')
@@ -730,10 +732,12 @@ class CrpGeometry(DeclarativeCompoundBlock):
                 continue
             ctx.buffer.seek(raw_data_offset + misc_part['data']['offset']
                             - 16 * (len(data['parts']) + len(data['common_parts']) - i))
-            misc_part['data']['data'] = data_block.read(self_ctx.child(f"common_parts/{i}"),
+            misc_part['data']['data'] = data_block.read(common_parts_ctx.get_or_create_child(str(i), misc_block,
+                                                                                             data=misc_part['data']),
                                                         'data',
                                                         read_bytes_amount=misc_part['data']['len'])
         part_block = self.field_blocks_map.get('parts').child
+        parts_ctx = self_ctx.get_or_create_child('parts')
         for (i, part) in enumerate(data['parts']):
             block = part_block.possible_blocks[part['choice_index']]
             data_block = block.field_blocks_map.get('data')
@@ -741,7 +745,7 @@ class CrpGeometry(DeclarativeCompoundBlock):
                 continue
             ctx.buffer.seek(raw_data_offset + part['data']['offset']
                             - 16 * (len(data['parts']) - i))
-            part['data']['data'] = data_block.read(self_ctx.child(f"parts/{i}"),
+            part['data']['data'] = data_block.read(parts_ctx.get_or_create_child(str(i), block, data=part['data']),
                                                    'data',
                                                    read_bytes_amount=part['data']['len'])
         for (i, article) in enumerate(data['articles']):
@@ -11,6 +11,7 @@ from library.read_blocks import (DeclarativeCompoundBlock,
                                  FixedPointBlock,
                                  Padding)
 from library.read_blocks.misc.value_validators import Eq
+from library.read_blocks.misc.programmatic_values import PackedSize, OffsetToChild
 from library.read_blocks.strings import NullTerminatedUTF8Block
 from resources.eac.fields.misc import Point3D
 
@@ -140,8 +141,7 @@ class OripGeometry(DeclarativeCompoundBlock):
     class Fields(DeclarativeCompoundBlock.Fields):
         resource_id = (UTF8Block(value_validator=Eq('ORIP'), length=4),
                        {'description': 'Resource ID'})
-        block_size = (IntegerBlock(length=4,
-                                   programmatic_value=lambda ctx: ctx.block.estimate_packed_size(ctx.get_full_data())),
+        block_size = (IntegerBlock(length=4, programmatic_value=PackedSize()),
                       {'description': 'Total ORIP block size in bytes'})
         unk0 = (IntegerBlock(length=4, value_validator=Eq(0x02BC)),
                 {'description': 'Looks like always 0x01F4 in 3DO version and 0x02BC in PC TNFSSE. ORIP type?',
@@ -153,10 +153,7 @@ class OripGeometry(DeclarativeCompoundBlock):
                     {'description': 'Amount of vertices'})
         unk2 = (BytesBlock(length=4),
                 {'is_unknown': True})
-        vrtx_ptr = (IntegerBlock(length=4,
-                                 programmatic_value=lambda ctx: ctx.block.offset_to_child_when_packed(
-                                     ctx.get_full_data(),
-                                     'vertices')),
+        vrtx_ptr = (IntegerBlock(length=4, programmatic_value=OffsetToChild('vertices')),
                     {'description': 'An offset to vertices'})
         num_uvs = (IntegerBlock(length=4,
                                 programmatic_value=lambda ctx: len(ctx.data('vertex_uvs'))),
@@ -190,10 +187,7 @@ class OripGeometry(DeclarativeCompoundBlock):
                                     programmatic_value=lambda ctx: ctx.data('tex_nmb_ptr')
                                                                    + len(ctx.data('tex_nmb')) * 20),
                        {'description': 'Offset of render_order block. Always equals to `tex_nmb_ptr + num_tex_nmb*20`'})
-        vmap_ptr = (IntegerBlock(length=4,
-                                 programmatic_value=lambda ctx: ctx.block.offset_to_child_when_packed(
-                                     ctx.get_full_data(),
-                                     'vmap')),
+        vmap_ptr = (IntegerBlock(length=4, programmatic_value=OffsetToChild('vmap')),
                     {'description': 'Offset of polygon_vertex_map block'})
         num_fxp = (IntegerBlock(length=4, programmatic_value=lambda ctx: len(ctx.data('fx_polys'))),
                    {'description': 'Amount of items in fx_polys block'})
@@ -9,18 +9,16 @@ from library.read_blocks import (DeclarativeCompoundBlock,
                                  FixedPointBlock,
                                  Padding)
 from library.read_blocks.misc.value_validators import Eq
+from library.read_blocks.misc.programmatic_values import PackedSize
 from resources.eac.fields.misc import Point3D
 from resources.eac.maps.nfs_common import ColPolygon, ColExtraBlock
 
 
 class TrkBlock(DeclarativeCompoundBlock):
     class Fields(DeclarativeCompoundBlock.Fields):
-        block_size = (IntegerBlock(length=4, is_signed=False,
-                                   programmatic_value=lambda ctx: ctx.block.estimate_packed_size(ctx.get_full_data())),
+        block_size = (IntegerBlock(length=4, is_signed=False, programmatic_value=PackedSize()),
                       {'description': 'Block size in bytes'})
-        block_size_2 = (IntegerBlock(length=4, is_signed=False,
-                                     programmatic_value=lambda ctx: ctx.block.estimate_packed_size(
-                                         ctx.get_full_data())),
+        block_size_2 = (IntegerBlock(length=4, is_signed=False, programmatic_value=PackedSize()),
                         {'description': 'Block size in bytes (duplicated)'})
         num_extrablocks = (IntegerBlock(length=2, is_signed=False),
                            {'description': 'Number of extrablocks'})
@@ -87,8 +85,7 @@ class TrkBlock(DeclarativeCompoundBlock):
 
 class TrkSuperBlock(DeclarativeCompoundBlock):
     class Fields(DeclarativeCompoundBlock.Fields):
-        block_size = (IntegerBlock(length=4, is_signed=False,
-                                   programmatic_value=lambda ctx: ctx.block.estimate_packed_size(ctx.get_full_data())),
+        block_size = (IntegerBlock(length=4, is_signed=False, programmatic_value=PackedSize()),
                       {'description': 'Superblock size in bytes'})
         num_blocks = (IntegerBlock(length=4, is_signed=False),
                       {'description': 'Number of blocks in this superblock. Usually 8 or less in the last superblock'})
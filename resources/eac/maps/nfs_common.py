@@ -4,6 +4,7 @@ from library.context import ReadContext
 from library.read_blocks import (DeclarativeCompoundBlock, UTF8Block, IntegerBlock, ArrayBlock, EnumByteBlock,
                                  EnumLookupDelegateBlock, BytesBlock, FixedPointBlock)
 from library.read_blocks.misc.value_validators import Eq
+from library.read_blocks.misc.programmatic_values import PackedSize
 from resources.eac.fields.misc import RGBBlock, Point3D
 
 
@@ -81,8 +82,7 @@ class PropExtraDataRecord(DeclarativeCompoundBlock):
                 'block_description': '3D model placement (prop). Same 3D model can be used few times on the track'}
 
     class Fields(DeclarativeCompoundBlock.Fields):
-        block_size = (IntegerBlock(length=2, is_signed=False,
-                                   programmatic_value=lambda ctx: ctx.block.estimate_packed_size(ctx.get_full_data())),
+        block_size = (IntegerBlock(length=2, is_signed=False, programmatic_value=PackedSize()),
                       {'description': 'Block size in bytes'})
         type = (EnumByteBlock(enum_names=[(1, 'static_prop'),
                                           (3, 'animated_prop'),
@@ -122,8 +122,7 @@ class PropDescriptionExtraDataRecord(DeclarativeCompoundBlock):
                 'block_description': '3D model'}
 
     class Fields(DeclarativeCompoundBlock.Fields):
-        block_size = (IntegerBlock(length=4, is_signed=False,
-                                   programmatic_value=lambda ctx: ctx.block.estimate_packed_size(ctx.get_full_data())),
+        block_size = (IntegerBlock(length=4, is_signed=False, programmatic_value=PackedSize()),
                       {'description': 'Block size in bytes'})
         num_vertices = (IntegerBlock(length=2, is_signed=False,
                                      programmatic_value=lambda ctx: len(ctx.data('vertices'))),
@@ -191,8 +190,7 @@ class CollisionExtraDataRecord(DeclarativeCompoundBlock):
 
 class ColExtraBlock(DeclarativeCompoundBlock):
     class Fields(DeclarativeCompoundBlock.Fields):
-        block_size = (IntegerBlock(length=4, is_signed=False,
-                                   programmatic_value=lambda ctx: ctx.block.estimate_packed_size(ctx.get_full_data())),
+        block_size = (IntegerBlock(length=4, is_signed=False, programmatic_value=PackedSize()),
                       {'description': 'Block size in bytes'})
         type = (EnumByteBlock(enum_names=[(2, 'textures_map'),
                                           (4, 'block_numbers'),
@@ -237,8 +235,7 @@ class MapColFile(DeclarativeCompoundBlock):
                        {'description': 'Resource ID'})
         unk = (IntegerBlock(length=4, value_validator=Eq(11)),
                {'is_unknown': True})
-        block_size = (IntegerBlock(length=4, is_signed=False,
-                                   programmatic_value=lambda ctx: ctx.block.estimate_packed_size(ctx.get_full_data())),
+        block_size = (IntegerBlock(length=4, is_signed=False, programmatic_value=PackedSize()),
                       {'description': 'File size in bytes'})
         num_extrablocks = (IntegerBlock(length=4, is_signed=False),
                            {'description': 'Number of extrablocks'})
@@ -1,3 +1,5 @@
+import numpy as np
+
 from resources.eac.archives import ShpiBlock, WwwwBlock, PaletteReference
 from resources.eac.bitmaps import EacPalette
 
@@ -40,6 +42,15 @@ def _get_palette_from_wwww(wwww_id, wwww_block: WwwwBlock, wwww_data, max_index=
     return palette_block, palette_data
 
 
+# == for parsed data, which can contain numpy arrays (bitmaps)
+def _is_equal_data(a, b) -> bool:
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(a, b)
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_is_equal_data(a[k], b[k]) for k in a)
+    return a == b
+
+
 def determine_palette_for_8_bit_bitmap(block, data: dict, id: str) -> dict:
     from library import require_resource
     palette_data, palette_block = None, None
@@ -47,8 +58,13 @@ def determine_palette_for_8_bit_bitmap(block, data: dict, id: str) -> dict:
         return None, None
     shpi_id = id[:max(id.rfind('__children'), id.rfind('/children'))]
     (_, shpi_block, shpi_data), _ = require_resource(shpi_id)
-    shpi_child = next(x for x in shpi_data['children'] if x['item']['data'] == data)
-    shpi_child_index = shpi_data['children'].index(shpi_child)
+    children = shpi_data['children']
+    try:
+        shpi_child_index = next(i for i, x in enumerate(children) if x['item']['data'] is data)
+    except StopIteration:
+        # data is a copy of the item
+        shpi_child_index = next(i for i, x in enumerate(children) if _is_equal_data(x['item']['data'], data))
+    shpi_child = children[shpi_child_index]
     # in most cases next item in the shpi is the palette without alias in the SHPI header,
     # but I do not know how to interpret PaletteReference resource
     if shpi_child_index < (len(shpi_data['children']) - 1) and shpi_data['children'][shpi_child_index + 1]['alias'] is None:
@@ -36,6 +36,7 @@ if __name__ == "__main__":
     parser.add_argument('--custom-command', type=str, required=False, help='Name of custom function to run (action "custom_command" only)')
     parser.add_argument('--custom-command-args', nargs='*', required=False, default=[], help='Arguments for custom command (action "custom_command" only)')
     parser.add_argument('--out', type=pathlib.Path, required=False, help='Output path for converted files (action "convert" only)', default='out/')
+    parser.add_argument('--incremental', action='store_true', help='Convert only files, which changed since the previous conversion to the same output path, or which outputs are missing (action "convert" only)')
     parser.add_argument('--dev', action='store_true', help='Run the GUI in development mode: load the Angular dev server (ng serve) inside the native window with developer tools enabled')
     parser.add_argument('--dev-server', type=str, required=False, default='http://localhost:4200', help='Angular dev server URL used together with --dev (default: http://localhost:4200)')
     args = parser.parse_args()
@@ -57,7 +58,7 @@ if __name__ == "__main__":
         if not args.out:
             raise Exception('--out argument has to be provided for convert action')
         from actions.convert_all import convert_all
-        convert_all(args.file, args.out)
+        convert_all(args.file, args.out, incremental=args.incremental)
     elif action == Action.show_settings:
         from config import get_config_file_location
         print(f"Settings file location: {get_config_file_location()}")
@@ -77,7 +78,7 @@ if __name__ == "__main__":
             raise Exception('--custom-command argument has to be provided for custom command action')
         if not args.out:
             raise Exception('--out argument has to be provided for custom command action')
-        from library import require_file
+        from library import require_file, write_file
         (name, block, resource) = require_file(str(args.file))
         action_func = getattr(block, f'action_{args.custom_command}')
         action_func(resource, *args.custom_command_args)
@@ -85,10 +86,6 @@ if __name__ == "__main__":
         if os.path.isdir(args.out) or out_path[-4:] != str(args.file)[-4:]:
             os.makedirs(out_path, exist_ok=True)
             out_path += '/' + str(args.file).split('/')[-1]
-        f = open(out_path, 'wb')
-        try:
-            f.write(block.pack(resource))
-            print('Finished!')
-            print(f'Support me :) >>>  https://www.buymeacoffee.com/andygura <<<')
-        finally:
-            f.close()
+        write_file(out_path, block, resource)
+        print('Finished!')
+        print(f'Support me :) >>>  https://www.buymeacoffee.com/andygura <<<')
@@ -1,8 +1,10 @@
 from io import BytesIO
 from typing import List
 
+import numpy as np
 from PIL import Image
 
+from resources.eac.bitmaps import apply_palette
 from resources.eac.utils import determine_palette_for_8_bit_bitmap
 from serializers import BaseFileSerializer
 from serializers.misc.path_utils import escape_chars
@@ -23,28 +25,16 @@ class ImageSerializer(BaseFileSerializer):
         super().serialize(data, path, id=id, block=block)
         if data['resource_id'].startswith('8Bit'):
             (palette_block, palette_data) = determine_palette_for_8_bit_bitmap(block, data, id)
-            bitmap = []
-            if palette_block is None:
-                palette_colors = [0xffffff00 | i for i in range(256)]
-            else:
-                palette_colors = [c for c in palette_data['colors']['data']]
-                if palette_data['last_color_transparent']:
-                    palette_colors[255] = 0
-            for index in data['bitmap']:
-                try:
-                    bitmap.append(palette_colors[index])
-                except IndexError:
-                    bitmap.append(0)
-        elif data['resource_id'].startswith('4Bit'):
-            bitmap = [item for row in data['bitmap'] for item in row]
+            bitmap = apply_palette(data['bitmap'], palette_data if palette_block is not None else None)
         else:
-            bitmap = data['bitmap']
+            # 4-bit bitmap is stored as rows
+            bitmap = np.asarray(data['bitmap'], dtype=np.uint32).reshape(-1)
         file_path = escape_chars(path)
         if not file_path.endswith('.png'):
             file_path += '.png'
         Image.frombytes('RGBA',
                         (data['width'], data['height']),
-                        bytes().join([c.to_bytes(4, 'big') for c in bitmap])).save(file_path)
+                        bitmap.astype('>u4').tobytes()).save(file_path)
         return [file_path]
 
     def deserialize(self, file_paths: List[str], id=None, block=None, **kwargs):
@@ -58,11 +48,7 @@ class ImageSerializer(BaseFileSerializer):
         data['resource_id'] = '32Bit color format bitmap'
         data['width'] = image.width
         data['height'] = image.height
-        bitmap = [
-            (r << 24) | (g << 16) | (b << 8) | a
-            for (r, g, b, a) in image_rgba.get_flattened_data()
-        ]
-        data['bitmap'] = bitmap
+        data['bitmap'] = np.frombuffer(image_rgba.tobytes(), dtype='>u4').astype(np.uint32)
         return data
 
 
@@ -0,0 +1,189 @@
+import json
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+import config
+from .blender_scripts import remove_files
+
+# how long Blender process is waited for to exit after all scripts, then it is killed
+CLOSE_TIMEOUT = 60
+# prefix of lines with results, which runner prints to stdout among Blender output
+RESULT_PREFIX = '@@blender-batch-result@@'
+
+# script, executed by every long-lived Blender process: reads paths of scripts from stdin and runs them one by one.
+# Exception in one script does not affect the next ones: they start from factory settings
+RUNNER_SCRIPT = f"""
+import json
+import os
+import sys
+import time
+import traceback
+
+initial_working_dir = os.getcwd()
+for line in sys.stdin:
+    script_path = line.strip()
+    if not script_path:
+        continue
+    error = None
+    start_time = time.monotonic()
+    try:
+        with open(script_path) as f:
+            code = compile(f.read(), script_path, 'exec')
+        exec(code, {{'__name__': '__main__'}})
+    except BaseException:
+        error = traceback.format_exc()
+    os.chdir(initial_working_dir)
+    print('{RESULT_PREFIX}' + json.dumps({{'error': error, 'seconds': time.monotonic() - start_time}}), flush=True)
+"""
+
+
+class BlenderScriptError(Exception):
+    pass
+
+
+class _BlenderProcess:
+
+    def __init__(self, blender_executable: str, runner_path: str):
+        self.print_blender_log = config.general_config().print_blender_log
+        self.process = subprocess.Popen([blender_executable, '--background', '--python', runner_path],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                        text=True, bufsize=1)
+        # results of scripts, read from stdout by separate thread, so waiting for them can be limited by timeout.
+        # None when Blender exits
+        self.results = queue.Queue()
+        self.reader = threading.Thread(target=self._read_output, daemon=True)
+        self.reader.start()
+
+    def _read_output(self):
+        try:
+            for line in self.process.stdout:
+                if line.startswith(RESULT_PREFIX):
+                    self.results.put(json.loads(line[len(RESULT_PREFIX):]))
+                elif self.print_blender_log:
+                    sys.stdout.write(line)
+        except (OSError, ValueError):
+            # stdout is closed, when process is killed
+            pass
+        self.results.put(None)
+
+    def run(self, script_path: str, timeout: Optional[float] = None):
+        """
+        Returns (error, seconds). Raises BlenderScriptError, if Blender exits or does not finish script in timeout
+        """
+        start_time = time.monotonic()
+        try:
+            self.process.stdin.write(script_path + '\n')
+            self.process.stdin.flush()
+        except OSError:
+            pass
+        try:
+            result = self.results.get(timeout=timeout)
+        except queue.Empty:
+            raise BlenderScriptError(f'Blender did not finish scene in {timeout} seconds '
+                                     f'(elapsed {time.monotonic() - start_time:.1f} seconds)')
+        if result is None:
+            raise BlenderScriptError(f'Blender exited with code {self.process.wait()}')
+        error = BlenderScriptError(result['error'].strip()) if result['error'] else None
+        return error, result['seconds']
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=CLOSE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.kill()
+        self.reader.join()
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+
+
+def run_blender_batch(scripts: List[dict], processes: int, blender_executable: Optional[str] = None,
+                      script_timeout: Optional[float] = None):
+    """
+    Runs scripts, collected by defer_blender_scripts, in a few long-lived Blender processes, each of them takes the
+    next script from common queue. Blender starts once per process instead of once per exported model. Failed script
+    does not stop the others, Blender process, which crashed or did not finish script in script_timeout seconds, is
+    killed and restarted. Yields (index, error, seconds) in order of completion, error is None if script succeeded.
+    Script files and cleanup files are removed. Raises OSError, if Blender cannot be started. If batch is interrupted,
+    Blender processes are killed
+    """
+    if not scripts:
+        return
+    blender_executable = blender_executable or config.general_config().blender_executable
+    runner_file = tempfile.NamedTemporaryFile(delete=False, mode='w', suffix='.py')
+    runner_file.write(RUNNER_SCRIPT)
+    runner_file.close()
+    pending = queue.Queue()
+    for i in range(len(scripts)):
+        pending.put(i)
+    results = queue.Queue()
+    # set when batch is interrupted: workers do not start new Blender processes
+    stopped = threading.Event()
+    started_processes = []
+    started_processes_lock = threading.Lock()
+
+    def start_blender_process():
+        with started_processes_lock:
+            if stopped.is_set():
+                raise BlenderScriptError('Blender batch is interrupted')
+            blender_process = _BlenderProcess(blender_executable, runner_file.name)
+            started_processes.append(blender_process)
+            return blender_process
+
+    def work(blender_process):
+        while not stopped.is_set():
+            try:
+                i = pending.get_nowait()
+            except queue.Empty:
+                break
+            start_time = time.monotonic()
+            try:
+                if blender_process is None:
+                    blender_process = start_blender_process()
+                (error, seconds) = blender_process.run(scripts[i]['script_path'], script_timeout)
+            except (BlenderScriptError, OSError) as ex:
+                (error, seconds) = (ex, time.monotonic() - start_time)
+                if blender_process is not None:
+                    blender_process.kill()
+                blender_process = None
+            remove_files([scripts[i]['script_path']] + scripts[i]['cleanup_files'])
+            results.put((i, error, seconds))
+        if blender_process is not None:
+            blender_process.close()
+
+    completed = False
+    try:
+        # the first process is started here, so missing Blender is reported once
+        blender_processes = [start_blender_process()]
+        blender_processes += [None] * (min(processes, len(scripts)) - 1)
+        threads = [threading.Thread(target=work, args=(x,), daemon=True) for x in blender_processes]
+        for thread in threads:
+            thread.start()
+        for _ in range(len(scripts)):
+            yield results.get()
+        for thread in threads:
+            thread.join()
+        completed = True
+    finally:
+        if not completed:
+            # interrupted batch, e.g. Ctrl+C or exception in caller: running scenes are not waited for
+            with started_processes_lock:
+                stopped.set()
+            for blender_process in started_processes:
+                blender_process.kill()
+        # scripts, which were not started, are discarded
+        while not pending.empty():
+            i = pending.get_nowait()
+            remove_files([scripts[i]['script_path']] + scripts[i]['cleanup_files'])
+        os.unlink(runner_file.name)
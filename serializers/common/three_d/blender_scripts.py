@@ -1,10 +1,12 @@
 import os
 import tempfile
+from contextlib import contextmanager
 
 import config
 from library.utils.logging_setup import run_command_and_log
 
-general_config = config.general_config()
+# scripts, collected instead of running Blender, if run_blender is called inside of defer_blender_scripts
+_deferred_scripts = None
 
 
 def get_blender_save_script(out_blend_name=None):
@@ -15,7 +17,43 @@ def get_blender_save_script(out_blend_name=None):
     return script
 
 
-def run_blender(path, script, out_blend_name=None):
+@contextmanager
+def defer_blender_scripts():
+    """
+    Collects Blender scripts, which are run inside of the context, instead of starting Blender for every one of them.
+    Yields list of scripts, which is filled until the end of context. Script is a dict with path of script file and
+    files to remove after it is executed, and is run later by blender_batch.run_blender_batch
+    """
+    global _deferred_scripts
+    previous = _deferred_scripts
+    _deferred_scripts = []
+    try:
+        yield _deferred_scripts
+    finally:
+        _deferred_scripts = previous
+
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def discard_blender_scripts(scripts):
+    """
+    Removes files of deferred scripts, which are not going to be run
+    """
+    for script in scripts:
+        remove_files([script['script_path']] + script['cleanup_files'])
+
+
+def run_blender(path, script, out_blend_name=None, cleanup_files=None):
+    """
+    Runs script in Blender with working directory path, then removes cleanup_files (e.g. OBJ files, imported by
+    script). Deferred script does not quit Blender: the same Blender process runs the next scripts
+    """
     working_dir = path.replace("\\", "/")
     script = f"""import bpy
 import os
@@ -23,11 +61,20 @@ os.chdir("{working_dir}")
 """ + script
     if out_blend_name:
         script += '\n\n' + get_blender_save_script(out_blend_name=out_blend_name)
-    script += '\nquit()'
+    if _deferred_scripts is None:
+        script += '\nquit()'
     script_file = tempfile.NamedTemporaryFile(delete=False, mode='w')
     script_file.write(script)
     script_file.flush()
     script_file.close()
+    if _deferred_scripts is not None:
+        _deferred_scripts.append({
+            'script_path': script_file.name,
+            'cleanup_files': [os.path.abspath(x) for x in cleanup_files or []],
+        })
+        return
+    general_config = config.general_config()
     command = f'"{general_config.blender_executable}" --python {script_file.name} --background'
     run_command_and_log(command, capture_output=general_config.print_blender_log)
     os.unlink(script_file.name)
+    remove_files(cleanup_files or [])
@@ -5,7 +5,7 @@ from typing import Callable
 from typing import List
 
 from library.utils import path_join
-from .blender_scripts import get_blender_save_script, run_blender
+from .blender_scripts import get_blender_save_script, run_blender, remove_files
 from .build_blender_scene import construct_blender_export_script
 from .mesh import SubMesh
 
@@ -127,6 +127,17 @@ $extra_script
                     }))
             exported_files.append(file_path)
 
+    # intermediate files, removed after Blender imports them
+    cleanup_files = []
+    if not settings.geometry__save_obj:
+        exported_files = [x for x in exported_files if not (x.endswith('.obj') or x.endswith('_extra.json') or x.endswith('.mtl'))]
+        for scene in scenes:
+            if not scene.skip_obj_export:
+                cleanup_files.append(path_join(output_path, scene.obj_name + '.obj'))
+            cleanup_files.append(path_join(output_path, scene.obj_name + '_extra.json'))
+            if scene.mtl_name and not scene.skip_mtl_export:
+                cleanup_files.append(path_join(output_path, scene.mtl_name + '.mtl'))
+
     if settings.geometry__export_to_gg_web_engine or settings.geometry__save_blend:
         script = script_base
         for scene in scenes:
@@ -145,17 +156,7 @@ $extra_script
             if settings.geometry__save_blend:
                 script += '\n\n' + get_blender_save_script(out_blend_name=file_path)
                 exported_files.append(file_path + '.blend')
-        run_blender(path=output_path, script=script)
-
-    if not settings.geometry__save_obj:
-        exported_files = [x for x in exported_files if not (x.endswith('.obj') or x.endswith('_extra.json') or x.endswith('.mtl'))]
-        for scene in scenes:
-            if not scene.skip_obj_export:
-                os.unlink(path_join(output_path, scene.obj_name + '.obj'))
-            try:
-                os.unlink(path_join(output_path, scene.obj_name + '_extra.json'))
-            except:
-                pass
-            if scene.mtl_name and not scene.skip_mtl_export:
-                os.unlink(path_join(output_path, scene.mtl_name + '.mtl'))
+        run_blender(path=output_path, script=script, cleanup_files=cleanup_files)
+    else:
+        remove_files(cleanup_files)
     return exported_files
@@ -1,6 +1,12 @@
+import numpy as np
+
+
 def convert_bytes(data):
     if isinstance(data, bytes):
         return {"$bytes": list(data)}
+    elif isinstance(data, np.ndarray):
+        # bitmaps are kept as numpy arrays, in JSON they are plain lists
+        return data.tolist()
     elif isinstance(data, dict):
         return {key: convert_bytes(value) for key, value in data.items()}
     elif isinstance(data, list):
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from api.endpoints.conversion_api import ConversionAPI
+from serializers.common.three_d.blender_batch import BlenderScriptError
+
+
+class TestConvertFiles(unittest.TestCase):
+
+    def _input_files(self, temp_dir, names):
+        input_path = os.path.join(temp_dir, 'in')
+        os.makedirs(input_path)
+        for name in names:
+            with open(os.path.join(input_path, name), 'wb') as f:
+                f.write(b'data')
+        return input_path
+
+    def _script(self, temp_dir, name):
+        script_path = os.path.join(temp_dir, f'{name}.py')
+        with open(script_path, 'w') as f:
+            f.write('')
+        return {'script_path': script_path, 'cleanup_files': []}
+
+    def test_blender_scenes_run_in_one_batch_after_conversion(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = self._input_files(temp_dir, ['A.DAT', 'B.DAT', 'C.DAT'])
+            output_path = os.path.join(temp_dir, 'out')
+            scripts = {name: self._script(temp_dir, name) for name in ['a1', 'a2', 'b']}
+            batches = []
+
+            def run(func, tasks, *args, **kwargs):
+                paths = {index: task_args[1] for task in tasks for (index, task_args) in task}
+                for (index, path) in sorted(paths.items()):
+                    name = os.path.basename(path)
+                    if name == 'A.DAT':
+                        yield index, [scripts['a1'], scripts['a2']]
+                    elif name == 'B.DAT':
+                        yield index, [scripts['b']]
+                    else:
+                        yield index, []
+
+            def run_blender_batch(batch_scripts, processes, script_timeout=None):
+                batches.append(batch_scripts)
+                for (j, script) in enumerate(batch_scripts):
+                    error = BlenderScriptError('broken scene') if script is scripts['b'] else None
+                    yield j, error, 1.0
+
+            conversion_api = ConversionAPI(api=None)
+            conversion_api.worker_pool.run = run
+            with patch('api.endpoints.conversion_api.run_blender_batch', run_blender_batch), \
+                    patch('api.endpoints.conversion_api.bridge') as bridge:
+                result = conversion_api.convert_files(input_path, output_path, {'multiprocess_processes_count': 1})
+            self.assertEqual(result, {'success': True, 'output_path': output_path})
+            self.assertEqual(batches, [[scripts['a1'], scripts['a2'], scripts['b']]])
+            # file with Blender scenes is processed, when its scenes are finished
+            self.assertEqual([call.args for call in bridge.update_conversion_progress.call_args_list],
+                             [(0, 3), (1, 3), (2, 3), (3, 3), (3, 3)])
+            with open(os.path.join(output_path, 'skipped.txt')) as f:
+                self.assertEqual([line.split('\t\t')[0] for line in f.read().splitlines()], ['B.DAT'])
+
+    def test_cancelled_conversion_does_not_run_blender(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = self._input_files(temp_dir, ['A.DAT'])
+            output_path = os.path.join(temp_dir, 'out')
+            script = self._script(temp_dir, 'a')
+            conversion_api = ConversionAPI(api=None)
+
+            def run(func, tasks, *args, **kwargs):
+                conversion_api.cancel_conversion()
+                for task in tasks:
+                    for (index, _) in task:
+                        yield index, [script]
+
+            conversion_api.worker_pool.run = run
+            with patch('api.endpoints.conversion_api.run_blender_batch') as run_blender_batch:
+                result = conversion_api.convert_files(input_path, output_path, {'multiprocess_processes_count': 1})
+            self.assertEqual(result, {'success': False, 'error': 'Conversion cancelled'})
+            run_blender_batch.assert_not_called()
+            self.assertFalse(os.path.exists(script['script_path']))
+
+    def test_skipped_files_are_written_if_conversion_fails(self):
+        def run(func, tasks, *args, **kwargs):
+            for index in sorted((index for task in tasks for (index, _) in task), reverse=True):
+                yield index, ValueError(f'broken {index}')
+            raise RuntimeError('worker pool failed')
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = os.path.join(temp_dir, 'in')
+            output_path = os.path.join(temp_dir, 'out')
+            os.makedirs(input_path)
+            for name in ['A.DAT', 'B.DAT']:
+                with open(os.path.join(input_path, name), 'wb') as f:
+                    f.write(b'data')
+            conversion_api = ConversionAPI(api=None)
+            conversion_api.worker_pool.run = run
+            result = conversion_api.convert_files(input_path, output_path, {'multiprocess_processes_count': 1})
+            self.assertEqual(result, {'success': False, 'error': 'worker pool failed'})
+            with open(os.path.join(output_path, 'skipped.txt')) as f:
+                self.assertEqual([line.split('\t\t')[0] for line in f.read().splitlines()], ['A.DAT', 'B.DAT'])
@@ -0,0 +1,28 @@
+import copy
+import unittest
+
+import numpy as np
+
+from api.endpoints.resource_api import ResourceAPI
+from library import require_resource
+
+
+class TestDiffToChanges(unittest.TestCase):
+
+    def setUp(self):
+        self.resource_api = ResourceAPI(api=None)
+        (_, _, self.data), _ = require_resource('test/samples/AL1.FSH')
+
+    def test_eac_image_copy_has_no_changes(self):
+        self.assertEqual(self.resource_api._diff_to_changes('AL1.FSH', copy.deepcopy(self.data), self.data), [])
+
+    def test_changed_bitmap_is_set_as_whole(self):
+        before = copy.deepcopy(self.data)
+        after = copy.deepcopy(self.data)
+        index = next(i for i, x in enumerate(after['children']) if 'bitmap' in x['item']['data'])
+        image = after['children'][index]['item']['data']
+        self.assertIsInstance(image['bitmap'], np.ndarray)
+        image['bitmap'][0] ^= 1
+        changes = self.resource_api._diff_to_changes('AL1.FSH', before, after)
+        self.assertEqual([x['id'] for x in changes], [f'AL1.FSH__children/{index}/item/data/bitmap'])
+        self.assertIs(changes[0]['newValue'], image['bitmap'])
@@ -1,12 +1,15 @@
+import os
+import random
+import time
 import unittest
 from io import BytesIO
 
 from library.context import ReadContext
-from library.exceptions import DataIntegrityException
-from library.read_blocks import UTF8Block
+from library.exceptions import DataIntegrityException, EndOfBufferException
+from library.read_blocks import UTF8Block, CompoundBlock
 from library.read_blocks.array import ArrayBlock, LengthPrefixedArrayBlock, SubByteArrayBlock
 from library.read_blocks.misc.value_validators import Eq
-from library.read_blocks.numbers import IntegerBlock
+from library.read_blocks.numbers import IntegerBlock, FixedPointBlock, DecimalBlock
 
 
 class TestArray(unittest.TestCase):
@@ -56,6 +59,49 @@ class TestArray(unittest.TestCase):
         field = ArrayBlock(length=(2, "2 items"), child=IntegerBlock(length=4))
         self.assertEqual(field.size_doc_str, "2 items*4")
 
+    def test_numeric_array_round_trip(self):
+        cases = [
+            (IntegerBlock(length=2, is_signed=True, byte_order='big'), [-2, 0x1234, 7]),
+            (IntegerBlock(length=4), [0xFFFFFFFF, 0, 1]),
+            (FixedPointBlock(length=4, fraction_bits=16, is_signed=True), [-1.5, 0.25, 3.0]),
+            (DecimalBlock(length=4), [1.5, -0.5, 100.0]),
+            (DecimalBlock(length=8, byte_order='big'), [0.1, -2.0, 1e100]),
+        ]
+        for child, values in cases:
+            field = ArrayBlock(length=3, child=child)
+            expected = b''.join(child.pack(x) for x in values)
+            self.assertEqual(field.pack(values), expected)
+            self.assertListEqual(field.unpack(ReadContext(BytesIO(expected))), values)
+            self.assertListEqual([type(x) for x in field.unpack(ReadContext(BytesIO(expected)))],
+                                 [type(x) for x in values])
+            self.assertEqual(field.estimate_packed_size(values), len(expected))
+
+    def test_fixed_point_array_pack_rounding_and_clamping(self):
+        child = FixedPointBlock(length=1, fraction_bits=1, is_signed=True)
+        values = [0.25, 0.75, -0.25, 1000.0, -1000.0]
+        field = ArrayBlock(length=5, child=child)
+        self.assertEqual(field.pack(values), b''.join(child.pack(x) for x in values))
+
+    def test_numeric_array_pack_out_of_range(self):
+        field = ArrayBlock(length=2, child=IntegerBlock(length=1))
+        with self.assertRaises(OverflowError):
+            field.pack([1, 256])
+
+    def test_numeric_array_end_of_buffer(self):
+        field = ArrayBlock(length=3, child=IntegerBlock(length=2))
+        with self.assertRaises(EndOfBufferException):
+            field.unpack(ReadContext(BytesIO(bytes(5))))
+
+    def test_fixed_layout_items_array_unpack(self):
+        field = ArrayBlock(length=2, child=CompoundBlock(fields=[
+            ('a', IntegerBlock(length=1), {}),
+            ('b', IntegerBlock(length=2, value_validator=Eq(5)), {}),
+        ]))
+        self.assertListEqual(field.unpack(ReadContext(BytesIO(bytes([1, 5, 0, 2, 5, 0])))),
+                             [{'a': 1, 'b': 5}, {'a': 2, 'b': 5}])
+        with self.assertRaises(DataIntegrityException):
+            field.unpack(ReadContext(BytesIO(bytes([1, 5, 0, 2, 6, 0]))))
+
 
 class TestLengthPrefixedArray(unittest.TestCase):
 
@@ -161,3 +207,60 @@ class TestSubByteArray(unittest.TestCase):
         self.assertEqual(field.size_doc_str, "3")
         field = SubByteArrayBlock(length=5, bits_per_value=5)
         self.assertEqual(field.size_doc_str, "4")
+
+    def test_subbyte_array_unpack_should_raise_on_end_of_buffer(self):
+        field = SubByteArrayBlock(length=5, bits_per_value=5)
+        with self.assertRaises(EndOfBufferException):
+            field.unpack(ReadContext(BytesIO(bytes([255, 255, 255]))))
+
+    def test_subbyte_array_value_funcs(self):
+        field = SubByteArrayBlock(length=3, bits_per_value=4,
+                                  value_deserialize_func=lambda x: x / 2,
+                                  value_serialize_func=lambda x: int(x * 2))
+        val = field.unpack(ReadContext(BytesIO(bytes([0x12, 0xF0]))))
+        self.assertListEqual(val, [0.5, 1.0, 7.5])
+        self.assertEqual(field.pack(val), bytes([0x12, 0xF0]))
+
+    def test_subbyte_array_should_match_string_implementation(self):
+        rnd = random.Random(0)
+        for bits_per_value in list(range(1, 34)) + [64, 70]:
+            for length in [0, 1, 7, 8, 33]:
+                values = [rnd.getrandbits(bits_per_value) for _ in range(length)]
+                packed = _string_pack(values, bits_per_value)
+                field = SubByteArrayBlock(length=length, bits_per_value=bits_per_value)
+                self.assertEqual(field.pack(values), packed, f'{bits_per_value} bits, {length} values')
+                self.assertListEqual(field.unpack(ReadContext(BytesIO(packed))), values)
+
+    @unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'), 'benchmark, set RUN_BENCHMARKS=1 to run')
+    def test_subbyte_array_benchmark(self):
+        length = 1 << 18
+        for bits_per_value in [1, 4, 5, 12]:
+            field = SubByteArrayBlock(length=length, bits_per_value=bits_per_value,
+                                      value_deserialize_func=lambda x: x | 0xFFFFFF00)
+            values = [random.getrandbits(bits_per_value) for _ in range(length)]
+            packed = _string_pack(values, bits_per_value)
+            timings = []
+            for (unpack, pack) in [(lambda: field.unpack(ReadContext(BytesIO(packed))), lambda: field.pack(values)),
+                                   (lambda: [x | 0xFFFFFF00 for x in _string_unpack(packed, bits_per_value, length)],
+                                    lambda: _string_pack(values, bits_per_value))]:
+                start = time.perf_counter()
+                unpack()
+                unpacked = time.perf_counter()
+                pack()
+                timings.append((unpacked - start, time.perf_counter() - unpacked))
+            print(f'{bits_per_value} bits x {length}: unpack {timings[0][0]:.3f}s (string: {timings[1][0]:.3f}s), '
+                  f'pack {timings[0][1]:.3f}s (string: {timings[1][1]:.3f}s)')
+
+
+# previous implementation of SubByteArrayBlock, kept as a reference
+def _string_unpack(raw, bits_per_value, length):
+    bitstring = "".join([bin(x)[2:].rjust(8, "0") for x in raw])
+    return [int(bitstring[i * bits_per_value:(i + 1) * bits_per_value], 2) for i in range(length)]
+
+
+def _string_pack(values, bits_per_value):
+    bitstring = "".join(bin(item)[2:].rjust(bits_per_value, "0") for item in values)
+    padding = len(bitstring) % 8
+    if padding != 0:
+        bitstring += '0' * (8 - padding)
+    return bytes(int(bitstring[i:i + 8], 2) for i in range(0, len(bitstring), 8))
@@ -1,4 +1,6 @@
 import unittest
+from library.context import ReadContext
+from library.exceptions import EndOfBufferException
 from library.read_blocks.basic import BytesBlock
 
 class TestBasicBlocks(unittest.TestCase):
@@ -15,3 +17,11 @@ class TestBasicBlocks(unittest.TestCase):
         # Tuple length (doc override)
         field = BytesBlock(length=(lambda ctx: 5, "custom length"))
         self.assertEqual(field.size_doc_str, "custom length")
+
+    def test_bytes_block_skip_on_read(self):
+        field = BytesBlock(length=3, skip_on_read=True)
+        ctx = ReadContext.from_bytes(b'abcde')
+        self.assertEqual(field.unpack(ctx), 3)
+        self.assertEqual(ctx.buffer.tell(), 3)
+        with self.assertRaises(EndOfBufferException):
+            field.unpack(ctx)
@@ -2,7 +2,11 @@ import unittest
 from io import BytesIO
 
 from library.context import ReadContext
-from library.read_blocks import ArrayBlock, DeclarativeCompoundBlock, IntegerBlock, UTF8Block, CompoundBlock
+from library.exceptions import DataIntegrityException, EndOfBufferException
+from library.read_blocks import (ArrayBlock, DeclarativeCompoundBlock, IntegerBlock, UTF8Block, CompoundBlock,
+                                 DecimalBlock, FixedPointBlock, BytesBlock, EnumByteBlock, BitFlagsBlock)
+from library.read_blocks.compound import StructRun
+from library.read_blocks.misc.programmatic_values import PackedSize, OffsetToChild
 from library.read_blocks.misc.value_validators import Eq
 
 
@@ -198,3 +202,104 @@ class TestDeclarativeCompound(unittest.TestCase):
                     }
                 ]
             })
+
+
+class DoubledBytesBlock(BytesBlock):
+    # packed size differs from estimated one, like compressed item of archive
+    def write(self, data, ctx=None, name=''):
+        return data * 2
+
+
+class BackPatchedBlock(DeclarativeCompoundBlock):
+    class Fields(DeclarativeCompoundBlock.Fields):
+        length = IntegerBlock(length=2, programmatic_value=PackedSize())
+        payload_ptr = IntegerBlock(length=1, programmatic_value=OffsetToChild('payload'))
+        payload_len = IntegerBlock(length=1, programmatic_value=PackedSize('payload'))
+        name = UTF8Block(length=lambda ctx: 3)
+        payload = DoubledBytesBlock(length=lambda ctx: ctx.data('payload_len'))
+
+
+class TestBackPatchedValues(unittest.TestCase):
+
+    def test_pack(self):
+        data = BackPatchedBlock().pack({'name': 'abc', 'payload': b'xyz'})
+        self.assertEqual(data, bytes([13, 0, 7, 6]) + b'abc' + b'xyzxyz')
+
+    def test_nested_pack(self):
+        field = CompoundBlock(fields=[
+            ('header', IntegerBlock(length=1), {}),
+            ('inner', BackPatchedBlock(), {}),
+            ('inner_len', IntegerBlock(length=1, programmatic_value=PackedSize('inner')), {}),
+        ])
+        data = field.pack({'header': 1, 'inner': {'name': 'abc', 'payload': b'z'}})
+        self.assertEqual(data, bytes([1, 9, 0, 7, 2]) + b'abc' + b'zz' + bytes([9]))
+
+    def test_round_trip(self):
+        data = bytes([13, 0, 7, 6]) + b'abc' + b'xyzxyz'
+        self.assertEqual(BackPatchedBlock().unpack(ReadContext(BytesIO(data))),
+                         {'length': 13, 'payload_ptr': 7, 'payload_len': 6, 'name': 'abc', 'payload': b'xyzxyz'})
+
+
+class FixedLayoutBlock(DeclarativeCompoundBlock):
+    class Fields(DeclarativeCompoundBlock.Fields):
+        header = IntegerBlock(length=2, value_validator=Eq(0x1234))
+        big = IntegerBlock(length=4, is_signed=True, byte_order='big')
+        odd = IntegerBlock(length=3)
+        fp = FixedPointBlock(length=2, fraction_bits=8, is_signed=True)
+        dec = DecimalBlock(length=4)
+        name = UTF8Block(length=4)
+        raw = BytesBlock(length=2)
+        kind = EnumByteBlock(enum_names=[(1, 'one')])
+        flags = BitFlagsBlock(length=1, flag_names=[(0, 'first')])
+        nested = CompoundBlock(fields=[('x', IntegerBlock(length=1), {}),
+                                       ('y', IntegerBlock(length=2, is_signed=True), {})])
+        ui_only = IntegerBlock(length=1), {'usage': 'ui'}
+        tail_len = IntegerBlock(length=1)
+        tail = ArrayBlock(child=IntegerBlock(length=1), length=lambda ctx: ctx.data('tail_len'))
+
+
+class TestCompoundStructReading(unittest.TestCase):
+    data = (bytes([0x34, 0x12]) + (-2).to_bytes(4, 'big', signed=True) + bytes([1, 2, 3])
+            + (-384).to_bytes(2, 'little', signed=True) + bytes([0, 0, 0xc0, 0x3f]) + b'ab\x00\x00' + b'\xff\x00'
+            + bytes([1, 0x81, 7]) + (-3).to_bytes(2, 'little', signed=True) + bytes([2, 9, 8]))
+    expected = {'header': 0x1234, 'big': -2, 'odd': 0x030201, 'fp': -1.5, 'dec': 1.5, 'name': 'ab',
+                'raw': b'\xff\x00', 'kind': 'one',
+                'flags': {'first': True, '1': False, '2': False, '3': False, '4': False, '5': False, '6': False,
+                          '7': True},
+                'nested': {'x': 7, 'y': -3}, 'tail_len': 2, 'tail': [9, 8]}
+
+    def test_read_plan(self):
+        plan = FixedLayoutBlock().read_plan
+        # byte order change splits the run, dynamic array breaks it
+        self.assertEqual([type(x) for x in plan], [StructRun, StructRun, StructRun, tuple])
+        self.assertEqual([name for name, _, _, _ in plan[1].fields], ['big', 'odd'])
+        self.assertEqual(plan[3][0], 'tail')
+
+    def test_unpack(self):
+        val = FixedLayoutBlock().unpack(ReadContext(BytesIO(self.data)))
+        self.assertDictEqual(val, self.expected)
+
+    def test_unpack_from_bytes(self):
+        val = FixedLayoutBlock().unpack(ReadContext.from_bytes(self.data))
+        self.assertDictEqual(val, self.expected)
+
+    def test_pack_round_trip(self):
+        self.assertEqual(FixedLayoutBlock().pack(self.expected), self.data)
+
+    def test_validation(self):
+        with self.assertRaises(DataIntegrityException):
+            FixedLayoutBlock().unpack(ReadContext(BytesIO(b'\x00' + self.data[1:])))
+
+    def test_end_of_buffer(self):
+        with self.assertRaises(EndOfBufferException):
+            FixedLayoutBlock().unpack(ReadContext(BytesIO(self.data[:5])))
+
+    def test_custom_read_falls_back_to_generic_path(self):
+        class DoubledInteger(IntegerBlock):
+            def read(self, ctx, name='', read_bytes_amount=None):
+                return super().read(ctx, name, read_bytes_amount) * 2
+
+        field = CompoundBlock(fields=[('a', IntegerBlock(length=1), {}),
+                                      ('b', DoubledInteger(length=1), {})])
+        self.assertIsNone(field.struct_layout)
+        self.assertDictEqual(field.unpack(ReadContext(BytesIO(bytes([3, 4])))), {'a': 3, 'b': 8})
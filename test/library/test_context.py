@@ -0,0 +1,57 @@
+import gc
+import os
+import sys
+import unittest
+from io import BytesIO
+
+from library.context import ReadContext
+from library.loader import require_file, clear_files_cache
+from library.read_blocks import ArrayBlock, DeclarativeCompoundBlock, IntegerBlock
+
+CORPUS_PATH = 'test/golden_corpus'
+
+
+class Point(DeclarativeCompoundBlock):
+    class Fields(DeclarativeCompoundBlock.Fields):
+        x = IntegerBlock(length=1)
+        y = IntegerBlock(length=1)
+
+
+class Polygon(DeclarativeCompoundBlock):
+    class Fields(DeclarativeCompoundBlock.Fields):
+        count = IntegerBlock(length=1)
+        points = ArrayBlock(child=Point(), length=lambda ctx: ctx.data('count'))
+
+
+def _retained_contexts():
+    """
+    Amount of read contexts, which are alive, and their size in bytes
+    """
+    gc.collect()
+    contexts = [x for x in gc.get_objects() if isinstance(x, ReadContext)]
+    return len(contexts), sum(sys.getsizeof(x) + sys.getsizeof(x.children) for x in contexts)
+
+
+class TestReadContext(unittest.TestCase):
+
+    def test_child_contexts_are_not_retained(self):
+        ctx = ReadContext(BytesIO(bytes([3, 1, 2, 3, 4, 5, 6])))
+        data = Polygon().unpack(ctx, name='polygon')
+        self.assertEqual(data, {'count': 3, 'points': [{'x': 1, 'y': 2}, {'x': 3, 'y': 4}, {'x': 5, 'y': 6}]})
+        self.assertEqual(ctx.children, {})
+
+    def test_ctx_path(self):
+        ctx = ReadContext(BytesIO(b''), name='FILE.DAT')
+        child = ctx.get_or_create_child('points', ArrayBlock(child=Point(), length=1)).get_or_create_child('0')
+        self.assertEqual(child.ctx_path, 'FILE.DAT/points/0')
+
+    @unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'), 'benchmark, set RUN_BENCHMARKS=1 to run')
+    def test_retained_contexts_benchmark(self):
+        clear_files_cache()
+        try:
+            for file_name in sorted(os.listdir(CORPUS_PATH)):
+                require_file(f'{CORPUS_PATH}/{file_name}')
+            (count, size) = _retained_contexts()
+            print(f'\nRetained read contexts after loading golden corpus: {count}, {size / 1024:.1f} KiB')
+        finally:
+            clear_files_cache()
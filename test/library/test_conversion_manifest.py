@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from library.conversion_manifest import ConversionManifest, manifest_entry
+from library.loader import require_resource, track_required_files, clear_file_cache
+
+SETTINGS = {'output_path': '/out', 'multiprocess_processes_count': 4, 'images__save_images_only': False}
+
+
+class TestConversionManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.out_path = os.path.join(self.temp_dir.name, 'out')
+        self.input_path = self._write('TR02.TRK', b'TRAC')
+        self.dependency_path = self._write('TR02.COL', b'COLL')
+        self.output_path = self._write('out/TR02.TRK/map.blend', b'blend')
+        self.manifest = ConversionManifest(self.out_path, SETTINGS)
+        self.manifest.update(self.input_path, manifest_entry(self.input_path, [self.output_path],
+                                                             [self.dependency_path, self.input_path]))
+        self.manifest.save()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, name, content):
+        path = os.path.join(self.temp_dir.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def _load(self, settings=SETTINGS):
+        manifest = ConversionManifest(self.out_path, settings)
+        manifest.load()
+        return manifest
+
+    def test_unchanged_file_is_up_to_date(self):
+        self.assertTrue(self._load().is_up_to_date(self.input_path))
+        # touched, but not changed
+        os.utime(self.input_path, ns=(0, 0))
+        self.assertTrue(self._load().is_up_to_date(self.input_path))
+        # settings, which do not change output
+        self.assertTrue(self._load({**SETTINGS, 'multiprocess_processes_count': 1}).is_up_to_date(self.input_path))
+
+    def test_touched_files_are_hashed_once(self):
+        os.utime(self.input_path, ns=(0, 0))
+        os.utime(self.dependency_path, ns=(0, 0))
+        manifest = self._load()
+        self.assertTrue(manifest.is_up_to_date(self.input_path))
+        manifest.save()
+        with mock.patch('library.conversion_manifest.file_content_hash',
+                        side_effect=AssertionError('hashed again')):
+            self.assertTrue(self._load().is_up_to_date(self.input_path))
+
+    def test_changed_file_is_not_up_to_date(self):
+        self._write('TR02.TRK', b'TRAK')
+        self.assertFalse(self._load().is_up_to_date(self.input_path))
+
+    def test_dependent_file_is_not_up_to_date(self):
+        self._write('TR02.COL', b'COLL2')
+        self.assertFalse(self._load().is_up_to_date(self.input_path))
+
+    def test_missing_output_is_not_up_to_date(self):
+        os.remove(self.output_path)
+        self.assertFalse(self._load().is_up_to_date(self.input_path))
+
+    def test_changed_settings_invalidate_manifest(self):
+        manifest = self._load({**SETTINGS, 'images__save_images_only': True})
+        self.assertEqual(manifest.entries, {})
+
+    def test_required_files_are_tracked(self):
+        path = 'test/samples/GTITLE.QFS'
+        try:
+            with track_required_files() as required_files:
+                require_resource(f'{path}__data')
+            self.assertEqual(required_files, {path})
+        finally:
+            clear_file_cache(path)
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+
+from library.conversion_planner import plan_conversion, probe_file, file_dependencies, chunk_batches, prioritize_tasks
+from resources.eac.bitmaps import EacPalette
+
+CORPUS_PATH = 'test/golden_corpus'
+
+
+class TestConversionPlanner(unittest.TestCase):
+
+    def _plan(self, files, processes, sizes=None):
+        return [[files[i] for i in batch] for batch in plan_conversion(files, processes, sizes)]
+
+    def test_dependencies_of_track(self):
+        path = f'{CORPUS_PATH}/TR02.TRK'
+        self.assertEqual(probe_file(path).__name__, 'TrkMap')
+        self.assertEqual(file_dependencies(path, probe_file(path)),
+                         [f'{CORPUS_PATH}/TR02.COL', f'{CORPUS_PATH}/TR020.QFS'])
+        self.assertEqual(file_dependencies(f'{CORPUS_PATH}/TR02.COL', probe_file(f'{CORPUS_PATH}/TR02.COL')), [])
+
+    def test_dependent_files_are_batched_together(self):
+        files = sorted(f'{CORPUS_PATH}/{f}' for f in os.listdir(CORPUS_PATH))
+        batches = self._plan(files, processes=1)
+        self.assertEqual(sorted(sum(batches, [])), files)
+        batches_by_file = {path: batch for batch in batches for path in batch}
+        for (dependent, required) in [('TR02.TRK', ['TR02.COL', 'TR020.QFS']),
+                                      ('TR00.FRD', ['TR00.COL', 'TR000.QFS']),
+                                      ('LOG.GEO', ['LOG.QFS'])]:
+            batch = batches_by_file[f'{CORPUS_PATH}/{dependent}']
+            self.assertEqual(sorted(batch), sorted(f'{CORPUS_PATH}/{f}' for f in [dependent] + required))
+            # required files are parsed first
+            self.assertEqual(batch[-1], f'{CORPUS_PATH}/{dependent}')
+        self.assertEqual(batches_by_file[f'{CORPUS_PATH}/AL1.TRI'], [f'{CORPUS_PATH}/AL1.TRI'])
+
+    def test_largest_batches_go_first(self):
+        files = ['a.TRK', 'a.COL', 'a0.QFS', 'b.BIN', 'c.BIN']
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files = [f'{temp_dir}/{f}' for f in files]
+            for path in files:
+                with open(path, 'wb') as f:
+                    f.write(b'TRAC' if path.endswith('.TRK') else b'')
+            batches = self._plan(files, processes=2, sizes=[10, 10, 10, 50, 20])
+            self.assertEqual(batches, [[files[3]], [files[1], files[2], files[0]], [files[4]]])
+
+    def test_large_group_is_split(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            control_path = f'{temp_dir}/ART/CONTROL'
+            os.makedirs(control_path)
+            files = [f'{control_path}/{f}' for f in ['CENTRAL.QFS', 'A.QFS', 'B.QFS', 'C.QFS', 'D.QFS']]
+            for path in files:
+                with open(path, 'wb') as f:
+                    f.write(b'\x10\xfb\x00\x00')
+            batches = self._plan(files, processes=2, sizes=[10] * 5)
+            # shared file is converted once, other files go to batches of fair size
+            self.assertEqual(batches, [[files[0], files[1]], [files[2], files[3]], [files[4]]])
+
+    def test_small_batches_are_chunked(self):
+        batches = [[0], [1, 2], [3], [4], [5]]
+        sizes = [100, 10, 10, 5, 5, 2]
+        # 132 bytes, 1 process: tasks of at least 132 / 16 bytes
+        self.assertEqual(chunk_batches(batches, sizes, processes=1), [[0], [1, 2], [3, 4], [5]])
+
+    def test_cheap_tasks_go_first(self):
+        tasks = [[0], [1, 2], [3], [4]]
+        sizes = [10 ** 7, 10 ** 6, 100, 10 ** 6, 10]
+        block_classes = [None, None, None, EacPalette, None]
+        self.assertEqual(prioritize_tasks(tasks, sizes, block_classes), [[3], [4], [0], [1, 2]])
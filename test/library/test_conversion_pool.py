@@ -0,0 +1,122 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import config
+from library.conversion_pool import (ConversionWorkerPool, ConversionCancelled, ConversionTimeout, WorkerCrashed,
+                                     is_conversion_cancelled)
+from library.loader import files_cache
+
+
+def _worker_state(delay):
+    time.sleep(delay)
+    return os.getpid(), is_conversion_cancelled(), len(files_cache)
+
+
+def _wait_for_cancel(started_path, wait):
+    # tells the test, that file is started, and is converted until conversion is cancelled
+    with open(started_path, 'w'):
+        pass
+    deadline = time.monotonic() + 30
+    while wait and not is_conversion_cancelled() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return _worker_state(0)
+
+
+def _worker_settings():
+    return os.getpid(), config.general_config().qfs_compression_level
+
+
+def _fail_first_attempt(value, attempts_path):
+    with open(attempts_path, 'a') as f:
+        f.write(f'{value}\n')
+    with open(attempts_path) as f:
+        first_attempt = f.read().split().count(value) == 1
+    if value == 'hang' or (value == 'hang_once' and first_attempt):
+        time.sleep(60)
+    if value == 'crash':
+        os._exit(1)
+    return value
+
+
+def _tasks(args_list, files_per_task=1):
+    items = list(enumerate(args_list))
+    return [items[i:i + files_per_task] for i in range(0, len(items), files_per_task)]
+
+
+class TestConversionWorkerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ConversionWorkerPool()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.attempts_path = os.path.join(self.temp_dir.name, 'attempts')
+
+    def tearDown(self):
+        self.pool.close()
+        self.temp_dir.cleanup()
+
+    def test_workers_are_reused(self):
+        files_cache['parsed/in/parent'] = (None, None)
+        try:
+            first = list(self.pool.run(_worker_state, _tasks([(0,)] * 4), processes=2, shared_cache_size=1024))
+            second = list(self.pool.run(_worker_state, _tasks([(0,)] * 4), processes=2, shared_cache_size=1024))
+        finally:
+            del files_cache['parsed/in/parent']
+        self.assertEqual(sorted(i for (i, _) in first), [0, 1, 2, 3])
+        # the same two worker processes
+        self.assertLessEqual(len({pid for (_, (pid, _, _)) in first + second}), 2)
+        # files, parsed by parent process, are not inherited
+        self.assertEqual({count for (_, (_, _, count)) in first + second}, {0})
+
+    def test_workers_get_current_settings(self):
+        initial_level = config.general_config().qfs_compression_level
+        try:
+            first = list(self.pool.run(_worker_settings, _tasks([()]), processes=1, shared_cache_size=0))
+            # changed in settings dialog after workers were started
+            config._config_manager.update(config.SECTION_GENERAL, {'qfs_compression_level': initial_level + 1})
+            second = list(self.pool.run(_worker_settings, _tasks([()]), processes=1, shared_cache_size=0))
+        finally:
+            config._config_manager.update(config.SECTION_GENERAL, {'qfs_compression_level': initial_level})
+        self.assertEqual(first[0][1][1], initial_level)
+        self.assertEqual(second[0][1][1], initial_level + 1)
+        # workers are not restarted for changed settings
+        self.assertEqual(first[0][1][0], second[0][1][0])
+
+    def test_running_conversion_is_cancelled(self):
+        started_paths = [os.path.join(self.temp_dir.name, f'started{i}') for i in range(8)]
+
+        def cancel_when_second_file_is_started():
+            deadline = time.monotonic() + 30
+            while not os.path.exists(started_paths[1]) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.pool.cancel()
+
+        canceller = threading.Thread(target=cancel_when_second_file_is_started)
+        canceller.start()
+        # the first file is not waiting for cancel
+        args = [(x, i > 0) for i, x in enumerate(started_paths)]
+        results = dict(self.pool.run(_wait_for_cancel, _tasks(args, files_per_task=4), processes=1,
+                                     shared_cache_size=0))
+        canceller.join()
+        self.assertEqual(sorted(results), list(range(8)))
+        self.assertFalse(results[0][1])
+        # file, which was being converted, is finished, the rest are skipped
+        self.assertTrue(results[1][1])
+        self.assertTrue(all(isinstance(results[i], ConversionCancelled) for i in range(2, 8)))
+        # next conversion is not cancelled
+        self.assertEqual([result[1] for (_, result) in self.pool.run(_worker_state, _tasks([(0,)]), 1, 0)], [False])
+
+    def test_failed_files_are_retried_once(self):
+        args = [(x, self.attempts_path) for x in ['hang_once', 'a', 'crash', 'b', 'hang']]
+        results = dict(self.pool.run(_fail_first_attempt, _tasks(args, files_per_task=2), processes=2,
+                                     shared_cache_size=0, file_timeout=1))
+        self.assertEqual([results[i] for i in [0, 1, 3]], ['hang_once', 'a', 'b'])
+        self.assertIsInstance(results[2], WorkerCrashed)
+        self.assertIsInstance(results[4], ConversionTimeout)
+        # timed out file is reported with elapsed time
+        self.assertIn('elapsed', str(results[4]))
+        with open(self.attempts_path) as f:
+            self.assertEqual(sorted(f.read().split()), ['a', 'b', 'crash', 'crash', 'hang', 'hang', 'hang_once',
+                                                        'hang_once'])
@@ -0,0 +1,76 @@
+import json
+import pickle
+import unittest
+from copy import deepcopy
+
+from library.utils.lazy_list import LazyList, has_pending_items
+
+
+class TestLazyList(unittest.TestCase):
+
+    def _make(self, calls):
+        def loader(i):
+            def load():
+                calls.append(i)
+                return {'value': i}
+            return load
+        return LazyList([LazyList.Pending(loader(i)) for i in range(5)])
+
+    def test_loads_on_access_only(self):
+        calls = []
+        lst = self._make(calls)
+        self.assertEqual(len(lst), 5)
+        self.assertEqual(lst.pending_count, 5)
+        self.assertEqual(lst[2], {'value': 2})
+        self.assertEqual(lst[-1], {'value': 4})
+        self.assertEqual(calls, [2, 4])
+        self.assertIs(lst[2], lst[2])
+        self.assertEqual(calls, [2, 4])
+        self.assertTrue(lst.is_loaded(2))
+        self.assertFalse(lst.is_loaded(0))
+
+    def test_iteration_and_slices(self):
+        calls = []
+        lst = self._make(calls)
+        self.assertEqual(lst[1:3], [{'value': 1}, {'value': 2}])
+        self.assertEqual([x['value'] for x in lst], [0, 1, 2, 3, 4])
+        self.assertEqual(sorted(calls), [0, 1, 2, 3, 4])
+        self.assertEqual(lst.pending_count, 0)
+
+    def test_materialize(self):
+        lst = self._make([]).materialize()
+        self.assertEqual(lst.pending_count, 0)
+        self.assertEqual(lst, [{'value': i} for i in range(5)])
+
+    def test_copies_are_plain_lists(self):
+        lst = self._make([])
+        for copied in [deepcopy(lst), pickle.loads(pickle.dumps(lst)), lst.copy()]:
+            self.assertIs(type(copied), list)
+            self.assertEqual(copied, [{'value': i} for i in range(5)])
+
+    def test_c_level_consumers_see_loaded_items(self):
+        expected = [{'value': i} for i in range(5)]
+        self.assertEqual([] + self._make([]), expected)
+        self.assertIs(type([] + self._make([])), list)
+        self.assertEqual(['first'] + self._make([]), ['first'] + expected)
+        self.assertEqual(self._make([]) + [], expected)
+        self.assertEqual(tuple(self._make([])), tuple(expected))
+        self.assertEqual(json.loads(json.dumps(self._make([]))), expected)
+        self.assertEqual(json.loads(json.dumps({'items': self._make([])}, indent=2)), {'items': expected})
+        with self.assertRaises(TypeError):
+            (1,) + self._make([])
+
+    def test_mutations(self):
+        lst = self._make([])
+        self.assertEqual(lst.pop(0), {'value': 0})
+        lst.insert(0, 'new')
+        lst.remove({'value': 3})
+        self.assertEqual(list(lst), ['new', {'value': 1}, {'value': 2}, {'value': 4}])
+
+    def test_has_pending_items(self):
+        calls = []
+        data = {'header': [1, 2], 'children': [{'item': self._make(calls)}]}
+        self.assertTrue(has_pending_items(data))
+        self.assertEqual(calls, [])
+        data['children'][0]['item'].materialize()
+        self.assertFalse(has_pending_items(data))
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+from io import SEEK_CUR, SEEK_END
+
+from library.context import ReadContext
+from library.read_blocks import IntegerBlock, UTF8Block, BytesBlock
+from library.utils.memory_view_buffer import MemoryViewBuffer
+
+
+class TestMemoryViewBuffer(unittest.TestCase):
+
+    def test_read_and_seek(self):
+        buffer = MemoryViewBuffer(b'0123456789')
+        self.assertEqual(buffer.read(3), b'012')
+        self.assertEqual(buffer.tell(), 3)
+        buffer.seek(-1, SEEK_CUR)
+        self.assertEqual(buffer.read(2), b'23')
+        buffer.seek(-2, SEEK_END)
+        self.assertEqual(buffer.read(), b'89')
+        self.assertEqual(buffer.read(5), b'')
+        with self.assertRaises(ValueError):
+            buffer.seek(-1)
+
+    def test_read_view_is_zero_copy(self):
+        data = bytearray(b'abcdef')
+        buffer = MemoryViewBuffer(data)
+        buffer.seek(2)
+        view = buffer.read_view(2)
+        self.assertIsInstance(view, memoryview)
+        data[2] = ord('X')
+        self.assertEqual(view.tobytes(), b'Xd')
+
+    def test_from_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'test.bin')
+            with open(path, 'wb') as f:
+                f.write(b'\x01\x02\x03\x04abc')
+            with MemoryViewBuffer.from_file(path) as buffer:
+                self.assertEqual(buffer.name, path)
+                ctx = ReadContext(buffer, read_bytes_amount=7)
+                self.assertEqual(IntegerBlock(length=4).unpack(ctx), 0x04030201)
+                self.assertEqual(UTF8Block(length=3).unpack(ctx), 'abc')
+            self.assertTrue(buffer.closed)
+
+    def test_bytes_block_returns_bytes(self):
+        ctx = ReadContext.from_bytes(b'\x01\x02\x03')
+        res = BytesBlock(length=3).unpack(ctx)
+        self.assertIs(type(res), bytes)
+        self.assertEqual(res, b'\x01\x02\x03')
@@ -0,0 +1,111 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from library.loader import require_file, clear_file_cache, store_loaded_files
+from library.parse_cache import ParseCache, ENTRIES_DIR
+from resources.eac.archives import EacCompressedBlock
+
+
+class TestParseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.temp_dir.name, 'cache')
+        self.file_path = os.path.join(self.temp_dir.name, 'GTITLE.QFS')
+        shutil.copy('test/samples/GTITLE.QFS', self.file_path)
+
+    def tearDown(self):
+        clear_file_cache(self.file_path)
+        self.temp_dir.cleanup()
+
+    def _entries(self):
+        return [os.path.join(dir_path, f) for (dir_path, _, files) in os.walk(os.path.join(self.cache_path,
+                                                                                            ENTRIES_DIR))
+                for f in files]
+
+    def test_store_and_load(self):
+        cache = ParseCache(self.cache_path, 1024 * 1024 * 1024)
+        self.assertIsNone(cache.load(self.file_path, EacCompressedBlock))
+        data = {'choice_index': 0, 'data': [1, 2, b'abc']}
+        cache.store(self.file_path, EacCompressedBlock, data)
+        self.assertEqual(cache.load(self.file_path, EacCompressedBlock), data)
+        # other block class is another entry
+        self.assertIsNone(cache.load(self.file_path, dict))
+
+    def test_changed_file_is_not_loaded(self):
+        cache = ParseCache(self.cache_path, 1024 * 1024 * 1024)
+        cache.store(self.file_path, EacCompressedBlock, {'data': 1})
+        with open(self.file_path, 'r+b') as f:
+            f.seek(100)
+            f.write(b'\xff\xff')
+        self.assertIsNone(cache.load(self.file_path, EacCompressedBlock))
+
+    def test_unchanged_file_is_not_hashed_again(self):
+        cache = ParseCache(self.cache_path, 1024 * 1024 * 1024)
+        content_hash = cache.content_hash(self.file_path)
+        with mock.patch('hashlib.blake2b') as blake2b:
+            self.assertEqual(cache.content_hash(self.file_path), content_hash)
+            blake2b.assert_not_called()
+
+    def test_broken_entry_is_removed(self):
+        cache = ParseCache(self.cache_path, 1024 * 1024 * 1024)
+        cache.store(self.file_path, EacCompressedBlock, {'data': 1})
+        (entry,) = self._entries()
+        with open(entry, 'r+b') as f:
+            f.truncate(15)
+        self.assertIsNone(cache.load(self.file_path, EacCompressedBlock))
+        self.assertEqual(self._entries(), [])
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ParseCache(self.cache_path, 1024 * 1024 * 1024)
+        entry_data = bytes(1000)
+        for block_class in [dict, list, tuple]:
+            cache.store(self.file_path, block_class, entry_data)
+            for entry in self._entries():
+                # make sure, that modification times differ
+                stat = os.stat(entry)
+                os.utime(entry, ns=(stat.st_atime_ns, stat.st_mtime_ns - 1_000_000_000))
+        self.assertEqual(len(self._entries()), 3)
+        self.assertEqual(cache.load(self.file_path, dict), entry_data)
+        # room for two entries only
+        cache.max_size = 2500
+        cache.evict()
+        self.assertEqual(len(self._entries()), 2)
+        self.assertIsNone(cache.load(self.file_path, list))
+        self.assertEqual(cache.load(self.file_path, dict), entry_data)
+        self.assertEqual(cache.load(self.file_path, tuple), entry_data)
+
+    def test_require_file_skips_decoding_of_cached_file(self):
+        with mock.patch.dict(os.environ, {'NFS_RESOURCES_CONVERTER_GENERAL_PARSE_CACHE_ENABLED': 'true',
+                                          'NFS_RESOURCES_CONVERTER_GENERAL_PARSE_CACHE_PATH': self.cache_path}):
+            (_, _, data) = require_file(self.file_path)
+            expected = pickle.dumps(data)
+            clear_file_cache(self.file_path)
+            with mock.patch.object(EacCompressedBlock, 'unpack', side_effect=AssertionError('decoded again')):
+                (_, block, data) = require_file(self.file_path)
+            self.assertIsInstance(block, EacCompressedBlock)
+            self.assertEqual(pickle.dumps(data), expected)
+
+    def test_lazily_read_file_is_stored_when_loaded(self):
+        archive_path = os.path.join(self.temp_dir.name, 'CARDATA.VIV')
+        shutil.copy('test/samples/CARDATA.VIV', archive_path)
+        with mock.patch.dict(os.environ, {'NFS_RESOURCES_CONVERTER_GENERAL_PARSE_CACHE_ENABLED': 'true',
+                                          'NFS_RESOURCES_CONVERTER_GENERAL_PARSE_CACHE_PATH': self.cache_path}):
+            try:
+                (_, _, data) = require_file(archive_path)
+                # storing would decode all children
+                self.assertEqual(self._entries(), [])
+                self.assertGreater(data['children'].pending_count, 0)
+                store_loaded_files()
+                self.assertEqual(self._entries(), [])
+                clear_file_cache(archive_path)
+                (_, _, data) = require_file(archive_path)
+                data['children'].materialize()
+                store_loaded_files()
+                self.assertEqual(len(self._entries()), 1)
+            finally:
+                clear_file_cache(archive_path)
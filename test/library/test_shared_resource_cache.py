@@ -0,0 +1,75 @@
+import pickle
+import unittest
+from multiprocessing import Pool
+from unittest import mock
+
+from library.loader import require_file, require_resource, clear_file_cache, store_loaded_files
+from library.shared_resource_cache import (SharedResourceStore, shared_resource_store, install_shared_store,
+                                           init_conversion_worker)
+from resources.eac.archives import EacCompressedBlock
+
+SAMPLE_PATH = 'test/samples/GTITLE.QFS'
+
+
+def _load_sample():
+    clear_file_cache(SAMPLE_PATH)
+    (_, _, data) = require_file(SAMPLE_PATH, shared=True)
+    return pickle.dumps(data)
+
+
+class TestSharedResourceCache(unittest.TestCase):
+
+    def tearDown(self):
+        install_shared_store(None)
+        clear_file_cache(SAMPLE_PATH)
+
+    def test_store_limits_size(self):
+        store = SharedResourceStore(max_size=10)
+        self.assertTrue(store.put('a', b'123456'))
+        self.assertFalse(store.put('b', b'123456'))
+        self.assertTrue(store.put('a', b'123456'))
+        self.assertEqual(store.get('a'), b'123456')
+        self.assertIsNone(store.get('b'))
+        self.assertEqual(store.stats(), {'hits': 1, 'misses': 1, 'stored': 1, 'rejected': 1, 'entries': 1, 'size': 6})
+
+    def test_required_resource_is_shared(self):
+        with shared_resource_store(64 * 1024 * 1024) as store:
+            install_shared_store(store)
+            (_, _, data), _ = require_resource(SAMPLE_PATH)
+            expected = pickle.dumps(data)
+            clear_file_cache(SAMPLE_PATH)
+            with mock.patch.object(EacCompressedBlock, 'unpack', side_effect=AssertionError('decoded again')):
+                (_, _, data), _ = require_resource(SAMPLE_PATH)
+            self.assertEqual(pickle.dumps(data), expected)
+            stats = store.stats()
+            self.assertEqual((stats['hits'], stats['misses'], stats['stored']), (1, 1, 1))
+
+    def test_opened_file_is_not_shared(self):
+        with shared_resource_store(64 * 1024 * 1024) as store:
+            install_shared_store(store)
+            require_file(SAMPLE_PATH)
+            self.assertEqual(store.stats()['entries'], 0)
+
+    def test_lazily_read_file_is_shared_when_loaded(self):
+        archive_path = 'test/samples/CARDATA.VIV'
+        with shared_resource_store(64 * 1024 * 1024) as store:
+            install_shared_store(store)
+            try:
+                (_, _, data) = require_file(archive_path, shared=True)
+                # sharing would decode all children
+                self.assertEqual(store.stats()['entries'], 0)
+                self.assertGreater(data['children'].pending_count, 0)
+                data['children'].materialize()
+                store_loaded_files()
+                self.assertEqual(store.stats()['entries'], 1)
+            finally:
+                clear_file_cache(archive_path)
+
+    def test_workers_share_parsed_file(self):
+        with shared_resource_store(64 * 1024 * 1024) as store:
+            with Pool(processes=2, initializer=init_conversion_worker, initargs=(False, store)) as pool:
+                expected = pool.apply(_load_sample)
+                results = [pool.apply_async(_load_sample) for _ in range(3)]
+                self.assertEqual([result.get() for result in results], [expected] * 3)
+            stats = store.stats()
+            self.assertEqual((stats['hits'], stats['misses'], stats['stored']), (3, 1, 1))
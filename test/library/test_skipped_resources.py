@@ -0,0 +1,21 @@
+import os
+import tempfile
+import unittest
+
+from library.utils.skipped_resources import SkippedResourcesWriter
+
+
+class TestSkippedResourcesWriter(unittest.TestCase):
+
+    def test_errors_are_written_next_to_output_and_sorted(self):
+        with tempfile.TemporaryDirectory() as out_path:
+            writer = SkippedResourcesWriter('/games/nfs', out_path)
+            writer.add('/games/nfs/DATA/B.QFS', ValueError('broken\nheader'))
+            writer.add('/games/nfs/A.TRI', FileNotFoundError('no FAM'))
+            writer.add('/games/nfs/DATA/A.QFS', NotImplementedError('unknown'))
+            writer.close()
+            with open(os.path.join(out_path, 'DATA', 'skipped.txt')) as f:
+                self.assertEqual(f.read(), 'A.QFS\t\tNotImplementedError: unknown\n'
+                                           'B.QFS\t\tValueError: broken\nheader\n')
+            with open(os.path.join(out_path, 'skipped.txt')) as f:
+                self.assertEqual(f.read(), 'A.TRI\t\tFileNotFoundError: no FAM\n')
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import tracemalloc
+import unittest
+
+from library import require_file, write_file
+from library.loader import clear_file_cache
+from library.utils.write_sink import WriteSink
+
+
+class TestWriteSink(unittest.TestCase):
+
+    def _check_sink(self, sink):
+        sink.write(b'\x00\x00abc')
+        self.assertEqual(sink.tell(), 5)
+        sink.patch(0, b'\x05\x00')
+        sink.write(b'de')
+        self.assertEqual(sink.read(2, 4), b'ab')
+        self.assertEqual(sink.tell(), 7)
+        with self.assertRaises(ValueError):
+            sink.patch(6, b'xy')
+        self.assertEqual(sink.getvalue(), b'\x05\x00abcde')
+
+    def test_bytearray(self):
+        target = bytearray(b'head')
+        self._check_sink(WriteSink(target))
+        self.assertEqual(target, b'head\x05\x00abcde')
+
+    def test_file(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(b'head')
+            self._check_sink(WriteSink(f))
+            f.seek(0)
+            self.assertEqual(f.read(), b'head\x05\x00abcde')
+
+
+class TestWriteFile(unittest.TestCase):
+
+    def test_file_is_written_as_packed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for file_name in ['CARDATA.VIV', 'TSUPRA.CFM', 'VERTBST.FSH', 'LDIABL.PBS__uncompressed']:
+                (_, block, data) = require_file(f'test/samples/{file_name}')
+                path = os.path.join(tmp_dir, file_name)
+                write_file(path, block, data)
+                with open(path, 'rb') as f:
+                    self.assertEqual(f.read(), block.pack(data), file_name)
+
+    def test_file_is_overwritten_with_own_data(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'CARDATA.VIV')
+            with open('test/samples/CARDATA.VIV', 'rb') as f:
+                original = f.read()
+            with open(path, 'wb') as f:
+                f.write(original)
+            try:
+                # children of archive are read lazily from the file, which is being overwritten
+                (_, block, data) = require_file(path)
+                write_file(path, block, data)
+            finally:
+                clear_file_cache(path)
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), original)
+            self.assertEqual(os.listdir(tmp_dir), ['CARDATA.VIV'])
+
+    @unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'), 'benchmark, set RUN_BENCHMARKS=1 to run')
+    def test_peak_memory_benchmark(self):
+        (_, block, archive) = require_file('test/samples/CARDATA.VIV')
+        (bigf_choice, bytes_choice) = (block.item_block.get_choice_index_by_class_name('BigfBlock'),
+                                       block.item_block.get_choice_index_by_class_name('BytesBlock'))
+        data = {**archive, 'children': [*archive['children'],
+                                        {'item': {'choice_index': bytes_choice, 'data': bytes(20 * 1024 * 1024)},
+                                         'alias': 'big.bin', 'pre_offset_payload': b'', 'post_offset_payload': b''}]}
+        for i in range(8):
+            data = {**archive, 'children': [*archive['children'],
+                                            {'item': {'choice_index': bigf_choice, 'data': data}, 'alias': f'{i}.viv',
+                                             'pre_offset_payload': b'', 'post_offset_payload': b''}]}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'nested.viv')
+            for (title, func) in [('pack', lambda: block.pack(data)),
+                                  ('write_file', lambda: write_file(path, block, data))]:
+                tracemalloc.start()
+                try:
+                    func()
+                    (_, peak) = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                print(f'\n{title} of BIGF nested 8 times with 20 MiB item: peak memory {peak / 1024 / 1024:.1f} MiB')
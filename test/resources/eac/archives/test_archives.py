@@ -1,6 +1,15 @@
+import json
+import os
+import time
+from io import BytesIO
+import tracemalloc
 import unittest
 
 from library import require_file
+from library.context import ReadContext
+from library.read_blocks.archives import ItemOffsetsIndex
+from library.utils.memory_view_buffer import MemoryViewBuffer
+from serializers.misc.json_utils import convert_bytes
 
 
 class TestShpiBlock(unittest.TestCase):
@@ -37,6 +46,30 @@ class TestWwwwBlock(unittest.TestCase):
             for i, x in enumerate(original):
                 self.assertEqual(x, output[i], f"Wrong value at index {i}")
 
+    def test_many_items_should_be_read(self):
+        (_, block, _) = require_file('test/samples/TSUPRA.CFM')
+        bytes_choice = block.item_block.get_choice_index_by_class_name('BytesBlock')
+        lengths = [1 + i % 7 for i in range(30000)]
+        output = block.pack({'resource_id': 'wwww', 'num_items': 0, 'children': [
+            {'item': {'choice_index': bytes_choice, 'data': b'\xab' * x}, 'pre_offset_payload': b'',
+             'post_offset_payload': b''} for x in lengths]})
+        res = block.unpack(ReadContext.from_bytes(output), read_bytes_amount=len(output))
+        self.assertEqual([len(x['item']['data']) for x in res['children']], lengths)
+
+
+class TestItemOffsetsIndex(unittest.TestCase):
+
+    def test_next_offset(self):
+        index = ItemOffsetsIndex([40, 8, 20, 20], 64)
+        self.assertEqual([index.next_offset(x) for x in [8, 20, 40]], [20, 40, 64])
+        # position between offsets
+        self.assertEqual([index.next_offset(x) for x in [0, 10, 50]], [8, 20, 64])
+
+    def test_length_of_first_item_with_shared_offset(self):
+        index = ItemOffsetsIndex([8, 20, 8], 64, lengths=[12, 30, 0])
+        self.assertEqual(index.length(8), 12)
+        self.assertEqual(index.length(20), 30)
+
 
 class TestSoundBankBlock(unittest.TestCase):
 
@@ -60,3 +93,119 @@ class TestBigfBlock(unittest.TestCase):
             self.assertEqual(len(original), len(output))
             for i, x in enumerate(original):
                 self.assertEqual(x, output[i], f"Wrong value at index {i}")
+
+    def test_heap_should_not_be_copied_on_read(self):
+        (_, block, res) = require_file('test/samples/CARDATA.VIV')
+        bytes_choice = block.item_block.get_choice_index_by_class_name('BytesBlock')
+        output = block.pack({**res, 'children': [*res['children'], {
+            'item': {'choice_index': bytes_choice, 'data': b'\xab' * (16 * 1024 * 1024)}, 'alias': 'big.dat',
+            'pre_offset_payload': b'', 'post_offset_payload': b''}]})
+        tracemalloc.start()
+        try:
+            data = block.unpack(ReadContext.from_bytes(output), read_bytes_amount=len(output))
+            (_, peak) = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        # children are read lazily, heap of archive is only skipped
+        self.assertLess(peak, 4 * 1024 * 1024)
+        self.assertEqual(len(data['children'][-1]['item']['data']), 16 * 1024 * 1024)
+
+
+class TestNestedArchives(unittest.TestCase):
+
+    def _nested_bigf(self, depth):
+        (name, block, res) = require_file('test/samples/CARDATA.VIV')
+        bigf_choice = block.item_block.get_choice_index_by_class_name('BigfBlock')
+        data = res
+        for i in range(depth):
+            data = {**res, 'children': [*res['children'], {'item': {'choice_index': bigf_choice, 'data': data},
+                                                           'alias': f'nest{i}.viv', 'pre_offset_payload': b'',
+                                                           'post_offset_payload': b''}]}
+        return block, data
+
+    def test_lengths_of_nested_archives(self):
+        (block, data) = self._nested_bigf(3)
+        output = block.pack(data)
+        (start, end) = (0, len(output))
+        for _ in range(4):
+            self.assertEqual(output[start:start + 4], b'BIGF')
+            self.assertEqual(int.from_bytes(output[start + 4:start + 8], 'big'), end - start)
+            # nested archive is the last item
+            descr_start = start + 16
+            for _ in range(int.from_bytes(output[start + 8:start + 12], 'big') - 1):
+                descr_start = output.index(b'\x00', descr_start + 8) + 1
+            offset = int.from_bytes(output[descr_start:descr_start + 4], 'big')
+            length = int.from_bytes(output[descr_start + 4:descr_start + 8], 'big')
+            (start, end) = (start + offset, start + offset + length)
+
+    @unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'), 'benchmark, set RUN_BENCHMARKS=1 to run')
+    def test_nested_archives_packing_benchmark(self):
+        for depth in [1, 4, 16]:
+            (block, data) = self._nested_bigf(depth)
+            start = time.perf_counter()
+            output = block.pack(data)
+            print(f'\nBIGF nested {depth} times: {len(output)} bytes in {time.perf_counter() - start:.3f}s')
+
+
+class TestLazyArchiveChildren(unittest.TestCase):
+
+    def _read(self, path, lazy):
+        from library.loader import clear_file_cache
+        from library.read_blocks.archives import ArchiveBlock
+        clear_file_cache(path)
+        try:
+            ArchiveBlock.lazy_children = lazy
+            return require_file(path)
+        finally:
+            ArchiveBlock.lazy_children = True
+            clear_file_cache(path)
+
+    def test_bigf_children_are_decoded_on_access(self):
+        (_, _, res) = self._read('test/samples/CARDATA.VIV', True)
+        self.assertEqual(res['children'].pending_count, len(res['children']))
+        child = res['children'][0]
+        self.assertEqual(res['children'].pending_count, len(res['children']) - 1)
+        # bytes before item start where the previous item ends: items before it in file are decoded as well
+        child = res['children'][3]
+        self.assertEqual(child['alias'], 'ff50.dat')
+        self.assertEqual(res['children'].pending_count, len(res['children']) - 4)
+
+    def test_unloaded_archive_serializes_to_json(self):
+        (_, _, lazy) = self._read('test/samples/CARDATA.VIV', True)
+        (_, _, eager) = self._read('test/samples/CARDATA.VIV', False)
+        self.assertEqual(lazy['children'].pending_count, len(lazy['children']))
+        self.assertEqual(json.dumps(convert_bytes(lazy)), json.dumps(convert_bytes(eager)))
+        (_, _, lazy) = self._read('test/samples/CARDATA.VIV', True)
+        plain = {**lazy, 'children': [] + lazy['children']}
+        self.assertEqual(json.dumps(convert_bytes(plain)), json.dumps(convert_bytes(eager)))
+
+    def test_lazy_children_match_eager(self):
+        for path in ['test/samples/CARDATA.VIV', 'test/samples/TSUPRA.CFM']:
+            (name, block, lazy) = self._read(path, True)
+            (_, _, eager) = self._read(path, False)
+            self.assertEqual(block.pack(lazy, name=name), block.pack(eager, name=name))
+            self.assertEqual(len(lazy['children']), len(eager['children']))
+            # the same data, whatever buffer is read from
+            for lazy_child, eager_child in zip(lazy['children'], eager['children']):
+                self.assertEqual(convert_bytes(lazy_child), convert_bytes(eager_child))
+
+    def test_payloads_between_items_match_eager(self):
+        for path in ['test/samples/CARDATA.VIV', 'test/samples/TSUPRA.CFM']:
+            (_, block, res) = require_file(path)
+            children = [{**child, 'pre_offset_payload': b'', 'post_offset_payload': b''} for child in res['children']]
+            children[1]['pre_offset_payload'] = b'\x01\x02\x03'
+            if 'alias' in children[-1]:
+                children[-1]['post_offset_payload'] = b'\x05\x06'
+            output = block.pack({**res, 'children': children})
+            # some items depend on file name
+            (lazy_buffer, eager_buffer) = (MemoryViewBuffer(output, name=path), BytesIO(output))
+            eager_buffer.name = path
+            lazy = block.unpack(ReadContext(lazy_buffer, read_bytes_amount=len(output)), read_bytes_amount=len(output))
+            eager = block.unpack(ReadContext(eager_buffer, read_bytes_amount=len(output)),
+                                 read_bytes_amount=len(output))
+            self.assertGreater(lazy['children'].pending_count, 0)
+            # the last item is decoded first
+            self.assertEqual(convert_bytes(lazy['children'][-1]), convert_bytes(eager['children'][-1]))
+            self.assertEqual(convert_bytes(lazy), convert_bytes(eager))
+            self.assertEqual(eager['children'][1]['pre_offset_payload'], b'\x01\x02\x03')
+            self.assertEqual(block.pack(lazy), output)
@@ -1,4 +1,8 @@
+import contextlib
+import hashlib
+import io
 import os
+import time
 import unittest
 from io import BytesIO, BufferedReader
 
@@ -8,7 +12,7 @@ from resources.eac.archives import EacCompressedBlock
 from resources.eac.compressions.base import BaseCompressionAlgorithm
 from resources.eac.compressions.qfs2 import Qfs2Compression
 from resources.eac.compressions.qfs3 import Qfs3Compression
-from resources.eac.compressions.ref_pack import RefPackCompression
+from resources.eac.compressions.ref_pack import RefPackCompression, COMPRESSION_LEVELS
 
 
 class TestEacCompressedBlock(unittest.TestCase):
@@ -16,7 +20,7 @@ class TestEacCompressedBlock(unittest.TestCase):
     def test_should_compress_and_uncompress(self):
         mock_data = "This is a test payload for compression".encode('utf-8') + b'\xFF\x28\x28'
         # mock_data = b'\xFF\x28\x28'
-        block = EacCompressedBlock()
+        block = EacCompressedBlock(compression='qfs2')
         compressed = block.pack({'data': mock_data, 'choice_index': block.get_choice_index_by_class_name('BytesBlock')})
 
         decompressed_asm = Qfs2ASMCompression().uncompress(BytesIO(compressed), len(compressed))
@@ -40,6 +44,30 @@ class TestEacCompressedBlock(unittest.TestCase):
         decompressed = Qfs2Compression().uncompress(BytesIO(compressed), len(compressed))
         self.assertEqual(original_data, decompressed)
 
+    def test_qfs2_compression_output_is_stable(self):
+        # hashes of output, produced by previous linked list based implementation
+        expected = {
+            'test/samples/AL1.FSH': '1e719f694a86e392026ed2eb44d89e1e',
+            'test/samples/GTITLE.FSH': '8510237d685f992651b1dd6fe28b0a82',
+        }
+        for (file_name, expected_hash) in expected.items():
+            with open(file_name, 'rb') as f:
+                data = f.read()
+            with contextlib.redirect_stdout(io.StringIO()):
+                compressed = Qfs2Compression().compress(BytesIO(data), len(data))
+            self.assertEqual(expected_hash, hashlib.md5(compressed).hexdigest(), file_name)
+            self.assertEqual(data, Qfs2Compression().uncompress(BytesIO(compressed), len(compressed)))
+
+    def test_qfs2_overlapping_pairs_and_escapes(self):
+        # greedy left to right replacement: "aaa" has only one replaceable pair, escaped bytes are never paired
+        original_data = b'aaa\xff\xffaaaa\x01aa'
+        patterns = [[(0x01, 0x61, 0x61)]]
+        with contextlib.redirect_stdout(io.StringIO()):
+            compressed = Qfs2Compression().compress(BytesIO(original_data), len(original_data),
+                                                    hardcoded_patterns=patterns)
+        self.assertEqual(b'\x01a\xff\xff\xff\xff\x01\x01\xff\x01\x01\xff\x00', compressed[10:])
+        self.assertEqual(original_data, Qfs2Compression().uncompress(BytesIO(compressed), len(compressed)))
+
     # def test_qfs2_compression_efficiency(self):
     #     import tempfile
     #     import urllib.request
@@ -89,6 +117,76 @@ class TestEacCompressedBlock(unittest.TestCase):
             uncompressed_asm = parser_asm.uncompress(file, os.path.getsize(file_name))
             self.assertListEqual(list(uncompressed_py), list(uncompressed_asm))
 
+    def test_refpack_overlapping_references(self):
+        # literal "abcd", then 10 bytes with offset 4, then 10 bytes with offset 1, stop code with 1 literal
+        compressed = b'\x10\xfb\x00\x00\x19' + b'\xe0abcd' + b'\x1c\x03' + b'\x1c\x00' + b'\xfdz'
+        buffer = BytesIO(compressed + b'next')
+        uncompressed = RefPackCompression().uncompress(buffer, len(compressed))
+        self.assertEqual(b'abcd' + b'abcdabcdab' + b'b' * 10 + b'z', uncompressed)
+        self.assertEqual(len(compressed), buffer.tell())
+
+    def test_refpack_uncompress_into_appends_to_output(self):
+        file_name = 'test/samples/AL3.QFS'
+        with open(file_name, 'rb') as file:
+            compressed = file.read()
+        output = bytearray(b'prefix')
+        consumed = RefPackCompression().uncompress_into(memoryview(compressed), output)
+        self.assertEqual(len(compressed), consumed)
+        self.assertEqual(b'prefix', output[:6])
+        self.assertEqual(RefPackCompression().uncompress(BytesIO(compressed), len(compressed)), bytes(output[6:]))
+
+    def test_refpack_reference_before_output_start(self):
+        compressed = b'\x10\xfb\x00\x00\x07' + b'\xe0abcd' + b'\x00\x05' + b'\xfc'
+        with self.assertRaises(ValueError):
+            RefPackCompression().uncompress_into(compressed, bytearray(b'prefix'))
+
+    def test_refpack_compression_roundtrip(self):
+        samples = [b'', b'a', b'ab', b'abc', b'abcabcabc', b'\x00' * 5000, bytes(range(256)) * 20,
+                   os.urandom(3000) * 3]
+        with open('test/samples/AL1.FSH', 'rb') as f:
+            samples.append(f.read())
+        for level in COMPRESSION_LEVELS.keys():
+            for sample in samples:
+                compressed = RefPackCompression().compress(BytesIO(sample), len(sample), level=level)
+                uncompressed = RefPackCompression().uncompress(BytesIO(compressed), len(compressed))
+                self.assertEqual(sample, uncompressed, f'level {level}, sample length {len(sample)}')
+
+    def test_refpack_compression_uses_long_offsets_and_matches(self):
+        # repeated chunk is farther than 16384 bytes and longer than 67 bytes, so 4-byte commands are needed
+        chunk = os.urandom(2000)
+        sample = chunk + os.urandom(40000) + chunk
+        compressed = RefPackCompression().compress(BytesIO(sample), len(sample), level=9)
+        self.assertLess(len(compressed), len(sample) - 1500)
+        self.assertEqual(sample, RefPackCompression().uncompress(BytesIO(compressed), len(compressed)))
+
+    def test_refpack_is_default_write_compression(self):
+        mock_data = b'This is a test payload for compression, compression, compression'
+        block = EacCompressedBlock(compression='refpack')
+        compressed = block.pack({'data': mock_data, 'choice_index': block.get_choice_index_by_class_name('BytesBlock')})
+        self.assertEqual(b'\x10\xfb', compressed[:2])
+        decompressed = block.unpack(ReadContext.from_bytes(compressed), read_bytes_amount=len(compressed))
+        self.assertEqual(mock_data, decompressed['data'])
+
+    @unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'), 'benchmark, set RUN_BENCHMARKS=1 to run')
+    def test_compression_benchmark(self):
+        corpus_dir = 'test/golden_corpus'
+        for file_name in sorted(os.listdir(corpus_dir)):
+            with open(os.path.join(corpus_dir, file_name), 'rb') as f:
+                data = f.read()
+            results = []
+            for (title, compress) in [
+                ('refpack', lambda: RefPackCompression().compress(BytesIO(data), len(data))),
+                ('refpack-9', lambda: RefPackCompression().compress(BytesIO(data), len(data), level=9)),
+                ('qfs2', lambda: Qfs2Compression().compress(BytesIO(data), len(data))),
+            ]:
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    compressed = compress()
+                elapsed = time.perf_counter() - start
+                results.append(f'{title}: {len(compressed) / max(1, len(data)):.3f} ratio, '
+                               f'{len(data) / 1024 / 1024 / elapsed:.2f} MB/s')
+            print(f'{file_name} ({len(data)} bytes): ' + ', '.join(results))
+
     def test_qfs3_decompression_al1(self):
         parser = Qfs3Compression()
         file_name = 'test/samples/AL1.QFS'
@@ -100,6 +198,18 @@ class TestEacCompressedBlock(unittest.TestCase):
                 for i in range(len(fsh)):
                     self.assertEqual(fsh[i], uncompressed[i])
 
+    def test_qfs3_compressed_size_header_and_buffer_position(self):
+        with open('test/golden_corpus/ANSX.PBS', 'rb') as f:
+            compressed = f.read()
+        buffer = BytesIO(compressed + b'next')
+        uncompressed = Qfs3Compression().uncompress(buffer, len(compressed))
+        # bit reader stops after the end code with up to 32 bits read ahead, like the original decoder did
+        self.assertGreaterEqual(buffer.tell(), len(compressed))
+        self.assertLessEqual(buffer.tell(), len(compressed) + 4)
+        # the same stream with 3-byte compressed size after the header
+        with_size = b'\x31\xfb' + len(compressed).to_bytes(3, 'big') + compressed[2:]
+        self.assertEqual(uncompressed, Qfs3Compression().uncompress(BytesIO(with_size), len(with_size)))
+
     def test_qfs3_decompression_vertbst(self):
         parser = Qfs3Compression()
         file_name = 'test/samples/VERTBST.QFS'
@@ -1,9 +1,15 @@
+import os
+import tempfile
 import unittest
 
 from io import BytesIO
 
+import numpy as np
+
 from library.context import ReadContext
-from resources.eac.bitmaps import EacImage, EacPalette
+from resources.eac.bitmaps import EacImage, EacPalette, transform_color_bitness, revert_color_bitness
+from serializers import ImageSerializer
+from serializers.misc.json_utils import convert_bytes
 
 
 
@@ -125,6 +131,66 @@ class TestBitmap(unittest.TestCase):
         serialized_pixel = self._get_serialized_pixel_data(data)
         self.assertListEqual(list(serialized_pixel), [0x78, 0x56, 0x34, 0x12])
 
+    def test_bitmap_16bit_all_colors_should_match_per_pixel_conversion(self):
+        all_colors = b''.join(x.to_bytes(2, 'little') for x in range(0x10000))
+        for resource_id, bitness in [('16Bit_4444 color format bitmap', (4, 4, 4, 4)),
+                                     ('16Bit_0565 color format bitmap', (0, 5, 6, 5)),
+                                     ('16Bit_1555 color format bitmap', (1, 5, 5, 5))]:
+            bitmap = self.block._native_to_internal(resource_id, 256, 256, all_colors)
+            expected = [transform_color_bitness(x, *bitness) for x in range(0x10000)]
+            if resource_id == '16Bit_0565 color format bitmap':
+                expected[0x7c0] = 0
+            self.assertListEqual(bitmap.tolist(), expected)
+            packed = self.block._internal_to_native(resource_id, 256, 256, bitmap)
+            expected_packed = [revert_color_bitness(x, *bitness) for x in bitmap.tolist()]
+            if resource_id == '16Bit_0565 color format bitmap':
+                expected_packed = [0x7c0 if (x & 0xff) < 128 else y for x, y in zip(bitmap.tolist(), expected_packed)]
+            self.assertEqual(packed, b''.join(x.to_bytes(2, 'little') for x in expected_packed))
+
+    def test_bitmap_4bit_odd_width_should_be_saved_correctly(self):
+        buf = BytesIO(bytes([0x7A])
+                      + b'\x00\x00\x00\x03\x00\x02\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+                      + bytes([0x12, 0x30, 0x45, 0x60]))
+        data = self.block.unpack(ReadContext(buf))
+        self.assertListEqual(data['bitmap'].tolist(), [[0xFFFFFF11, 0xFFFFFF22, 0xFFFFFF33],
+                                              [0xFFFFFF44, 0xFFFFFF55, 0xFFFFFF66]])
+        self.assertListEqual(list(self._get_serialized_pixel_data(data)), [0x12, 0x30, 0x45, 0x60])
+
+    def test_bitmap_4bit_swapped_save_should_not_change_data(self):
+        buf = self._gen_two_pixels_bitmap(0x79, bytes([0x12]))
+        data = self.block.unpack(ReadContext(buf))
+        self.assertListEqual(list(self._get_serialized_pixel_data(data)), [0x12])
+        self.assertListEqual(data['bitmap'].tolist(), [[0xFFFFFF22, 0xFFFFFF11]])
+
+    def test_bitmap_should_be_numpy_array(self):
+        data = self.block.unpack(ReadContext(self._gen_two_pixels_bitmap(0x7D, bytes(8))))
+        self.assertEqual(data['bitmap'].dtype, np.uint32)
+        data = self.block.unpack(ReadContext(self._gen_two_pixels_bitmap(0x7B, bytes([1, 2]))))
+        self.assertEqual(data['bitmap'].dtype, np.uint8)
+        data['bitmap'][1] = 3
+        self.assertListEqual(list(self._get_serialized_pixel_data(data)), [1, 3])
+        self.assertListEqual(convert_bytes(data)['bitmap'], [1, 3])
+
+    def test_image_serializer_round_trip(self):
+        data = self.block.unpack(ReadContext(self._gen_two_pixels_bitmap(0x7D, bytes([0x78, 0x56, 0x34, 0x12,
+                                                                                      0x00, 0xff, 0x00, 0x80]))))
+        serializer = ImageSerializer()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            [file_path] = serializer.serialize(data, os.path.join(tmp_dir, 'image'), block=self.block)
+            deserialized = serializer.deserialize([file_path], block=self.block)
+        self.assertListEqual(deserialized['bitmap'].tolist(), data['bitmap'].tolist())
+        self.assertEqual(self.block.pack(deserialized)[16:], bytes([0x78, 0x56, 0x34, 0x12, 0x00, 0xff, 0x00, 0x80]))
+
+    def test_convert_to_8bit_and_back(self):
+        data = self.block.unpack(ReadContext(self._gen_two_pixels_bitmap(0x7D, bytes([0x78, 0x56, 0x34, 0x12,
+                                                                                      0x00, 0xff, 0x00, 0x80]))))
+        self.block.action_convert_to_8bit(data, 'alpha')
+        self.assertListEqual(data['bitmap'].tolist(), [0x12, 0x80])
+        self.block.action_convert_to_4bit(data, '4Bit', 'alpha')
+        self.assertListEqual(data['bitmap'].tolist(), [[0xFFFFFF12, 0xFFFFFF80]])
+        self.block.action_convert_to_rgba(data, '32Bit color format bitmap', 'black-white', id='')
+        self.assertListEqual(data['bitmap'].tolist(), [0x121212FF, 0x808080FF])
+
     # TODO add tests, similar to test_ffn_can_be_reconstructed_from_files to few file formats
 
 
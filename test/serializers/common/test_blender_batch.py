@@ -0,0 +1,120 @@
+import os
+import stat
+import sys
+import tempfile
+import time
+import unittest
+
+from library.utils.class_dict import ClassDict
+from serializers.common.three_d import Scene, SubMesh, export_scenes
+from serializers.common.three_d.blender_batch import run_blender_batch, BlenderScriptError
+from serializers.common.three_d.blender_scripts import defer_blender_scripts
+
+SETTINGS = ClassDict({
+    'geometry__save_obj': False,
+    'geometry__save_blend': True,
+    'geometry__export_to_gg_web_engine': False,
+})
+
+
+@unittest.skipIf(sys.platform.startswith('win'), 'fake Blender executable is a shell script')
+class TestBlenderBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        # runs runner script with python instead of Blender: "blender --background --python <script>"
+        self.blender_executable = os.path.join(self.temp_dir.name, 'blender')
+        with open(self.blender_executable, 'w') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "$3"\n')
+        os.chmod(self.blender_executable, os.stat(self.blender_executable).st_mode | stat.S_IEXEC)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _script(self, name, code):
+        script_path = os.path.join(self.temp_dir.name, f'{name}.py')
+        cleanup_path = os.path.join(self.temp_dir.name, f'{name}.obj')
+        for (path, content) in [(script_path, code), (cleanup_path, '')]:
+            with open(path, 'w') as f:
+                f.write(content)
+        return {'script_path': script_path, 'cleanup_files': [cleanup_path]}
+
+    def test_scene_export_is_deferred(self):
+        mesh = SubMesh()
+        mesh.vertices = [[0, 0, 0], [0, 1, 0], [1, 0, 0]]
+        mesh.vertex_uvs = [[0, 0], [0, 1], [1, 0]]
+        mesh.polygons = [[0, 1, 2]]
+        with defer_blender_scripts() as scripts:
+            exported_files = export_scenes([Scene(name='car', sub_meshes=[mesh])], self.temp_dir.name, SETTINGS)
+        self.assertEqual([os.path.basename(x) for x in exported_files], ['car.blend'])
+        self.assertEqual(len(scripts), 1)
+        # OBJ file is removed after Blender imports it
+        obj_path = os.path.join(self.temp_dir.name, 'geometry.obj')
+        self.assertTrue(os.path.exists(obj_path))
+        self.assertIn(os.path.abspath(obj_path), scripts[0]['cleanup_files'])
+        with open(scripts[0]['script_path']) as f:
+            self.assertNotIn('quit()', f.read())
+        os.unlink(scripts[0]['script_path'])
+
+    def test_failed_scripts_do_not_affect_others(self):
+        output_path = os.path.join(self.temp_dir.name, 'out.txt')
+        scripts = [
+            self._script('ok1', f'open({output_path!r}, "a").write("1")'),
+            self._script('error', 'raise ValueError("broken scene")'),
+            self._script('crash', 'import os\nos._exit(3)'),
+            self._script('ok2', f'open({output_path!r}, "a").write("2")'),
+        ]
+        results = {i: error for (i, error, _) in run_blender_batch(scripts, processes=2,
+                                                                    blender_executable=self.blender_executable)}
+        self.assertEqual(sorted(results), [0, 1, 2, 3])
+        self.assertIsNone(results[0])
+        self.assertIsNone(results[3])
+        self.assertIsInstance(results[1], BlenderScriptError)
+        self.assertIn('broken scene', str(results[1]))
+        self.assertIn('exited with code 3', str(results[2]))
+        with open(output_path) as f:
+            self.assertEqual(sorted(f.read()), ['1', '2'])
+        # script files and cleanup files are removed
+        for script in scripts:
+            self.assertFalse(os.path.exists(script['script_path']))
+            self.assertFalse(os.path.exists(script['cleanup_files'][0]))
+
+    def test_missing_blender_is_reported(self):
+        scripts = [self._script('ok', '')]
+        with self.assertRaises(OSError):
+            list(run_blender_batch(scripts, processes=1, blender_executable=self.blender_executable + '_missing'))
+        self.assertFalse(os.path.exists(scripts[0]['script_path']))
+
+    def test_hung_script_is_timed_out(self):
+        output_path = os.path.join(self.temp_dir.name, 'out.txt')
+        scripts = [
+            self._script('hang', 'import time\ntime.sleep(60)'),
+            self._script('ok', f'open({output_path!r}, "a").write("1")'),
+        ]
+        results = {i: (error, seconds) for (i, error, seconds) in run_blender_batch(
+            scripts, processes=1, blender_executable=self.blender_executable, script_timeout=1)}
+        self.assertIsInstance(results[0][0], BlenderScriptError)
+        self.assertIn('did not finish scene in 1 seconds', str(results[0][0]))
+        self.assertGreaterEqual(results[0][1], 1)
+        # Blender process is restarted for the next script
+        self.assertIsNone(results[1][0])
+        with open(output_path) as f:
+            self.assertEqual(f.read(), '1')
+
+    def test_interrupted_batch_kills_blender(self):
+        pid_path = os.path.join(self.temp_dir.name, 'pid.txt')
+        scripts = [
+            self._script('ok', ''),
+            self._script('hang', f'import os, time\nopen({pid_path!r}, "w").write(str(os.getpid()))\n'
+                                 f'time.sleep(60)'),
+        ]
+        batch = run_blender_batch(scripts, processes=2, blender_executable=self.blender_executable)
+        next(batch)
+        deadline = time.monotonic() + 30
+        while (not os.path.exists(pid_path) or not os.path.getsize(pid_path)) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with open(pid_path) as f:
+            pid = int(f.read())
+        batch.close()
+        with self.assertRaises(ProcessLookupError):
+            os.kill(pid, 0)
@@ -1,6 +1,22 @@
+import random
 import unittest
 
-from library.utils.asm_runner import AsmRunner
+from library.utils.asm_runner import AsmRunner, FLAG_NAMES
+
+EQUIVALENCE_BLOCKS = [
+    'add eax, ebx', 'sub al, bl', 'add ah, 200', 'sub cx, dx', 'sub bx, 1',
+    'shl eax, cl', 'shl dl, 3', 'shl edx, 8', 'shl ah, 1', 'shr ebx, 1', 'shr ecx, 5', 'shr dh, 2',
+    'xor eax, ebx', 'or cl, 0F0h', 'and edx, 1Ch', 'and al, 1', 'xor dh, bh',
+    'inc eax', 'dec bl', 'inc ch', 'dec dx', 'neg ecx', 'neg al',
+    'test eax, eax', 'test bl, 80h', 'cmp eax, ebx', 'cmp dl, 3', 'cmp ecx, [esi]',
+    'mov eax, [esi+4]', 'mov byte ptr [edi+1], al', 'mov [edi+ecx], bx', 'movzx edx, byte ptr [esi+ebx]',
+    'mov al, [esi+var_4]', 'mov var_4, eax', 'mov eax, var_4', 'lea ebx, [edi+ecx*4]', 'lea edx, [esi-10h]',
+    'push eax\npop edx', 'rol eax, 8', 'rep movsb', 'rep movsd',
+    'shl edx, 8\nadd edx, eax\ninc ebx', 'sub ecx, edx\nshr ebx, cl', 'dec ecx\njnz short loop',
+    'cmp eax, 10h\njb short loc', 'cmp al, bl\njnb short loc', 'test eax, eax\njz short loc',
+    'cmp eax, ebx\njbe short loc', 'sub eax, ebx\njl short loc', 'cmp cl, dl\njge short loc',
+    'cmp eax, ebx\njle short loc', 'add al, bl\njs short loc', 'dec edx\njns short loc', 'jmp short loc',
+]
 
 
 class TestAsmRunner(unittest.TestCase):
@@ -352,3 +368,75 @@ class TestAsmRunner(unittest.TestCase):
             jge     short loc_4A853D
         """)
         self.assertFalse(res)
+
+    def _random_runner(self, rnd: random.Random) -> AsmRunner:
+        runner = AsmRunner(asm_virtual_memory_size=512)
+        runner.define_variable('var_4', rnd.getrandbits(32), 4)
+        runner.asm_virtual_memory[:] = rnd.randbytes(512)
+        for register in ['eax', 'ebx', 'ecx', 'edx']:
+            # small values are more interesting for shifts and comparisons
+            setattr(runner, register, rnd.choice([rnd.getrandbits(32), rnd.getrandbits(3), 0xFFFFFFFF]))
+        runner.cl = rnd.randint(1, 31)
+        runner.esi = rnd.randint(0, 200)
+        runner.edi = rnd.randint(0, 200)
+        runner.esp = 300
+        for flag in FLAG_NAMES:
+            setattr(runner, flag, rnd.randint(0, 1))
+        return runner
+
+    def _runner_state(self, runner: AsmRunner):
+        return ([runner.eax, runner.ebx, runner.ecx, runner.edx, runner.esi, runner.edi, runner.esp],
+                [getattr(runner, flag) for flag in FLAG_NAMES], bytes(runner.asm_virtual_memory),
+                dict(runner.variables))
+
+    def test_compiled_block_is_equivalent_to_interpreter(self):
+        rnd = random.Random(7)
+        for block in EQUIVALENCE_BLOCKS:
+            for _ in range(50):
+                seed = rnd.getrandbits(32)
+                interpreted = self._random_runner(random.Random(seed))
+                compiled = self._random_runner(random.Random(seed))
+                if 'rep' in block:
+                    interpreted.ecx = compiled.ecx = interpreted.ecx & 0x3F
+                # both fail the same way when pointer is out of memory
+                results = []
+                for run in [interpreted.interpret_block, compiled.run_block]:
+                    try:
+                        results.append(run(block))
+                    except IndexError as ex:
+                        results.append(repr(ex))
+                self.assertEqual(results[1], results[0], block)
+                self.assertEqual(self._runner_state(compiled), self._runner_state(interpreted), block)
+
+    def test_compiled_block_skips_overwritten_flags(self):
+        runner = AsmRunner(asm_virtual_memory_size=16)
+        compiled = runner.compile_block('''
+            shl     edx, 8
+            cmp     edx, 10h
+            add     edx, eax
+            jz      short loc_4A9749''')
+        # only flags of the last add can be read after the block
+        self.assertEqual(compiled.source.count('self.ZF = '), 1)
+        self.assertEqual(compiled.source.count('self.CF = '), 1)
+
+    def test_compiled_block_reuses_translation(self):
+        runner = AsmRunner(asm_virtual_memory_size=16)
+        runner.run_block('inc eax')
+        compiled = runner._compiled_blocks['inc eax']
+        runner.run_block('inc eax')
+        self.assertIs(runner._compiled_blocks['inc eax'], compiled)
+        self.assertEqual(runner.eax, 2)
+
+    def test_compiled_block_reports_errors_when_command_is_reached(self):
+        runner = AsmRunner(asm_virtual_memory_size=16)
+        with self.assertRaisesRegex(Exception, 'Cannot run command after jump'):
+            runner.run_block('''
+                inc eax
+                jmp short loc
+                inc eax''')
+        self.assertEqual(runner.eax, 1)
+        with self.assertRaisesRegex(Exception, 'Unknown command'):
+            runner.run_block('''
+                inc eax
+                bswap eax''')
+        self.assertEqual(runner.eax, 2)